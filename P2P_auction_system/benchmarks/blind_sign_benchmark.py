@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import secrets
+
+# Add the project root to the path to import the architecture modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from ca.ca_utils.crt import CRTKey
+
+KEY_SIZE = 2048
+DURATION = 3
+
+
+def full_exponent_sign(numbers, m):
+    return pow(m, numbers.d, numbers.public_numbers.n)
+
+
+def benchmark(name, sign, messages):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION:
+        sign(messages[count % len(messages)])
+        count += 1
+    rate = count / (time.perf_counter() - start)
+    print(f"{name:<22} {rate:10.1f} signatures/s")
+    return rate
+
+
+if __name__ == "__main__":
+    print(f"Blind signing benchmark: RSA-{KEY_SIZE}, {DURATION}s per mode")
+
+    ca_sk = rsa.generate_private_key(public_exponent=65537, key_size=KEY_SIZE)
+    numbers = ca_sk.private_numbers()
+    crt = CRTKey(ca_sk)
+
+    messages = [secrets.randbelow(crt.n) for _ in range(64)]
+
+    # Both modes must produce the exact same blind signatures
+    for m in messages:
+        assert full_exponent_sign(numbers, m) == crt.sign_int(m)
+
+    before = benchmark("pow(m, d, n)", lambda m: full_exponent_sign(numbers, m), messages)
+    after = benchmark("CRT (p, q, dP, dQ)", crt.sign_int, messages)
+
+    print(f"Speedup: {after / before:.2f}x")
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
 
 class BlindSignReq(BaseModel):
     """
@@ -11,4 +12,29 @@ class BlindSignReq(BaseModel):
     """
 
     uid: str
-    blinded_token_b64: str
\ No newline at end of file
+    blinded_token_b64: str
+
+
+class BlindSignBatchReq(BaseModel):
+    """
+        Request payload for signing several blinded tokens in a single call.
+
+        Attributes:
+            uid (str): The unique identifier of the user requesting the signatures.
+            blinded_tokens_b64 (List[str]): The blinded token hashes (Base64 encoded),
+                                            between 1 and 100 per request.
+    """
+
+    uid: str
+    blinded_tokens_b64: List[str] = Field(min_length=1, max_length=100)
+
+
+class BlindSignBatchResp(BaseModel):
+    """
+        Response of the batch blind signing endpoint.
+
+        Attributes:
+            blind_signatures_b64 (List[str]): One blind signature per blinded token, in request order.
+    """
+
+    blind_signatures_b64: List[str]
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel, Field
 
 # Enter /register
@@ -25,6 +26,8 @@ class RegisterResp(BaseModel):
             encrypted_secrets_b64 (str): A blob containing sensitive data (like the Group Key),
                                          encrypted with the user's public key (Hybrid Encryption).
             token_quota (int): The initial number of tokens allocated to the user.
+            lkh_path_b64 (str | None): The user's key tree path keys (leaf to root), encrypted with
+                                       the session key. None if the user is not in the key tree.
     """
 
     uid: str
@@ -32,3 +35,4 @@ class RegisterResp(BaseModel):
     ca_pub_pem_b64: str
     encrypted_secrets_b64: str
     token_quota: int
+    lkh_path_b64: Optional[str] = None
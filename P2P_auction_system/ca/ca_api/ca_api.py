@@ -1,36 +1,69 @@
+import os
 import uuid
 import json
 import time
+import asyncio
+import queue
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI, HTTPException, Request
 from typing import Optional
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
-
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+from starlette.concurrency import run_in_threadpool
 
 from ca.ca_utils.time import now_iso
-from ca.ca_db import get_db, store_user, user_exists, insert_token, increment_token_quota, remove_user_and_get_remaining_pubkeys
+from ca.ca_utils.sign_pool import SignerPool, sign_pss, issue_certificate, decrypt_identity
+from ca.ca_db import get_db, close_db, store_user, user_exists, insert_token, increment_token_quota, use_issued_tokens, remove_users
+from ca.ca_members import MemberKeyCache
+from ca.ca_lkh import KeyTree, CA_LKH_CAPACITY
+from ca.ca_rekey import RekeyQueue
 from ca.ca_api.Register import RegisterReq, RegisterResp
 from ca.ca_api.Tokens import TokensReq, TokensResp
-from ca.ca_api.BlindTokens import BlindSignReq
-from client.ca_handler.ca_info import CA_URL
-from crypto.certificates.certificates import make_x509_certificate, verify_csr
+from ca.ca_api.BlindTokens import BlindSignReq, BlindSignBatchReq, BlindSignBatchResp
 from crypto.crypt_decrypt.crypt import encrypt_message_symmetric_gcm, encrypt_with_public_key
-from crypto.crypt_decrypt.hybrid import hybrid_decrypt
 from crypto.keys.keys_crypto import get_pub_bytes, generate_aes_key
-from crypto.encoding.b64 import b64e, b64d
+from crypto.encoding.b64 import b64e
 
 app = FastAPI(title="Auction CA", version="1.0.0")
 
 app.state.PEER_SESSIONS = {}
 
-logging.basicConfig(
-    filename='ca_security.log',
-    level=logging.INFO,
-    format='%(message)s'
-)
+# Serializes the changes of the group membership: a registration (leaf added to the key tree,
+# Group Key handed out) never interleaves with a rotation (leaves removed, new Group Key set)
+app.state.GROUP_LOCK = threading.Lock()
+
+# Cadence (seconds) of the signed time beacon, announced to the clients with each beacon
+BEACON_INTERVAL = float(os.environ.get("CA_BEACON_INTERVAL", 1))
+
+CA_SECURITY_LOG = 'ca_security.log'
+
+
+@app.on_event("startup")
+def start_logging():
+    """
+        Security events are queued by the handlers and written to disk by a listener thread,
+        so file I/O never runs on the event loop.
+        Set up with the server rather than on import, so the signing processes (which
+        import this package) neither open the log file nor start a listener.
+    """
+
+    log_queue = queue.SimpleQueue()
+    log_file = logging.FileHandler(CA_SECURITY_LOG)
+    log_file.setFormatter(logging.Formatter('%(message)s'))
+
+    listener = QueueListener(log_queue, log_file)
+    listener.start()
+
+    handler = QueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(handler)
+
+    app.state.LOG_LISTENER = listener
+    app.state.LOG_HANDLER = handler
+
 
 def log_security_event(event_type, request, status, latency=0, extra_info=None):
     """Creates a structured log in JSON format for monitoring."""
@@ -45,6 +78,124 @@ def log_security_event(event_type, request, status, latency=0, extra_info=None):
     }
     logging.info(json.dumps(log_entry))
 
+def get_signer(state) -> SignerPool:
+    """
+        Returns the pool that runs the CA private-key operations, kept in the app state
+        ("run_ca" starts it; if missing, an in-process signer is created here).
+    """
+
+    signer = getattr(state, "SIGNER", None)
+    if signer is None:
+        signer = SignerPool(state.CA_SK, workers=0)
+        state.SIGNER = signer
+    return signer
+
+
+def get_member_keys(state) -> MemberKeyCache:
+    """Returns the cache of the members' parsed public keys, kept in the app state."""
+
+    member_keys = getattr(state, "MEMBER_KEYS", None)
+    if member_keys is None:
+        member_keys = MemberKeyCache()
+        state.MEMBER_KEYS = member_keys
+    return member_keys
+
+
+def claim_signatures(db_path, uid: str, count: int):
+    """
+        Checks that the UID belongs to a registered user and takes 'count' of the tokens
+        issued to it by "/tokens": every blind signature, single or batched, uses one.
+        Raises 404 for an unknown uid and 403 when its quota is exhausted.
+    """
+
+    conn = get_db(db_path)
+
+    if not user_exists(conn, uid):
+        raise HTTPException(status_code=404, detail="Unknown uid")
+
+    if not use_issued_tokens(conn, uid, count):
+        raise HTTPException(status_code=403, detail="Token quota exceeded")
+
+
+async def sign_timestamp(state, target_time: datetime) -> dict:
+    """Signs a time (ISO string, second precision) with the CA Private Key (signing pool)."""
+
+    ts = target_time.replace(microsecond=0).isoformat()
+    signature = await get_signer(state).run(sign_pss, ts.encode('utf-8'))
+
+    return { "timestamp": ts, "signature": b64e(signature) }
+
+
+async def refresh_beacon(state) -> dict:
+    """Signs the current time and publishes it as the time beacon."""
+
+    beacon = await sign_timestamp(state, datetime.now(timezone.utc))
+    state.BEACON = beacon
+    return beacon
+
+
+async def beacon_loop(state):
+    """
+        Publishes a signed time beacon at a fixed cadence (BEACON_INTERVAL, aligned
+        to the clock). The CA signing load for time is then constant, whatever the
+        number of messages peers send.
+    """
+
+    while True:
+        try:
+            await refresh_beacon(state)
+        except Exception as e:
+            print(f"[CA] Time beacon signing failed: {e}")
+
+        await asyncio.sleep(BEACON_INTERVAL - time.time() % BEACON_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_beacon():
+    """Starts the time beacon with the server."""
+
+    app.state.BEACON_TASK = asyncio.create_task(beacon_loop(app.state))
+
+
+@app.on_event("shutdown")
+async def stop_beacon():
+    """Stops the time beacon (before the signing pool it uses)."""
+
+    task = getattr(app.state, "BEACON_TASK", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.on_event("shutdown")
+def stop_signer():
+    """Stops the signing processes with the server."""
+
+    signer = getattr(app.state, "SIGNER", None)
+    if signer is not None:
+        signer.close()
+
+
+@app.on_event("shutdown")
+def stop_db():
+    """Closes the pooled database connections with the server."""
+
+    close_db()
+
+
+@app.on_event("shutdown")
+def stop_logging():
+    """Flushes the queued security events and closes the log file (last shutdown hook)."""
+
+    listener = getattr(app.state, "LOG_LISTENER", None)
+    if listener is None:
+        return
+
+    logging.getLogger().removeHandler(app.state.LOG_HANDLER)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    app.state.LOG_LISTENER = None
+
 @app.get("/health")
 def health():
     """
@@ -69,7 +220,7 @@ def ca_pub(request: Request):
 
 
 @app.post("/register", response_model=RegisterResp)
-def register(req: RegisterReq, request: Request):
+async def register(req: RegisterReq, request: Request):
     """
         Handles the registration of a new peer in the network.
         1. Verifies the client's Certificate Signing Request (CSR).
@@ -79,48 +230,45 @@ def register(req: RegisterReq, request: Request):
            encrypted using the user's public key (Hybrid Encryption).
     """
 
-    # 1 — decode & verify CSR
-    try:
-        csr = verify_csr(req.csr_pem_b64)
-    except Exception:
+    # 1 — decode & verify CSR, 3 — create X.509 certificate (signing pool)
+    issued = await get_signer(request.app.state).run(issue_certificate, req.csr_pem_b64)
+    if issued is None:
         raise HTTPException(status_code=400, detail="Invalid CSR")
 
+    cert_pem, user_pub_bytes = issued
+
     # 2 — assign UUID
     uid = str(uuid.uuid4())
 
-    # 3 — create X.509 certificate
-    cert_pem = make_x509_certificate(
-        csr=csr,
-        ca_sk=request.app.state.CA_SK
-    )
-
     # 4 — store PEM cert in DB
-    user_pub_bytes = get_pub_bytes(csr.public_key())
-    store_user(
+    await run_in_threadpool(
+        store_user,
         request.app.state.DB_PATH,
         uid,
         req,
         user_pub_bytes,
         cert_pem
     )
-
-    # 5 — group key
-    if app.state.KEY_GROUP_BOOL is False:        
-        group_key = generate_aes_key()
-        app.state.KEY_GROUP_BOOL = True
-        app.state.KEY_GROUP = group_key
+    await run_in_threadpool(get_member_keys(request.app.state).add, uid, user_pub_bytes)
 
     session_key = generate_aes_key()
 
     request.app.state.PEER_SESSIONS[uid] = session_key
 
+    # 5 — group key and key tree leaf (the session key is the user's individual key)
+    group_key, path = await run_in_threadpool(join_group, request.app.state, uid, session_key)
+
+    lkh_path_b64 = None
+    if path is not None:
+        lkh_path = json.dumps({"path": [[node, b64e(key)] for node, key in path]})
+        lkh_path_b64 = encrypt_message_symmetric_gcm(lkh_path, session_key)
+
     secrets_json = json.dumps({
-        "group_key": b64e(request.app.state.KEY_GROUP),
+        "group_key": b64e(group_key),
         "session_key": b64e(session_key)
     })
 
-    user_pub_pem = b64e(user_pub_bytes)
-    encrypted_blob = encrypt_with_public_key(secrets_json.encode('utf-8'), user_pub_bytes)
+    encrypted_blob = await run_in_threadpool(encrypt_with_public_key, secrets_json.encode('utf-8'), user_pub_bytes)
 
     # 6 — Return seguro
     return RegisterResp(
@@ -128,10 +276,34 @@ def register(req: RegisterReq, request: Request):
         cert_pem_b64=b64e(cert_pem),
         ca_pub_pem_b64=b64e(get_pub_bytes(request.app.state.CA_VK)),
         encrypted_secrets_b64=b64e(encrypted_blob),  # <--- CAMPO SEGURO
-        token_quota=0
+        token_quota=0,
+        lkh_path_b64=lkh_path_b64
     )
 
 
+def join_group(state, uid: str, session_key: bytes):
+    """
+        Adds a registering user to the group, creating the Group Key (and key tree) for the
+        first one. Runs under GROUP_LOCK, so the key tree path and the Group Key returned
+        belong to the same generation even while a rotation is in progress.
+        Returns (group_key, path); "path" is None when the user is outside the key tree.
+    """
+
+    with state.GROUP_LOCK:
+        if state.KEY_GROUP_BOOL is False:
+            group_key = generate_aes_key()
+            state.KEY_GROUP_BOOL = True
+            state.KEY_GROUP = group_key
+            state.KEY_TREE = KeyTree(CA_LKH_CAPACITY, group_key) if CA_LKH_CAPACITY > 0 else None
+
+        key_tree = getattr(state, "KEY_TREE", None)
+        if key_tree is None:
+            return state.KEY_GROUP, None
+
+        path = key_tree.add(uid, session_key)
+        return key_tree.group_key, path
+
+
 @app.post("/tokens", response_model=TokensResp)
 def issue_tokens(req: TokensReq, request: Request):
     """
@@ -142,23 +314,20 @@ def issue_tokens(req: TokensReq, request: Request):
     conn = get_db(request.app.state.DB_PATH)
     
     if not user_exists(conn, req.uid):
-        conn.close()
         raise HTTPException(status_code=404, detail="Unknown uid")
 
     issued = []
-    for _ in range(req.count):
-        tid = insert_token(conn, req.uid)
-        issued.append(tid)
-
-    increment_token_quota(conn, req.uid, req.count)
+    with conn:
+        for _ in range(req.count):
+            tid = insert_token(conn, req.uid)
+            issued.append(tid)
 
-    conn.commit()
-    conn.close()
+        increment_token_quota(conn, req.uid, req.count)
 
     return TokensResp(uid=req.uid, issued=issued)
 
 @app.post("/blind_sign")
-def blind_sign(req: BlindSignReq, request: Request):
+async def blind_sign(req: BlindSignReq, request: Request):
     """
         Performs RSA Blind Signing.
         The CA signs a blinded hash provided by the user without seeing the original content.
@@ -168,40 +337,53 @@ def blind_sign(req: BlindSignReq, request: Request):
     start_time = time.time()
     try:
 
-        # 1. Verify that the UID exists
-        conn = get_db(request.app.state.DB_PATH)
-        if not user_exists(conn, req.uid):
-            conn.close()
-            raise HTTPException(status_code=404, detail="Unknown uid")
-        conn.close()
+        # 1. Verify that the UID exists and has an issued token left
+        await run_in_threadpool(claim_signatures, request.app.state.DB_PATH, req.uid, 1)
+
+        # 2. RSA blind signing with the CA private key (signing pool)
+        blind_signature_b64, = await get_signer(request.app.state).blind_sign([req.blinded_token_b64])
 
-        # 2. Obtain the CA private key
-        ca_sk = request.app.state.CA_SK
+        latency = time.time() - start_time
+        log_security_event("blind_sign_request", request, "success", latency, {"uid": req.uid})
+        return {"blind_signature_b64": blind_signature_b64}
+    except Exception as e:
+        latency = time.time() - start_time
+        log_security_event("blind_sign_request", request, "fail", latency, {"error": str(e)})
+        raise e
 
-        # 3. Decoding the blinded token
-        blinded_int = int.from_bytes(b64d(req.blinded_token_b64), "big")
 
-        # 4. RSA blind signing: signature = blinded^d mod n
-        numbers = ca_sk.private_numbers()
-        d = numbers.d
-        n = numbers.public_numbers.n
+@app.post("/blind_sign_batch", response_model=BlindSignBatchResp)
+async def blind_sign_batch(req: BlindSignBatchReq, request: Request):
+    """
+        Batch version of "/blind_sign": signs every blinded token of the request.
+        The user and its quota are checked once for the whole batch, so token acquisition
+        costs one request (and one database transaction) per batch instead of per token.
+        Each token of the batch uses one of the tokens issued by "/tokens", as with
+        "/blind_sign", and a batch holds at most 100 tokens (see "BlindSignBatchReq").
+    """
 
-        signature_int = pow(blinded_int, d, n)
+    start_time = time.time()
+    try:
 
-        # 5. Convert to bytes for sending
-        sig_bytes = signature_int.to_bytes((n.bit_length() + 7) // 8, "big")
+        # 1. Verify that the UID exists and has enough issued tokens (once for the whole batch)
+        await run_in_threadpool(claim_signatures, request.app.state.DB_PATH, req.uid,
+                                len(req.blinded_tokens_b64))
+
+        # 2. RSA blind signing of every token, in request order (spread over the signing pool)
+        signatures = await get_signer(request.app.state).blind_sign(req.blinded_tokens_b64)
 
         latency = time.time() - start_time
-        log_security_event("blind_sign_request", request, "success", latency, {"uid": req.uid})
-        return {"blind_signature_b64": b64e(sig_bytes)}
+        log_security_event("blind_sign_batch_request", request, "success", latency,
+                           {"uid": req.uid, "count": len(signatures)})
+        return BlindSignBatchResp(blind_signatures_b64=signatures)
     except Exception as e:
         latency = time.time() - start_time
-        log_security_event("blind_sign_request", request, "fail", latency, {"error": str(e)})
+        log_security_event("blind_sign_batch_request", request, "fail", latency, {"error": str(e)})
         raise e
 
 
 @app.get("/timestamp")
-def timestamp(request: Request, delta: Optional[int] = None):
+async def timestamp(request: Request, delta: Optional[int] = None):
     """
         Generates a cryptographically signed timestamp using the CA's private key.
         Used by clients to prove the time of events (like bids) and prevent replay attacks.
@@ -218,78 +400,87 @@ def timestamp(request: Request, delta: Optional[int] = None):
     else:
         target_time = now
 
-    # 2. Format to ISO string
-    ts = target_time.replace(microsecond=0).isoformat()
-    ts_bytes = ts.encode('utf-8')
-
-    # 3. Get CA Private Key
-    ca_sk = request.app.state.CA_SK
-
-    # 4. Sign the timestamp
-    signature = ca_sk.sign(
-        ts_bytes,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
+    # 2. Sign the timestamp (ISO string) with the CA Private Key
+    signed = await sign_timestamp(request.app.state, target_time)
 
     latency = time.time() - start_time
     log_security_event("timestamp_request", request, "success", latency)
 
-    # 5. Return timestamp and signature
-    return { "timestamp": ts, "signature": b64e(signature) }
+    # 3. Return timestamp and signature
+    return signed
 
-@app.post("/leave")
-def leave_network(req: dict, request: Request):
+
+@app.get("/beacon")
+async def beacon(request: Request):
     """
-        Handles a user's request to leave the network.
-        1. Removes the user from the database.
-        2. Triggers a Group Key Rotation (Forward Secrecy).
-        3. Encrypts the new Group Key individually for all remaining users.
+        Returns the latest signed time beacon (same format as "/timestamp") and the
+        "interval" it is re-signed at (BEACON_INTERVAL).
+        No signing happens per request, so clients attach the beacon to their messages
+        instead of requesting a fresh timestamp, and fetch it again once per interval.
+    """
+
+    beacon = getattr(request.app.state, "BEACON", None)
+    if beacon is None:
+        beacon = await refresh_beacon(request.app.state)
+
+    return {**beacon, "interval": BEACON_INTERVAL}
+
+def get_rekey_queue(state) -> RekeyQueue:
+    """Returns the queue that batches departures into Group Key rotations (created on first use)."""
+
+    rekey_queue = getattr(state, "REKEY_QUEUE", None)
+    if rekey_queue is None:
+        rekey_queue = RekeyQueue(lambda uids: run_in_threadpool(rotate_group_key, state, uids))
+        state.REKEY_QUEUE = rekey_queue
+    return rekey_queue
+
+
+def rotate_group_key(state, uids: list) -> dict:
+    """
+        Performs one Group Key rotation for a batch of departing users.
+        1. Removes the users from the database.
+        2. Generates the new Group Key. With the key tree, only the keys on the departing
+           users' paths are replaced (O(k log N) AES encryptions for k departures).
+        3. Encrypts the new Group Key individually for the remaining users outside the
+           key tree, keyed by the fingerprint of their public key (each peer decrypts
+           exactly one entry).
     """
 
-    uid = req["uid"]
-    
     # 1. Database operations
-    conn = get_db(request.app.state.DB_PATH)
-    
-    # This deletes the user and returns list of PEM strings for others
-    remaining_pub_pems = remove_user_and_get_remaining_pubkeys(conn, uid)
-    conn.close()
-
-    # 2. Generate new AES Group Key
-    new_group_key = generate_aes_key() # Usually returns a Base64 string
-
-    encrypted_key_list = []
-
-    # 3. Encrypt for each remaining user
-    for pem_str in remaining_pub_pems:
-        # Load the public key
-        pub_key = serialization.load_pem_public_key(
-            pem_str
-        )
-        # RSA Encrypt (OAEP + SHA256)
-        ciphertext = pub_key.encrypt(
-            new_group_key,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        
-        encrypted_key_list.append(b64e(ciphertext))
-
-    old_key = app.state.KEY_GROUP
-
-    # 4. Update Server State
-    app.state.KEY_GROUP = new_group_key
+    remove_users(get_db(state.DB_PATH), uids)
+
+    # Registrations wait until the new Group Key is in place (see "join_group")
+    with state.GROUP_LOCK:
+
+        # Remaining members, from the cache of parsed public keys
+        member_keys = get_member_keys(state)
+        member_keys.remove(uids)
+        remaining_members = member_keys.members(state.DB_PATH)
+
+        # 2. Generate new AES Group Key
+        key_tree = getattr(state, "KEY_TREE", None)
+
+        if key_tree is not None:
+            lkh_entries = key_tree.remove(uids)
+            new_group_key = key_tree.group_key
+            flat_members = [entry for member_uid, entry in remaining_members.items() if member_uid not in key_tree.leaf_of]
+        else:
+            lkh_entries = []
+            new_group_key = generate_aes_key()
+            flat_members = list(remaining_members.values())
+
+        # 3. Encrypt for each remaining user outside the key tree (fanned out over threads)
+        encrypted_keys = member_keys.encrypt_for(flat_members, new_group_key)
+
+        old_key = state.KEY_GROUP
+
+        # 4. Update Server State
+        state.KEY_GROUP = new_group_key
 
     answer = {
         "type": "new_key",
-        "encrypted_keys": encrypted_key_list, 
+        "encrypted_keys": encrypted_keys, 
+        "lkh": lkh_entries,
     }
 
     to_send = json.dumps(answer)
@@ -299,13 +490,25 @@ def leave_network(req: dict, request: Request):
     } 
 
 
+@app.post("/leave")
+async def leave_network(req: dict, request: Request):
+    """
+        Handles a user's request to leave the network.
+        The departure is queued: departures close in time are coalesced into a single
+        Group Key Rotation (Forward Secrecy), see "rotate_group_key".
+        Every user of the batch receives the same new key message.
+    """
+
+    return await get_rekey_queue(request.app.state).submit(req["uid"])
+
+
 class RevealReq(BaseModel):
     encrypted_identity: str
     token_id_disputed: str
     requester_uid: str
 
 @app.post("/reveal_identity")
-def reveal_identity(req: RevealReq, request: Request):
+async def reveal_identity(req: RevealReq, request: Request):
     """
         Decrypts an 'Identity Package' to resolve disputes.
         Uses the CA's private key to open the package (Hybrid Decryption), verifying
@@ -314,10 +517,10 @@ def reveal_identity(req: RevealReq, request: Request):
     """
 
     start_time = time.time()
-    ca_sk = request.app.state.CA_SK
+    signer = get_signer(request.app.state)
 
     try:
-        identity_pkg = hybrid_decrypt(req.encrypted_identity, ca_sk)
+        identity_pkg = await signer.run(decrypt_identity, req.encrypted_identity)
 
         if not identity_pkg:
             latency = time.time() - start_time
@@ -341,14 +544,7 @@ def reveal_identity(req: RevealReq, request: Request):
 
         data_bytes = json.dumps(receipt_data, sort_keys=True, separators=(',', ':')).encode('utf-8')
 
-        signature = ca_sk.sign(
-            data_bytes,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        signature = await signer.run(sign_pss, data_bytes)
         latency = time.time() - start_time
         log_security_event("reveal_identity_attempt", request, "success", latency, {"token_id": req.token_id_disputed})
         return { "receipt_data": receipt_data, "signature_b64": b64e(signature) }
@@ -1,7 +1,30 @@
+import os
 import sqlite3
+import threading
 import uuid
+import weakref
 from ca.ca_utils.time import now_iso
 
+# Prepared statements kept per pooled connection
+CA_DB_CACHED_STATEMENTS = int(os.environ.get("CA_DB_CACHED_STATEMENTS", 256))
+
+# Pooled connections: one per (thread, database), closed when their thread ends
+# or by "close_db" on shutdown
+_local = threading.local()
+_open_connections = set()
+_open_lock = threading.Lock()
+
+# Bumped by "close_db": connections pooled before it are closed and must be reopened
+_generation = 0
+
+
+class ThreadConnections(dict):
+    """Connections of one thread, by database path (weak-referenceable, see "get_db")."""
+
+    def __init__(self):
+        super().__init__()
+        self.generation = _generation
+
 # ====== Token Related Queries ======
 
 def user_exists(conn, uid: str) -> bool:
@@ -24,6 +47,24 @@ def insert_token(conn, uid: str) -> str:
     return tid
 
 
+def use_issued_tokens(conn, uid: str, count: int) -> bool:
+    """
+        Marks 'count' of the tokens issued to a user (see "insert_token") as used by a blind
+        signature. Returns False, marking none, if the user has fewer unused tokens left.
+    """
+
+    with conn:
+        cur = conn.execute(
+            "UPDATE tokens SET used=1 WHERE token_id IN "
+            "(SELECT token_id FROM tokens WHERE uid=? AND used=0 LIMIT ?)",
+            (uid, count)
+        )
+        if cur.rowcount == count:
+            return True
+        conn.rollback()
+    return False
+
+
 def increment_token_quota(conn, uid: str, amount: int):
     """Updates the count of tokens issued to a specific user (quota management)."""
 
@@ -45,38 +86,34 @@ def store_user(db_path, uid, req, csr_pem: bytes, cert_pem: bytes):
     """
 
     conn = get_db(db_path)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users(uid, user_pub_pem, csr_pem, cert_pem, created_at, token_quota) VALUES(?,?,?,?,?,?)",
-        (uid,
-         csr_pem,
-         csr_pem,
-         cert_pem,
-         now_iso(),
-         0)
-    )
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute(
+            "INSERT INTO users(uid, user_pub_pem, csr_pem, cert_pem, created_at, token_quota) VALUES(?,?,?,?,?,?)",
+            (uid,
+             csr_pem,
+             csr_pem,
+             cert_pem,
+             now_iso(),
+             0)
+        )
 
 
-def remove_user_and_get_remaining_pubkeys(conn, uid: str):
+def remove_users(conn, uids: list):
+    """Removes departing users from the database (Group Key rotation)."""
+
+    with conn:
+        conn.executemany("DELETE FROM users WHERE uid=?", [(uid,) for uid in uids])
+
+
+def get_members(conn):
     """
-        Removes a user from the database and returns the Public Keys of all
-        remaining users. This is essential for re-encrypting the Group Key
-        during key rotation.
+        Returns (uid, Public Key) of all registered users. Used to load the
+        CA's cache of member public keys for Group Key rotations.
     """
 
     cur = conn.cursor()
-    
-    cur.execute("DELETE FROM users WHERE uid=?", (uid,))
-    
-    rows = cur.execute("SELECT user_pub_pem FROM users").fetchall()
-    
-    pub_keys = [row[0] for row in rows]
-    
-    conn.commit()
-    
-    return pub_keys
+    rows = cur.execute("SELECT uid, user_pub_pem FROM users").fetchall()
+    return [(row[0], row[1]) for row in rows]
 
 # ====== ====== ======
 
@@ -84,14 +121,60 @@ def remove_user_and_get_remaining_pubkeys(conn, uid: str):
 
 # ====== Database Setup ======
 
-# Creates a connection to ca.db
+# Returns the pooled connection to ca.db
 def get_db(db_path):
-    """Establishes and returns a connection to the SQLite database."""
+    """
+        Returns this thread's connection to the SQLite database, opened on first use and
+        then reused (no connect / schema load per request). WAL journaling lets readers
+        run alongside the writer, synchronous=NORMAL fsyncs only at checkpoints, and the
+        connection keeps its prepared statements cached.
+        Pooled connections must not be closed by callers; use "with conn:" to commit
+        (or roll back on error).
+        A connection is closed as soon as its thread ends (e.g. an idle threadpool worker
+        exiting), so there are never more open than live threads; "close_db" closes
+        the rest on shutdown.
+    """
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    connections = getattr(_local, "connections", None)
+    if connections is None or connections.generation != _generation:
+        connections = _local.connections = ThreadConnections()
+
+    conn = connections.get(db_path)
+    if conn is None:
+        # Only used by this thread; closed by whichever thread runs the cleanup
+        conn = sqlite3.connect(db_path, cached_statements=CA_DB_CACHED_STATEMENTS, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[db_path] = conn
+
+        with _open_lock:
+            _open_connections.add(conn)
+        weakref.finalize(connections, close_connection, conn)
     return conn
 
+
+def close_connection(conn):
+    """Closes a pooled connection and forgets it."""
+
+    with _open_lock:
+        _open_connections.discard(conn)
+    conn.close()
+
+
+def close_db():
+    """Closes every pooled connection still open (server shutdown)."""
+
+    global _generation
+
+    with _open_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _generation += 1
+
+    for conn in connections:
+        conn.close()
+
 # Create the tables if they do not exist
 def init_db(db_path):
     """
@@ -121,7 +204,8 @@ def init_db(db_path):
             FOREIGN KEY(uid) REFERENCES users(uid)
         )
     """)
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tokens_uid ON tokens(uid)")
     conn.commit()
-    conn.close()
 
 # ====== ====== ======
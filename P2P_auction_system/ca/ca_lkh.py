@@ -0,0 +1,116 @@
+import os
+import threading
+from crypto.keys.keys_crypto import generate_aes_key
+from crypto.keys.group_keys import wrap_key
+
+# Number of leaves of the key tree (rounded up to a power of two). "0" disables
+# the tree: every rotation then RSA-encrypts the Group Key for each member.
+CA_LKH_CAPACITY = int(os.environ.get("CA_LKH_CAPACITY", 1024))
+
+
+class KeyTree:
+    def __init__(self, capacity: int, group_key: bytes):
+        """
+            Logical Key Hierarchy: a binary tree of AES keys, stored heap-indexed
+            (node 1 is the root, children of v are 2v and 2v+1, leaves are capacity..2*capacity-1).
+            The root key is the Group Key. Each member owns one leaf (its individual key,
+            shared only with the CA) and knows every key on the path from its leaf to the root.
+            When a member leaves, only the keys on its path are replaced, each one encrypted
+            under the keys of its two children: O(log N) AES operations and no RSA.
+            Members registered when the tree was full are not in it (flat RSA fallback).
+        """
+
+        size = 1
+        while size < capacity:
+            size *= 2
+
+        self.capacity = size
+        self.keys = {1: group_key}
+        self.members = [0] * (2 * size)
+        self.leaf_of = {}
+        self.free_leaves = list(range(2 * size - 1, size - 1, -1))
+        self.lock = threading.Lock()
+
+    @property
+    def group_key(self) -> bytes:
+        return self.keys[1]
+
+    def path(self, leaf: int) -> list:
+        """Nodes from a leaf up to the root (bottom-up)."""
+
+        nodes = []
+        while leaf >= 1:
+            nodes.append(leaf)
+            leaf //= 2
+        return nodes
+
+    def add(self, uid: str, leaf_key: bytes):
+        """
+            Places a member on a free leaf with its individual key.
+            Returns its path keys as [node, key] pairs (bottom-up), or None if the tree is full.
+        """
+
+        with self.lock:
+            if not self.free_leaves:
+                return None
+
+            leaf = self.free_leaves.pop()
+            self.leaf_of[uid] = leaf
+            self.keys[leaf] = leaf_key
+
+            for node in self.path(leaf):
+                self.members[node] += 1
+                if node not in self.keys:
+                    self.keys[node] = generate_aes_key()
+
+            return [[node, self.keys[node]] for node in self.path(leaf)]
+
+    def remove(self, uids: list) -> list:
+        """
+            Removes members and replaces every key they knew, including the Group Key.
+            Departures of one batch share a single rekey: each key on the union of their
+            paths is replaced once.
+            Returns the rekey entries, bottom-up: each one is a new node key encrypted under
+            the (already updated) key of one of its children, so a member decrypts the
+            entries it can in order and ends with the new root.
+            Members outside the tree (flat fallback) only force a new root.
+        """
+
+        with self.lock:
+            nodes = {1}
+            for uid in uids:
+                leaf = self.leaf_of.pop(uid, None)
+                if leaf is None:
+                    continue
+
+                for node in self.path(leaf):
+                    self.members[node] -= 1
+
+                del self.keys[leaf]
+                self.free_leaves.append(leaf)
+                nodes.update(self.path(leaf)[1:])
+
+            # Heap order: a deeper node always has a larger index, so descending is bottom-up
+            return self._rekey(sorted(nodes, reverse=True))
+
+    def _rekey(self, nodes: list) -> list:
+        """Generates new keys for the given nodes (bottom-up) and the entries that carry them."""
+
+        entries = []
+        for node in nodes:
+            if node != 1 and self.members[node] == 0:
+                # Empty subtree: its key is no longer needed by anyone
+                self.keys.pop(node, None)
+                continue
+
+            new_key = generate_aes_key()
+            for child in (2 * node, 2 * node + 1):
+                if child < 2 * self.capacity and self.members[child] > 0:
+                    entries.append({
+                        "node": node,
+                        "under": child,
+                        "key": wrap_key(self.keys[child], new_key, node)
+                    })
+            self.keys[node] = new_key
+
+        return entries
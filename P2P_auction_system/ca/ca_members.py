@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from ca.ca_db import get_db, get_members
+from crypto.keys.keys_crypto import public_key_fingerprint
+from crypto.encoding.b64 import b64e
+
+# Threads encrypting the new Group Key for the members during a rotation
+CA_REKEY_WORKERS = int(os.environ.get("CA_REKEY_WORKERS", os.cpu_count() or 1))
+
+# Members per encryption job
+REKEY_CHUNK = 64
+
+
+class MemberKeyCache:
+    def __init__(self, workers: int = CA_REKEY_WORKERS):
+        """
+            Parsed RSA public keys of the registered users, keyed by uid, with the
+            fingerprint that addresses them in a rotation bundle.
+            Loaded from the database once, then kept in sync by registrations ("add")
+            and departures ("remove"), so a rotation neither scans the users table
+            nor parses PEMs.
+        """
+
+        self.entries = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.workers = max(1, workers)
+        self.executor = None
+
+    def load(self, db_path):
+        """Parses every user of the database (first use only)."""
+
+        with self.lock:
+            if self.loaded:
+                return
+
+            members = get_members(get_db(db_path))
+
+            for uid, pub_pem in members:
+                self.entries.setdefault(uid, parse_member_key(pub_pem))
+            self.loaded = True
+
+    def add(self, uid: str, pub_pem: bytes):
+        """Caches the public key of a newly registered user."""
+
+        entry = parse_member_key(pub_pem)
+        with self.lock:
+            self.entries[uid] = entry
+
+    def remove(self, uids: list):
+        """Drops departed users."""
+
+        with self.lock:
+            for uid in uids:
+                self.entries.pop(uid, None)
+
+    def members(self, db_path) -> dict:
+        """Snapshot {uid: (public key, fingerprint)} of the registered users."""
+
+        self.load(db_path)
+        with self.lock:
+            return dict(self.entries)
+
+    def encrypt_for(self, members: list, key: bytes) -> dict:
+        """
+            RSA-OAEP encrypts a key for each (public key, fingerprint) member, fanned out
+            in chunks over a thread pool. Returns {fingerprint: Base64 ciphertext}.
+        """
+
+        chunks = [members[i:i + REKEY_CHUNK] for i in range(0, len(members), REKEY_CHUNK)]
+
+        if len(chunks) <= 1 or self.workers == 1:
+            results = [encrypt_chunk(chunk, key) for chunk in chunks]
+        else:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ca-rekey")
+            results = self.executor.map(encrypt_chunk, chunks, [key] * len(chunks))
+
+        encrypted_keys = {}
+        for result in results:
+            encrypted_keys.update(result)
+        return encrypted_keys
+
+
+def parse_member_key(pub_pem: bytes):
+    """Loads a user's PEM public key, with its fingerprint."""
+
+    pub_key = serialization.load_pem_public_key(pub_pem)
+    return pub_key, public_key_fingerprint(pub_key)
+
+
+def encrypt_chunk(members: list, key: bytes) -> dict:
+    """RSA Encrypt (OAEP + SHA256) a key for a chunk of (public key, fingerprint) members."""
+
+    oaep = padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+    return {fingerprint: b64e(pub_key.encrypt(key, oaep)) for pub_key, fingerprint in members}
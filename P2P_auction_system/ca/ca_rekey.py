@@ -0,0 +1,81 @@
+import os
+import asyncio
+
+# Departures arriving within this window (seconds) of each other share one Group Key rotation
+REKEY_WINDOW = float(os.environ.get("CA_REKEY_WINDOW", 0.5))
+
+# Upper bound (seconds) on how long a departure can wait for its rotation under constant churn
+REKEY_MAX_STALENESS = float(os.environ.get("CA_REKEY_MAX_STALENESS", 2.0))
+
+
+class RekeyQueue:
+    def __init__(self, rotate, window: float = REKEY_WINDOW, max_staleness: float = REKEY_MAX_STALENESS):
+        """
+            Debounced Group Key rotation. Departures are queued and flushed as one batch
+            once no new departure arrived for "window" seconds, or at the latest
+            "max_staleness" seconds after the first one of the batch.
+            A mass disconnect (e.g. a Relay restart) then costs one rekey instead of N.
+
+            rotate(uids): coroutine performing one rotation for a batch of departures.
+            Every departure of the batch receives its result.
+        """
+
+        self.rotate = rotate
+        self.window = window
+        self.max_staleness = max_staleness
+        self.pending = {}
+        self.first_at = None
+        self.deadline = None
+        self.timer = None
+        self.rotating = asyncio.Lock()
+        self.batches = 0
+        self.departures = 0
+
+    async def submit(self, uid: str):
+        """Queues a departure and waits for the rotation of its batch."""
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        future = self.pending.get(uid)
+        if future is None:
+            future = loop.create_future()
+            self.pending[uid] = future
+
+        if self.first_at is None:
+            self.first_at = now
+        self.deadline = min(now + self.window, self.first_at + self.max_staleness)
+
+        if self.timer is None:
+            self.timer = asyncio.create_task(self._flush_when_quiet())
+
+        return await asyncio.shield(future)
+
+    async def _flush_when_quiet(self):
+        """Waits for the batch deadline (which later departures push back), then rotates once."""
+
+        loop = asyncio.get_running_loop()
+        while loop.time() < self.deadline:
+            await asyncio.sleep(self.deadline - loop.time())
+
+        batch = self.pending
+        self.pending = {}
+        self.first_at = None
+        self.deadline = None
+        self.timer = None
+
+        # One rotation at a time; departures arriving meanwhile form the next batch
+        async with self.rotating:
+            self.batches += 1
+            self.departures += len(batch)
+            try:
+                result = await self.rotate(list(batch))
+            except Exception as e:
+                for future in batch.values():
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for future in batch.values():
+            if not future.done():
+                future.set_result(result)
@@ -4,6 +4,7 @@ import uvicorn
 from pathlib import Path
 from local_test import TEST
 from ca.ca_db import init_db
+from ca.ca_utils.sign_pool import SignerPool, CA_SIGN_WORKERS
 from ca.ca_api.ca_api import app
 from network.ip import get_ip
 from config.config import parse_config_file
@@ -47,6 +48,8 @@ def run_ca():
 
     app.state.CA_SK = ca_sk
     app.state.CA_VK = ca_vk
+    app.state.SIGNER = SignerPool(ca_sk, workers=CA_SIGN_WORKERS)
+    print(f"[CA] Signing pool: {CA_SIGN_WORKERS} worker process(es)")
     app.state.KEY_GROUP_BOOL = False
     
     uvicorn.run(
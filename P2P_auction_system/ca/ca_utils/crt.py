@@ -0,0 +1,49 @@
+class CRTKey:
+    def __init__(self, private_key):
+        """
+            RSA private key numbers in Chinese Remainder Theorem form (p, q, dP, dQ, qInv).
+            Computing m^d mod n as two half-size exponentiations (mod p and mod q)
+            is about 3-4x faster than a single full-size one.
+            Built once from the CA private key and kept for the lifetime of the CA.
+            Every result is checked with the public exponent before it leaves "sign_int":
+            a faulty CRT half (corrupted parameter, hardware fault) would otherwise
+            produce a signature that reveals a factor of n.
+        """
+
+        numbers = private_key.private_numbers()
+
+        self.n = numbers.public_numbers.n
+        self.e = numbers.public_numbers.e
+        self.d = numbers.d
+        self.p = numbers.p
+        self.q = numbers.q
+        self.dp = numbers.dmp1
+        self.dq = numbers.dmq1
+        self.q_inv = numbers.iqmp
+
+        # Size in bytes of a signature
+        self.size = (self.n.bit_length() + 7) // 8
+
+        # Signatures recomputed without CRT after a failed check
+        self.faults = 0
+
+    def sign_int(self, m: int) -> int:
+        """
+            Raw RSA private operation m^d mod n, recombined with Garner's formula.
+            A result failing s^e mod n == m mod n is discarded and recomputed with the
+            full exponent; ValueError is raised if that one is wrong too.
+        """
+
+        m1 = pow(m % self.p, self.dp, self.p)
+        m2 = pow(m % self.q, self.dq, self.q)
+        h = (self.q_inv * (m1 - m2)) % self.p
+        s = m2 + h * self.q
+
+        if pow(s, self.e, self.n) == m % self.n:
+            return s
+
+        self.faults += 1
+        s = pow(m, self.d, self.n)
+        if pow(s, self.e, self.n) != m % self.n:
+            raise ValueError("RSA signature failed verification")
+        return s
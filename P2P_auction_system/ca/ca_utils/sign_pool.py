@@ -0,0 +1,149 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from starlette.concurrency import run_in_threadpool
+
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from ca.ca_utils.crt import CRTKey
+from crypto.certificates.certificates import make_x509_certificate, verify_csr
+from crypto.crypt_decrypt.hybrid import hybrid_decrypt
+from crypto.keys.keys_crypto import get_pub_bytes
+from crypto.encoding.b64 import b64e, b64d
+
+# Number of signing processes ("0" signs in the API process, on a worker thread)
+CA_SIGN_WORKERS = int(os.environ.get("CA_SIGN_WORKERS", os.cpu_count() or 1))
+
+# CA key material of the current process (set by "init_signer")
+_ca_sk = None
+_ca_crt = None
+
+
+def init_signer(ca_sk_der: bytes):
+    """
+        Loads the CA private key inside a signing process.
+        Runs once per worker (pool initializer), so requests only carry their own payload.
+    """
+
+    global _ca_sk, _ca_crt
+
+    _ca_sk = serialization.load_der_private_key(ca_sk_der, password=None)
+    _ca_crt = CRTKey(_ca_sk)
+
+
+# ====== Signing Jobs (executed by the workers) ======
+
+def blind_sign_tokens(blinded_tokens_b64: list) -> list:
+    """
+        RSA blind signing of Base64 blinded tokens: signature = blinded^d mod n,
+        computed with the CRT parameters of the CA key.
+    """
+
+    signatures = []
+    for blinded_token_b64 in blinded_tokens_b64:
+        blinded_int = int.from_bytes(b64d(blinded_token_b64), "big")
+        signature_int = _ca_crt.sign_int(blinded_int)
+        signatures.append(b64e(signature_int.to_bytes(_ca_crt.size, "big")))
+    return signatures
+
+
+def sign_pss(data: bytes) -> bytes:
+    """Signs data with the CA private key (RSA-PSS, SHA-256)."""
+
+    return _ca_sk.sign(
+        data,
+        padding.PSS(
+            mgf=padding.MGF1(hashes.SHA256()),
+            salt_length=padding.PSS.MAX_LENGTH
+        ),
+        hashes.SHA256()
+    )
+
+
+def issue_certificate(csr_pem_b64: str):
+    """
+        Verifies a CSR and issues the matching X.509 certificate.
+        Returns (cert_pem, user_pub_bytes), or None if the CSR is invalid.
+    """
+
+    try:
+        csr = verify_csr(csr_pem_b64)
+    except Exception:
+        return None
+
+    cert_pem = make_x509_certificate(csr=csr, ca_sk=_ca_sk)
+    return cert_pem, get_pub_bytes(csr.public_key())
+
+
+def decrypt_identity(encrypted_identity: str):
+    """Opens an Identity Package with the CA private key (None on failure)."""
+
+    return hybrid_decrypt(encrypted_identity, _ca_sk)
+
+# ====== ====== ======
+
+
+class SignerPool:
+    def __init__(self, ca_sk, workers: int = CA_SIGN_WORKERS):
+        """
+            Runs the CA private-key operations outside the event loop.
+            With workers > 0 they go to a process pool (one CA key copy per process),
+            so signing throughput scales with the cores of the CA host.
+            With workers == 0 they run in this process, on the threadpool.
+        """
+
+        self.workers = max(0, workers)
+        self.executor = None
+
+        ca_sk_der = ca_sk.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+        if self.workers:
+            # "spawn": never fork the running server (event loop, threads, sockets)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_signer,
+                initargs=(ca_sk_der,)
+            )
+        else:
+            init_signer(ca_sk_der)
+
+    async def run(self, job, *args):
+        """Runs a signing job without blocking the event loop."""
+
+        if self.executor is None:
+            return await run_in_threadpool(job, *args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, job, *args)
+
+    async def blind_sign(self, blinded_tokens_b64: list) -> list:
+        """
+            Blind-signs a list of tokens, split in one chunk per worker
+            so a single batch also uses every core. Order is preserved.
+        """
+
+        if not blinded_tokens_b64:
+            return []
+
+        chunks = max(1, min(self.workers, len(blinded_tokens_b64)))
+        size = -(-len(blinded_tokens_b64) // chunks)
+
+        results = await asyncio.gather(*(
+            self.run(blind_sign_tokens, blinded_tokens_b64[i:i + size])
+            for i in range(0, len(blinded_tokens_b64), size)
+        ))
+        return [signature for chunk in results for signature in chunk]
+
+    def close(self):
+        """Stops the signing processes."""
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -1,11 +1,13 @@
-from ca.ca_service import run_ca
-
 def main():
     """
         Main entry point for the Certificate Authority Application.
         Triggers the CA service startup routine.
+        Imported here: the signing processes re-import this module (spawn) and
+        must not load the web application.
     """
 
+    from ca.ca_service import run_ca
+
     run_ca()
 
 if __name__ == "__main__":
@@ -6,9 +6,11 @@ from design.ui import UI
 from crypto.encoding.b64 import b64e, b64d
 from crypto.certificates.certificates import create_x509_csr
 from crypto.crypt_decrypt.decrypt import decrypt_with_private_key
+from crypto.crypt_decrypt.session import CryptoSession
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization, hashes
 from client.ca_handler.ca_info import CA_URL
+from client.ca_handler.ca_message import load_ca_public_key
 
 
 # =============  Registration & Setup ============= 
@@ -77,6 +79,12 @@ def connect_and_register_to_ca(client):
 
         client.ca_session_key = session_key
 
+        # Key tree path keys ({node: key}), sent encrypted with the session key
+        lkh_keys = None
+        if data.get("lkh_path_b64"):
+            lkh_path = json.loads(CryptoSession(session_key).decrypt(data["lkh_path_b64"]))
+            lkh_keys = {node: b64d(key) for node, key in lkh_path["path"]}
+
         UI.step("Secure Channel", "ESTABLISHED")
 
     except Exception as e:
@@ -88,6 +96,7 @@ def connect_and_register_to_ca(client):
         "cert_pem": b64d(data["cert_pem_b64"]),
         "ca_pub_pem": b64d(data["ca_pub_pem_b64"]),
         "group_key": group_key,
+        "lkh_keys": lkh_keys,
         "token_quota": data["token_quota"],
     }
 
@@ -123,11 +132,7 @@ def request_winner_reveal(client, token_id, encrypted_identity_blob):
             separators=(',', ':')
         ).encode('utf-8')
 
-        pem_data = client.ca_pub_pem
-        if isinstance(pem_data, str):
-            pem_data = pem_data.encode('utf-8')
-
-        ca_pub_key = serialization.load_pem_public_key(pem_data)
+        ca_pub_key = load_ca_public_key(client.ca_pub_pem)
 
         ca_pub_key.verify(
             signature,
@@ -8,4 +8,8 @@ else:
 
 
 CA_PORT = 8443
-CA_URL = f"http://{CA_IP}:{CA_PORT}"
\ No newline at end of file
+CA_URL = f"http://{CA_IP}:{CA_PORT}"
+
+# Cadence (seconds) of the signed time beacon, used until the CA announces its own
+# ("interval" field of the "/beacon" answer, set by CA_BEACON_INTERVAL)
+BEACON_INTERVAL = 1
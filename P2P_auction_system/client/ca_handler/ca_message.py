@@ -1,16 +1,72 @@
+import time
 import base64
 import requests
+import threading
+from functools import lru_cache
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from client.ca_handler.ca_info import CA_URL
+from client.ca_handler.ca_info import CA_URL, BEACON_INTERVAL
+
+# Number of already verified (timestamp, signature) pairs kept in memory
+TIMESTAMP_CACHE_SIZE = 4096
+
+# Latest CA time beacon, shared by every sender of this client
+_beacon = None
+_beacon_fetched_at = 0.0
+_beacon_interval = BEACON_INTERVAL
+_beacon_lock = threading.Lock()
 
 
 # ============= Timestamp Services =============
 
 def get_valid_timestamp(delta_seconds=None):
     """
-    Requests a cryptographically signed timestamp from the CA to ensure event 
+    Returns a cryptographically signed timestamp from the CA to ensure event 
     ordering and integrity, preventing local clock manipulation.
+    The current time comes from the CA time beacon; future timestamps (delta)
+    are still signed on request.
+    """
+    if delta_seconds is None:
+        return get_time_beacon()
+
+    return request_timestamp(delta_seconds)
+
+
+def get_time_beacon():
+    """
+    Returns the latest signed time beacon of the CA. The CA signs it once per
+    interval, announced with the beacon (BEACON_INTERVAL for a CA that does not), so it
+    is fetched at most once per interval and shared by every message sent meanwhile
+    (same format as a "/timestamp" answer).
+    Falls back to "/timestamp" if the CA does not publish a beacon.
+    """
+    global _beacon, _beacon_fetched_at, _beacon_interval
+
+    with _beacon_lock:
+        if _beacon is not None and time.monotonic() - _beacon_fetched_at < _beacon_interval:
+            return dict(_beacon)
+
+        try:
+            response = requests.get(f"{CA_URL}/beacon", timeout=5)
+            response.raise_for_status()
+
+            data = response.json()
+            _beacon_interval = float(data.pop("interval", BEACON_INTERVAL))
+            _beacon = data
+            _beacon_fetched_at = time.monotonic()
+            return dict(_beacon)
+
+        except Exception as e:
+            print(f"Error fetching time beacon: {e}")
+
+    return request_timestamp()
+
+
+def request_timestamp(delta_seconds=None):
+    """
+    Requests a freshly signed timestamp from the CA ("/timestamp"),
+    optionally shifted by delta_seconds into the future.
     """
     try:
         params = {}
@@ -29,6 +85,41 @@ def get_valid_timestamp(delta_seconds=None):
         return None
 
 
+@lru_cache(maxsize=8)
+def load_ca_public_key(ca_pub_pem):
+    """
+    Parses the CA public key PEM. Cached, so each client parses it only once
+    instead of on every received message.
+    """
+    if isinstance(ca_pub_pem, str):
+        ca_pub_pem = ca_pub_pem.encode('utf-8')
+
+    return serialization.load_pem_public_key(ca_pub_pem)
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def _verify_timestamp_cached(ca_pub_pem, ts_iso, sig_b64):
+    """
+    RSA-PSS verification of a (timestamp, signature) pair, memoized: the same signed
+    timestamp is attached to many messages, and is only verified once.
+    """
+    ca_pub_key = load_ca_public_key(ca_pub_pem)
+
+    try:
+        ca_pub_key.verify(
+            base64.b64decode(sig_b64),
+            ts_iso.encode('utf-8'),
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+        return True
+    except InvalidSignature:
+        return False
+
+
 def verify_timestamp_signature(ca_pub_pem, timestamp_data):
     """
     Verifies that a timestamp attached to a message was legitimately signed by the CA,
@@ -44,24 +135,11 @@ def verify_timestamp_signature(ca_pub_pem, timestamp_data):
         if not ts_iso or not sig_b64:
             return False
 
-        data_bytes = ts_iso.encode('utf-8')
-        signature = base64.b64decode(sig_b64)
+        if _verify_timestamp_cached(ca_pub_pem, ts_iso, sig_b64):
+            return True
 
-        if isinstance(ca_pub_pem, str):
-            ca_pub_pem = ca_pub_pem.encode('utf-8')
-
-        ca_pub_key = serialization.load_pem_public_key(ca_pub_pem)
-
-        ca_pub_key.verify(
-            signature,
-            data_bytes,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
-        return True
+        print("[Security] Falha na verificação da assinatura do Timestamp: invalid signature")
+        return False
 
     except Exception as e:
         print(f"[Security] Falha na verificação da assinatura do Timestamp: {e}")
@@ -78,12 +156,13 @@ def leave_network(uid):
     try:
         payload = {"uid": uid}
         
-        response = requests.post(f"{CA_URL}/leave", json=payload)
+        # The CA answers once the batched Group Key rotation is done (a few seconds at most)
+        response = requests.post(f"{CA_URL}/leave", json=payload, timeout=15)
         response.raise_for_status()
         
         data = response.json()
         
-        print(f"Successfully left. New Group Key received.")
+        print("Successfully left. New Group Key received.")
         
         return data["new_keys"]
 
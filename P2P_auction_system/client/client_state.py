@@ -1,3 +1,7 @@
+from collections import deque
+from network.framing import WIRE_JSON
+from crypto.crypt_decrypt.session import CryptoSession
+
 class Client:
     def __init__(self, user_path, public_key, private_key):
         self.uuid = None
@@ -6,20 +10,44 @@ class Client:
         self.user_path = user_path
         self.cert_pem = None
         self.ca_pub_pem = None
-        self.group_key = None
+        self.group_session = None
+        self.lkh_keys = None
         self.ca_session_key = None
         self.token_manager = None
         self.ledger_request_id = None
+        self.ledger_sync = None
+        self.sync_responses = deque(maxlen=64)
         self.ledger = None
+        self.auction_projection = None
         self.is_running = None
+        self.wire_format = WIRE_JSON
+        self.wire_deadline = None
+        self.bin1_peers = 0
+        self.legacy_peer = False
         self.auctions = {
                             "last_auction_id": 0,
                             "auction_list": {},
                             "my_auctions": {},
                             "winning_auction":{},
                         }
-                        
-        
+
+    @property
+    def group_key(self):
+        """
+        The current Group Key, read from the active crypto session.
+        """
+        session = self.group_session
+        return session.key if session else None
+
+    @group_key.setter
+    def group_key(self, key):
+        """
+        Replaces the Group Key. The new key and its prebuilt cipher are published together
+        with a single assignment, so concurrent senders/receivers switch atomically.
+        """
+        self.group_session = CryptoSession(key) if key else None
+
+
 
 """ Example
 
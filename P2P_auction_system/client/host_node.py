@@ -7,10 +7,9 @@ from config.config import parse_config
 from client.client_state import Client
 from security_monitor import log_security_event
 from crypto.token.token_manager import TokenManager
-from client.ledger.ledger_handler import init_cli_ledger
+from client.ledger.ledger_handler import init_cli_ledger, init_auction_projection
 from crypto.keys.keys_handler import prepare_key_pair_generation
 from client.ca_handler.ca_connection import connect_and_register_to_ca
-from client.ledger.translation.ledger_to_dict import ledger_to_auction_dict
 
 def check_user_path(user_path):
     """
@@ -60,6 +59,7 @@ def start_client(args):
         client.cert_pem = info["cert_pem"]
         client.ca_pub_pem = info["ca_pub_pem"]
         client.group_key = info["group_key"]
+        client.lkh_keys = info["lkh_keys"]
         client.is_running = True
         
         UI.step("Certificate Authority", "REGISTERED")
@@ -76,12 +76,12 @@ def start_client(args):
             ca_pub_pem=client.ca_pub_pem,
             uid=info["uid"]
         )
+        client.token_manager.start_token_pool()
 
         # Load and Synchronize Local Ledger (Blockchain)
         init_cli_ledger(client, user_path)
-        
-        if not len(client.ledger.chain) == 1:
-            client.auctions = ledger_to_auction_dict(client.ledger, client.token_manager)
+        init_auction_projection(client, user_path)
+        client.token_manager.discard_used_tokens(client.ledger.token_used)
 
         log_security_event(
             event_type="wallet_loaded", 
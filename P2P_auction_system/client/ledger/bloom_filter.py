@@ -0,0 +1,44 @@
+import math
+import hashlib
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Fixed-size probabilistic set. "might_contain" never returns a false negative,
+        so a miss proves a token was never seen and the exact lookup can be skipped.
+        Sized for "capacity" items at the requested false-positive rate; past that the
+        rate degrades, so the owner rebuilds a larger filter once "full" is True.
+        """
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        """
+        Derives the bit positions of an item from two 64-bit halves of one
+        BLAKE2b digest (Kirsch-Mitzenmacher double hashing).
+        """
+        digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def might_contain(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __contains__(self, item):
+        return self.might_contain(item)
@@ -1,17 +1,91 @@
 import json, random
 from security_monitor import log_security_event
-from client.ledger.ledger_logic import Ledger, compare_chains
-from client.ledger.translation.ledger_to_dict import ledger_to_auction_dict
+from client.ledger.ledger_logic import Ledger, compare_chains, receive_block, validate_block, validate_genesis
+from client.ledger.translation.ledger_to_dict import AuctionProjection
 from client.ca_handler.ca_message import get_valid_timestamp
+from network.framing import SUPPORTED_WIRE_FORMATS
+
+# Bounds of the blocks carried by one 'ledger_update' batch. Kept well below the Relay
+# per-peer high-water mark (see network/relay_engine.py), which drops larger frames.
+SYNC_BATCH_BLOCKS = 256
+SYNC_BATCH_BYTES = 512 * 1024
+
+# Number of tip hashes listed one by one in a block locator before the step starts doubling
+LOCATOR_DENSE_ENTRIES = 10
 
 
 # ============= Network Request Handling =============
 
 
-def ledger_request_handler(request_id, client):
+def ledger_request_handler(client, request):
+    """
+    Processes an incoming 'ledger_request'.
+    Requesters that announce their tip (see 'prepare_ledger_request') get one bounded batch
+    of the blocks they miss, starting right after the last block both chains share.
+    Nothing is sent if the local chain is not longer, or if the requester is following
+    another responder. Legacy requesters get the whole ledger in a single 'ledger_update'.
+    """
+    request_id = request.get("request_id")
+    locator = request.get("locator")
+
+    if locator is None:
+        return legacy_ledger_response(request_id, client)
+
+    response_id = request.get("response_id")
+    if response_id is not None and response_id not in client.sync_responses:
+        return None
+
+    chain = client.ledger.chain
+    try:
+        if len(chain) - 1 <= int(request.get("tip_height", -1)):
+            return None
+    except (TypeError, ValueError):
+        return None
+
+    # Fork point: highest locator entry that is also in the local chain
+    base = -1
+    for height, block_hash in locator:
+        if isinstance(height, int) and 0 <= height < len(chain) and chain[height]["block_hash"] == block_hash:
+            base = height
+            break
+
+    blocks = []
+    size = 0
+    for block in chain[base + 1:base + 1 + SYNC_BATCH_BLOCKS]:
+        size += len(json.dumps(block))
+        if blocks and size > SYNC_BATCH_BYTES:
+            break
+        blocks.append(block)
+
+    try:
+        token_data = client.token_manager.get_token()
+    except Exception as e:
+        print(f"[!] It was not possible to bid: {e}")
+        return None
+
+    if response_id is None:
+        response_id = random.randint(1, 1000000000)
+        client.sync_responses.append(response_id)
+
+    update_obj = {
+        "request_id": request_id,
+        "type": "ledger_update",
+        "wire_formats": SUPPORTED_WIRE_FORMATS,
+        "response_id": response_id,
+        "start_height": base + 1,
+        "tip_height": len(chain) - 1,
+        "blocks": blocks,
+        "token": token_data,
+        "timestamp": get_valid_timestamp()
+    }
+
+    return json.dumps(update_obj)
+
+
+def legacy_ledger_response(request_id, client):
     """
-    Processes an incoming 'ledger_request'. Serializes the local ledger and 
-    packages it into a 'ledger_update' message to sync the requesting peer.
+    Serializes the local ledger and packages it into a 'ledger_update' message
+    to sync a requesting peer that does not support incremental sync.
     """
     to_send = client.ledger.to_dict()
 
@@ -26,6 +100,7 @@ def ledger_request_handler(request_id, client):
     upadte_obj = {
         "request_id": request_id,
         "type": "ledger_update",
+        "wire_formats": SUPPORTED_WIRE_FORMATS,
         "ledger": to_send,
         "token": token_data,
         "timestamp": timestamp
@@ -36,10 +111,50 @@ def ledger_request_handler(request_id, client):
     return upadte_json
 
 
-def prepare_ledger_request(client):
+def sync_hash_at(client, height):
     """
-    Creates a 'ledger_request' message to broadcast 
-    to the network when the client just joined.
+    Hash of the block at 'height' of the chain being synchronized: the local chain,
+    or the local prefix plus the buffered blocks while following a fork.
+    """
+    sync = client.ledger_sync
+    if sync and sync["fork_height"] is not None and height >= sync["fork_height"]:
+        return sync["blocks"][height - sync["fork_height"]]["block_hash"]
+    return client.ledger.chain[height]["block_hash"]
+
+
+def sync_tip_height(client):
+    sync = client.ledger_sync
+    if sync and sync["fork_height"] is not None:
+        return sync["fork_height"] + len(sync["blocks"]) - 1
+    return len(client.ledger.chain) - 1
+
+
+def block_locator(client):
+    """
+    Lists (height, hash) pairs of the chain being synchronized: the last blocks one by one,
+    then with a doubling step down to genesis. A responder finds the fork point in O(log n)
+    entries, whatever the length of both chains.
+    """
+    locator = []
+    height = sync_tip_height(client)
+    step = 1
+
+    while height > 0:
+        locator.append([height, sync_hash_at(client, height)])
+        if len(locator) >= LOCATOR_DENSE_ENTRIES:
+            step *= 2
+        height -= step
+
+    locator.append([0, sync_hash_at(client, 0)])
+    return locator
+
+
+def prepare_ledger_request(client, response_id=None):
+    """
+    Creates a 'ledger_request' message to broadcast to the network when the client
+    just joined. It announces the local tip and a block locator so peers only send the
+    missing blocks. Follow-up requests of a running sync name the 'response_id' of the
+    peer being followed, so the other peers stay silent.
     """
     try:
         token_data = client.token_manager.get_token()
@@ -47,34 +162,231 @@ def prepare_ledger_request(client):
         print(f"[!] It was not possible to bid: {e}")
         return None
 
+    if response_id is None:
+        client.ledger_sync = None
+
     client.ledger_request_id = random.randint(1, 1000000000)
     timestamp = get_valid_timestamp()
 
     update_obj = {
         "request_id": client.ledger_request_id,
         "type": "ledger_request",
+        "wire_formats": SUPPORTED_WIRE_FORMATS,
+        "tip_height": sync_tip_height(client),
+        "tip_hash": sync_hash_at(client, sync_tip_height(client)),
+        "locator": block_locator(client),
         "token": token_data,
         "timestamp": timestamp
     }
 
+    if response_id is not None:
+        update_obj["response_id"] = response_id
+
     update_json = json.dumps(update_obj)
     return update_json
 
 
 # ============= Network Update Processing =============
 
-def ledger_update_handler(client, ledger_update_message):   
+def blocks_tokens(blocks):
+    """
+    Collects the (token_id, token_sig) pair of every event recorded in a list of blocks.
+    """
+    tokens = []
+    for block in blocks:
+        for event in block.get("events", []):
+            if event.get("type") == "genesis":
+                continue
+            token = event.get("token") or {}
+            tokens.append((token.get("token_id"), token.get("token_sig")))
+    return tokens
+
+
+def is_ledger_update_for_me(client, ledger_update_message):
+    """
+    Checks if a 'ledger_update' answers the pending ledger request of this client.
+    Every peer receives every update, so the others are dropped before any crypto check.
+    """
+    request_id = client.ledger_request_id
+    return bool(request_id) and ledger_update_message.get("request_id") == request_id
+
+
+def ledger_update_handler(client, ledger_update_message):
+    """
+    Routes a 'ledger_update' to the incremental sync ('blocks' batch) or to the
+    legacy full ledger replacement. Returns the follow-up 'ledger_request' to send
+    while the sync is not complete.
+    """
+    if "blocks" in ledger_update_message:
+        return ledger_delta_handler(client, ledger_update_message)
+
+    return legacy_ledger_update_handler(client, ledger_update_message)
+
+
+def ledger_delta_handler(client, msg):
+    """
+    Applies one batch of an incremental sync.
+    Blocks already in the local chain are skipped and the ones extending it are validated
+    and appended right away. Blocks diverging from the local chain are buffered until
+    the responder tip is reached, then the fork replaces the local suffix only if it
+    is valid and longer (Longest Chain Rule).
+    """
+    sync = client.ledger_sync
+    response_id = msg.get("response_id")
+
+    # Only one responder is followed per sync
+    if sync and sync["response_id"] != response_id:
+        return None
+
+    blocks = msg.get("blocks") or []
+    try:
+        start = int(msg.get("start_height"))
+        tip_height = int(msg.get("tip_height"))
+    except (TypeError, ValueError):
+        return None
+
+    if not all(client.token_manager.verify_tokens(blocks_tokens(blocks))):
+        log_security_event(
+            event_type="ledger_divergence",
+            status="failure",
+            reason="Incoming ledger update contains events with invalid token signatures"
+        )
+        return None
+
+    if sync is None:
+        sync = {"response_id": response_id, "fork_height": None, "blocks": []}
+        client.ledger_sync = sync
+
+    chain = client.ledger.chain
+    added = 0
+
+    if sync["fork_height"] is not None:
+        # Following a fork: the batch must continue the buffered blocks
+        if start != sync["fork_height"] + len(sync["blocks"]):
+            return None
+        sync["blocks"].extend(blocks)
+        added = len(blocks)
+    else:
+        skip = 0
+        while skip < len(blocks) and start + skip < len(chain) \
+                and chain[start + skip]["block_hash"] == blocks[skip].get("block_hash"):
+            skip += 1
+
+        height = start + skip
+        remaining = blocks[skip:]
+
+        if height > len(chain):
+            return None
+
+        if height < len(chain) and remaining:
+            if tip_height + 1 <= len(chain):
+                # The remote fork is not longer than the local chain
+                return finish_ledger_sync(client, False)
+            sync["fork_height"] = height
+            sync["blocks"] = remaining
+            added = len(remaining)
+        else:
+            for block in remaining:
+                ok, reason = receive_block(client.ledger, block)
+                if not ok:
+                    log_security_event(
+                        event_type="ledger_divergence",
+                        status="failure",
+                        reason=f"Incoming ledger block rejected: {reason}"
+                    )
+                    return finish_ledger_sync(client, True)
+
+            added = len(remaining)
+            if remaining:
+                client.ledger.save_to_file(client.user_path / "ledger.json")
+
+    if sync_tip_height(client) >= tip_height:
+        if sync["fork_height"] is not None:
+            return finish_ledger_sync(client, apply_ledger_fork(client))
+        return finish_ledger_sync(client, True)
+
+    if not added:
+        # No progress: the responder keeps sending what we already have
+        return finish_ledger_sync(client, False)
+
+    return prepare_ledger_request(client, response_id)
+
+
+def apply_ledger_fork(client):
+    """
+    Validates the buffered fork on top of the shared local prefix and
+    replaces the local chain with it.
+    """
+    sync = client.ledger_sync
+    fork_height = sync["fork_height"]
+    chain = client.ledger.chain
+
+    prev = chain[fork_height - 1] if fork_height > 0 else None
+    for block in sync["blocks"]:
+        if prev is None:
+            ok, reason = validate_genesis(block)
+            reason = f"Invalid genesis block: {reason}"
+        else:
+            ok, reason = validate_block(block, prev)
+        if not ok:
+            log_security_event(
+                event_type="ledger_divergence",
+                status="failure",
+                reason=f"Incoming ledger fork rejected: {reason}"
+            )
+            return False
+        prev = block
+
+    client.ledger.replace_from(fork_height, sync["blocks"])
+    client.ledger.save_to_file(client.user_path / "ledger.json")
+    return True
+
+
+def finish_ledger_sync(client, updated):
+    """
+    Closes the pending ledger request and, if the chain changed,
+    rebuilds the auction state from it.
+    """
+    client.ledger_request_id = 0
+    client.ledger_sync = None
+
+    if updated:
+        log_security_event(
+            event_type="chain_updated",
+            status="success",
+            reason=f"Ledger synced. New height: {len(client.ledger.chain)}"
+        )
+        project_auctions(client)
+
+    return None
+
+
+def legacy_ledger_update_handler(client, ledger_update_message):
     """
     Processes a 'ledger_update' received from a peer. It compares the received chain
     with the local chain. If the remote chain is longer and valid, it replaces the 
     local ledger (Synchronization) and rebuilds the auction state.
+    Every token recorded in the remote chain past the prefix shared with the
+    local chain must carry a valid CA signature.
     """
     received_ledger = ledger_update_message.get("ledger")
     ledger = Ledger.from_dict(received_ledger)
 
     # Consensus: Longest Chain Rule
     if compare_chains(client.ledger.chain, ledger.chain) == "remote":
-        if ledger.verify_chain():
+        # The prefix shared with the local (verified) chain is neither re-verified nor re-checked
+        shared = ledger.adopt_verified_prefix(client.ledger)
+
+        if not all(client.token_manager.verify_tokens(blocks_tokens(ledger.chain[shared + 1:]))):
+            log_security_event(
+                event_type="ledger_divergence", 
+                status="failure", 
+                reason="Incoming ledger update contains events with invalid token signatures"
+            )
+            return False
+
+        valid, reason = ledger.verify_chain()
+        if valid:
             log_security_event(
                 event_type="chain_updated", 
                 status="success", 
@@ -86,14 +398,13 @@ def ledger_update_handler(client, ledger_update_message):
             client.ledger.save_to_file(client.user_path / "ledger.json") 
             client.ledger_request_id = 0
 
-            # Re-interpret the blockchain to update run-time dictionary state
-            translated_ledger = ledger_to_auction_dict(client.ledger, client.token_manager)
-            client.auctions = translated_ledger
+            # Re-interpret the new blocks to update run-time dictionary state
+            project_auctions(client)
         else:
             log_security_event(
                 event_type="ledger_divergence", 
                 status="failure", 
-                reason="Incoming ledger update contains hash mismatches or invalid state"
+                reason=f"Incoming ledger update contains hash mismatches or invalid state: {reason}"
             )
             return False
 
@@ -101,13 +412,11 @@ def ledger_update_handler(client, ledger_update_message):
 
 def init_cli_ledger(client, user_path):
     """
-    Initializes the client's ledger on startup. Attempts to load from file
-    and if the file is missing or invalid, creates a new Genesis ledger.
+    Initializes the client's ledger on startup. Streams it from the block log
+    (migrating a legacy ledger.json if needed) and if nothing valid is stored,
+    creates a new Genesis ledger.
     """
     ledger_path = user_path  / "ledger.json"
-    
-    if not ledger_path.exists():
-        ledger_path.touch()
 
     current_ledger = Ledger.load_from_file(ledger_path)
 
@@ -117,4 +426,31 @@ def init_cli_ledger(client, user_path):
     else:
         client.ledger = current_ledger
 
-    return
\ No newline at end of file
+    return
+
+
+def init_auction_projection(client, user_path):
+    """
+    Builds the auction state on startup, resuming from the projection checkpoint
+    and applying only the blocks stored after it.
+    """
+    client.auction_projection = AuctionProjection(
+        client.token_manager,
+        user_path / "auctions_checkpoint.json"
+    )
+    client.auction_projection.load_checkpoint(client.ledger)
+    project_auctions(client)
+
+
+def project_auctions(client):
+    """
+    Applies the blocks appended to the ledger since the last projection and
+    replaces 'client.auctions' with the result, keeping its local-only fields
+    (see 'AuctionProjection.keep_local'). The result is checkpointed.
+    """
+    if client.auction_projection is None:
+        init_auction_projection(client, client.user_path)
+        return
+
+    client.auctions = client.auction_projection.update(client.ledger, client.auctions)
+    client.auction_projection.save_checkpoint()
@@ -1,6 +1,32 @@
+import os
 import hashlib
 import json
 from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from client.ledger.bloom_filter import BloomFilter
+from client.ledger.ledger_store import BlockLog
+from client.ledger.ledger_sqlite import SQLiteLedgerStore, StoredChain
+
+# Smallest Bloom filter put in front of the SQLite token lookups
+BLOOM_FILTER_MIN_CAPACITY = 1024
+
+# Storage backend of the ledger:
+#   "log"    -> append-only block log, lookups served by in-memory indexes
+#   "sqlite" -> SQLite database, lookups served by indexed queries
+LEDGER_BACKENDS = ("log", "sqlite")
+LEDGER_BACKEND = os.environ.get("LEDGER_BACKEND", "log")
+
+if LEDGER_BACKEND not in LEDGER_BACKENDS:
+    raise ValueError(f"Unknown ledger backend: {LEDGER_BACKEND}")
+
+# The index sidecar is checkpointed at least every this many appended blocks, so a
+# restart only re-indexes the blocks stored after the last checkpoint
+INDEX_CHECKPOINT_BLOCKS = 256
+
+# Full audits of chains shorter than this are not worth starting worker processes
+PARALLEL_VERIFY_MIN_BLOCKS = 20000
+VERIFY_CHUNK_BLOCKS = 5000
 
 
 # ============= Utility Functions =============
@@ -16,6 +42,98 @@ def compute_hash(block):
     return hashlib.sha256(block_str).hexdigest()
 
 
+def audit_blocks(prev_height, prev_hash, blocks):
+    """
+    Checks a contiguous run of blocks that must follow the block ('prev_height', 'prev_hash'):
+    heights, hash linkage and recomputed hashes. Runs in the worker processes of
+    'Ledger.audit_chain', which only get the run and its boundary, never the whole chain.
+    Returns the reason of the first invalid block, or None.
+    """
+    for block in blocks:
+        if block["height"] != prev_height + 1:
+            return f"Height mismatch at block {block['height']}"
+
+        if block["prev_hash"] != prev_hash:
+            return f"Prev_hash mismatch at block {block['height']}"
+
+        if compute_hash(block) != block["block_hash"]:
+            return f"Invalid block_hash at block {block['height']}"
+
+        prev_height, prev_hash = block["height"], block["block_hash"]
+    return None
+
+
+def index_path(ledger_path):
+    """
+    Path of the index sidecar stored next to a ledger file (ledger.json -> ledger_index.json).
+    """
+    root, ext = os.path.splitext(str(ledger_path))
+    return f"{root}_index{ext or '.json'}"
+
+
+def blocks_path(ledger_path):
+    """
+    Directory of the block log stored next to a ledger file (ledger.json -> ledger_blocks/).
+    """
+    root, _ = os.path.splitext(str(ledger_path))
+    return f"{root}_blocks"
+
+
+# Block logs are kept open for the lifetime of the process, one per ledger path
+_block_logs = {}
+
+
+def open_block_log(ledger_path):
+    """
+    Returns the (cached) block log of a ledger file.
+    """
+    directory = blocks_path(ledger_path)
+    if directory not in _block_logs:
+        _block_logs[directory] = BlockLog(directory)
+    return _block_logs[directory]
+
+
+def sqlite_path(ledger_path):
+    """
+    Path of the SQLite database stored next to a ledger file (ledger.json -> ledger.db).
+    """
+    root, _ = os.path.splitext(str(ledger_path))
+    return f"{root}.db"
+
+
+_sqlite_stores = {}
+
+
+def open_sqlite_store(ledger_path):
+    """
+    Returns the (cached) SQLite store of a ledger file.
+    """
+    db_path = sqlite_path(ledger_path)
+    if db_path not in _sqlite_stores:
+        _sqlite_stores[db_path] = SQLiteLedgerStore(db_path)
+    return _sqlite_stores[db_path]
+
+
+def migrate_legacy_ledger(ledger_path, log):
+    """
+    Moves a ledger saved as a single JSON array (the format used before the block log)
+    into the block log. The old file is kept as '<name>.migrated'.
+    Returns the migrated chain, or an empty list if there is no legacy ledger.
+    """
+    if not os.path.exists(ledger_path) or os.path.getsize(ledger_path) == 0:
+        return []
+
+    with open(ledger_path, "r") as f:
+        chain = json.load(f)
+
+    log.save_chain(chain)
+    log.sync()
+    os.replace(ledger_path, f"{ledger_path}.migrated")
+    print(f"[Ledger] Migrated {len(chain)} blocks from {ledger_path} to {log.directory}")
+
+    return chain
+
+
 # ============= Ledger Core =============
 
 class Ledger:
@@ -23,15 +141,23 @@ class Ledger:
         self.chain = []
         self.current_actions = []
         self.max_actions = 1
+        self.bloom = None
+        self.store = None
+        self.index_checkpoint_height = -1
+        self.verified_height = -1
+        self.verified_hash = None
         self.create_ledger()
+        self.rebuild_indexes()
+        self.mark_verified()
 
     # Network Serialization Utils
     def to_dict(self):
         """
         Serializes the Ledger object into a dictionary for network transmission.
+        A chain served by a SQLite store is read in full here (legacy sync only).
         """
         return {
-            "chain": self.chain,
+            "chain": list(self.chain),
             "current_actions": self.current_actions,
             "max_actions": self.max_actions
         }
@@ -45,8 +171,173 @@ class Ledger:
         obj.chain = data["chain"]
         obj.current_actions = data["current_actions"]
         obj.max_actions = data["max_actions"]
+        obj.rebuild_indexes()
+        obj.verified_height = -1
+        obj.verified_hash = None
         return obj
 
+    # ============= Indexes =============
+    #
+    # Every index maps a key to event locations (position in chain, position in block),
+    # so lookups are O(1) without duplicating event payloads in memory:
+    #   token_index:   token_id   -> location of the first event that used the token
+    #   auction_index: auction_id -> location of the 'auction' creation event
+    #   bid_index:     auction_id -> locations of the 'bid' events, in chain order
+
+    def rebuild_indexes(self):
+        """
+        Rebuilds every in-memory index from the chain. Must be called whenever
+        'self.chain' is replaced instead of extended block by block.
+        With a SQLite store attached, the store is brought in line with the chain instead.
+        """
+        if self.store is not None:
+            self.attach_store(self.store)
+            return
+
+        self.token_index = {}
+        self.auction_index = {}
+        self.bid_index = {}
+        self.indexed_height = -1
+        self.index_blocks_from(0)
+
+    def index_blocks_from(self, start):
+        """
+        Indexes the blocks of the chain from position 'start' to the tip.
+        """
+        for position in range(start, len(self.chain)):
+            self.index_block(self.chain[position], position)
+
+    def index_block(self, block, position=None):
+        """
+        Adds the events of a newly appended block to the indexes.
+        """
+        if position is None:
+            position = len(self.chain) - 1
+
+        if self.store is not None:
+            # Already stored by 'StoredChain.append'
+            self.indexed_height = position
+            self.bloom_add_block(block)
+            return
+
+        for event_pos, action in enumerate(block.get("events", [])):
+            location = (position, event_pos)
+            event_type = action.get("type")
+
+            if event_type == "auction" and action.get("id") is not None:
+                self.auction_index.setdefault(action.get("id"), location)
+            elif event_type == "bid" and action.get("auction_id") is not None:
+                self.bid_index.setdefault(action.get("auction_id"), []).append(location)
+
+            token = action.get("token")
+            if not isinstance(token, dict):
+                continue
+
+            token_id = token.get("token_id")
+            if token_id is None:
+                continue
+
+            self.token_index.setdefault(token_id, location)
+
+        self.indexed_height = position
+
+    def attach_store(self, store):
+        """
+        Moves the ledger to a SQLite store: the chain is written to it, then served by it
+        (see 'StoredChain'), and the in-memory indexes are released.
+        """
+        if not (isinstance(self.chain, StoredChain) and self.chain.store is store):
+            store.save_chain(self.chain)
+            self.chain = StoredChain(store)
+        self.store = store
+        self.token_index = {}
+        self.auction_index = {}
+        self.bid_index = {}
+        self.indexed_height = len(self.chain) - 1
+        self.enable_bloom_filter()
+
+    def event_at(self, location):
+        """
+        Returns the event stored at an index location.
+        """
+        position, event_pos = location
+        return self.chain[position]["events"][event_pos]
+
+    def enable_bloom_filter(self, capacity=None, error_rate=0.001):
+        """
+        Puts a Bloom filter in front of the token lookups of the SQLite store, sized for
+        twice the tokens it holds. Double-spend checks for unseen tokens (the common case)
+        are then answered without a query. The in-memory backend needs none: its exact
+        token index is already a dict lookup.
+        """
+        capacity = capacity or max(2 * self.store.token_count(), BLOOM_FILTER_MIN_CAPACITY)
+        self.bloom = BloomFilter(capacity, error_rate)
+        for token_id in self.store.iter_token_ids():
+            self.bloom.add(token_id)
+
+    def bloom_add_block(self, block):
+        """
+        Adds the tokens of a block just stored to the Bloom filter. A full filter is
+        rebuilt from the store at twice its capacity, so the false-positive rate stays bounded.
+        """
+        if self.bloom is None:
+            return
+
+        for action in block.get("events", []):
+            token = action.get("token")
+            if isinstance(token, dict) and token.get("token_id") is not None:
+                self.bloom.add(token["token_id"])
+
+        if self.bloom.full:
+            self.enable_bloom_filter(2 * self.bloom.capacity, self.bloom.error_rate)
+
+    def save_indexes(self, path):
+        """
+        Persists the indexes next to the ledger file, tagged with the tip they describe.
+        Written to a temporary file first, so a crash never leaves a torn sidecar.
+        """
+        if not self.chain:
+            return
+
+        data = {
+            "height": self.indexed_height,
+            "tip_hash": self.chain[self.indexed_height]["block_hash"],
+            "tokens": list(self.token_index.items()),
+            "auctions": list(self.auction_index.items()),
+            "bids": list(self.bid_index.items()),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        self.index_checkpoint_height = self.indexed_height
+
+    def load_indexes(self, path):
+        """
+        Restores the indexes saved by 'save_indexes' and only indexes the blocks appended
+        after them. Falls back to a full rebuild if the file is missing or describes
+        another chain. Returns True if the saved indexes were used.
+        """
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+
+            height = data["height"]
+            if not (0 <= height < len(self.chain)) or self.chain[height]["block_hash"] != data["tip_hash"]:
+                raise ValueError("Index describes another chain")
+
+            self.token_index = {token_id: tuple(loc) for token_id, loc in data["tokens"]}
+            self.auction_index = {auction_id: tuple(loc) for auction_id, loc in data["auctions"]}
+            self.bid_index = {auction_id: [tuple(loc) for loc in locs] for auction_id, locs in data["bids"]}
+            self.indexed_height = height
+            self.index_checkpoint_height = height
+        except (OSError, ValueError, KeyError, TypeError):
+            self.rebuild_indexes()
+            return False
+
+        self.index_blocks_from(height + 1)
+        return True
+
     def create_ledger(self):
         """
         Initializes the blockchain with a hardcoded Genesis Block.
@@ -100,16 +391,90 @@ class Ledger:
 
         # Commit to Chain
         self.chain.append(new_block)
+        self.index_block(new_block)
+        self.extend_verified()
         self.current_actions = []
 
         return new_block
 
-    def verify_chain(self):
+    # ============= Verification =============
+    #
+    # 'verified_height' / 'verified_hash' remember the tip of the prefix already
+    # verified. Since every block hash covers the previous one, the prefix is still
+    # valid as long as the block at 'verified_height' keeps that hash, and only
+    # the blocks after it need to be checked again.
+
+    def mark_verified(self, height=None):
         """
-        Iterates through the entire blockchain to validate cryptographic integrity.
+        Records the chain up to 'height' (default: the tip) as verified.
+        """
+        if height is None:
+            height = len(self.chain) - 1
+        self.verified_height = height
+        self.verified_hash = self.chain[height]["block_hash"] if height >= 0 else None
+
+    def verified_prefix(self):
+        """
+        Returns the height of the verified prefix still in place, or -1.
+        """
+        height = self.verified_height
+        if 0 <= height < len(self.chain) and self.chain[height]["block_hash"] == self.verified_hash:
+            return height
+        return -1
+
+    def extend_verified(self):
+        """
+        Moves the verified tip onto a block just appended after checking it.
+        """
+        if self.verified_prefix() == len(self.chain) - 2:
+            self.mark_verified()
+
+    def adopt_verified_prefix(self, other):
+        """
+        Replaces the blocks this chain shares with the verified prefix of 'other' by the
+        already verified blocks of 'other', and inherits its verification state.
+        The shared part does not need to be verified again.
+        Returns the height of the adopted prefix, or -1.
+        """
+        height = other.verified_prefix()
+        if height < 0 or height >= len(self.chain) or self.chain[height]["block_hash"] != other.verified_hash:
+            return -1
+
+        self.chain[:height + 1] = other.chain[:height + 1]
+        self.rebuild_indexes()
+        self.mark_verified(height)
+        return height
+
+    def replace_from(self, height, blocks):
+        """
+        Replaces the blocks from 'height' on by an already validated fork, which becomes
+        the verified chain. With a SQLite store only the replaced suffix is touched.
+        """
+        if self.store is not None:
+            self.store.replace_from(height, blocks)
+            self.indexed_height = len(self.chain) - 1
+            self.enable_bloom_filter()
+        else:
+            del self.chain[height:]
+            self.chain.extend(blocks)
+            self.rebuild_indexes()
+
+        self.current_actions = []
+        self.mark_verified()
+
+    def verify_chain(self, full=False, workers=None):
+        """
+        Iterates through the blockchain to validate cryptographic integrity.
         Checks block continuity (height), hash linkage (prev_hash), and data integrity (hash recalculation).
+        Only the blocks after the verified prefix are checked, unless 'full' is set,
+        which audits the whole chain (see 'audit_chain').
         """
-        for i in range(1, len(self.chain)):
+        if full:
+            return self.audit_chain(workers)
+
+        start = max(self.verified_prefix() + 1, 1)
+
+        for i in range(start, len(self.chain)):
             block = self.chain[i]
             prev = self.chain[i - 1]
 
@@ -126,66 +491,157 @@ class Ledger:
             if recalculated != block["block_hash"]:
                 return False, f"Invalid block_hash at block {block['height']}"
 
+        self.mark_verified()
+        return True, "Chain is valid"
+
+    def audit_chain(self, workers=None):
+        """
+        Cold audit of the whole chain, ignoring the verified prefix. The chain is split in
+        runs of VERIFY_CHUNK_BLOCKS blocks, each checked with the hash of the block before
+        it (see 'audit_blocks'); long chains are checked in a pool of spawned processes,
+        so no thread state of the client is forked into them.
+        """
+        ok, reason = validate_genesis(self.chain[0])
+        if not ok:
+            return False, f"Invalid genesis block: {reason}"
+
+        length = len(self.chain)
+        starts = range(1, length, VERIFY_CHUNK_BLOCKS)
+
+        def chunks():
+            for start in starts:
+                prev = self.chain[start - 1]
+                yield prev["height"], prev["block_hash"], self.chain[start:start + VERIFY_CHUNK_BLOCKS]
+
+        if length < PARALLEL_VERIFY_MIN_BLOCKS:
+            results = (audit_blocks(*chunk) for chunk in chunks())
+            bad = next((reason for reason in results if reason), None)
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(audit_blocks, *chunk) for chunk in chunks()]
+                bad = next((reason for reason in (f.result() for f in futures) if reason), None)
+
+        if bad:
+            return False, bad
+
+        self.mark_verified()
         return True, "Chain is valid"
 
     def find_auction_public_key(self, auction_id):
         """
-        Searches the chain for the 'auction' creation event of a specific ID 
-        and returns the public key associated with it (used for reveal encryption).
+        Returns the public key of the 'auction' creation event of a specific ID 
+        (used for reveal encryption).
         """
-        for block in self.chain:
-            for action in block.get("events", []):
-                if action.get("type") == "auction":
-                    if action.get("id") == auction_id:
-                        return action.get("public_key")
+        if self.store is not None:
+            return self.store.auction_public_key(auction_id)
 
-        return None
+        location = self.auction_index.get(auction_id)
+        if location is None:
+            return None
+        return self.event_at(location).get("public_key")
     
     def find_token_signature(self, token_id):
         """
-        Scans the chain to find the CA signature associated with a specific token ID.
+        Returns the CA signature associated with a specific token ID.
         Used for verification during the identity reveal phase.
         """
-        for block in self.chain:
-            for action in block.get("events", []):
-                
-                # Support both naming conventions depending on message type
-                token_info = action.get("token")
-                
-                if not token_info:
-                    continue
+        if self.store is not None:
+            return self.store.token_signature(token_id)
+
+        location = self.token_index.get(token_id)
+        if location is None:
+            return None
+        return self.event_at(location)["token"].get("token_sig")
+
+    def find_auction_bids(self, auction_id):
+        """
+        Returns the 'bid' events recorded for a specific auction, in chain order.
+        """
+        if self.store is not None:
+            return self.store.auction_bids(auction_id)
+
+        return [self.event_at(location) for location in self.bid_index.get(auction_id, [])]
 
-                if token_info.get("token_id") == token_id:
-                    return token_info.get("token_sig")
+    def highest_bid(self, auction_id):
+        """
+        Returns the highest 'bid' recorded for a specific auction, or None if it has no bids.
+        """
+        if self.store is not None:
+            return self.store.highest_bid(auction_id)
 
-        return None
+        bids = []
+        for event in self.find_auction_bids(auction_id):
+            try:
+                bids.append(float(event.get("bid")))
+            except (TypeError, ValueError):
+                continue
+        return max(bids, default=None)
 
 
     # ============= File I/O =============
 
     def save_to_file(self, path):
         """
-        Persists the current blockchain state to a JSON file.
+        Persists the current blockchain state to the append-only block log of 'path'
+        (see 'blocks_path'). Only blocks not yet stored are written; the index sidecar
+        is checkpointed whenever the log starts a new segment and at least every
+        INDEX_CHECKPOINT_BLOCKS blocks.
+        With the "sqlite" backend the chain is moved to (and served from) 'sqlite_path';
+        once attached, blocks are stored as they are appended.
         """
-        with open(path, "w") as f:
-            json.dump(self.chain, f, indent=2)
+        if LEDGER_BACKEND == "sqlite":
+            store = open_sqlite_store(path)
+            if self.store is not store:
+                self.attach_store(store)
+            return
+
+        log = open_block_log(path)
+        rotated = log.save_chain(self.chain)
+
+        stale = self.indexed_height - self.index_checkpoint_height >= INDEX_CHECKPOINT_BLOCKS
+        if rotated or stale or not os.path.exists(index_path(path)):
+            self.save_indexes(index_path(path))
+
+    def close(self, path):
+        """
+        Clean shutdown: fsyncs the block log and checkpoints the index sidecar if blocks
+        were appended since the last checkpoint, so the next start re-indexes nothing.
+        """
+        if self.store is not None:
+            return
+
+        open_block_log(path).close()
+        if self.indexed_height != self.index_checkpoint_height:
+            self.save_indexes(index_path(path))
 
     def load_from_file(path):
         """
-        Static method to load a Ledger object from a JSON file.
-        Returns a fresh Ledger if the file is empty or corrupted.
+        Static method to load a Ledger object from its block log, streaming one block
+        at a time. A legacy whole-file JSON ledger at 'path' is migrated to the log on
+        first load. Returns None if there is nothing to load or the data is corrupted.
+        With the "sqlite" backend the chain is not loaded: it stays in the database and
+        is read on demand (see 'StoredChain'). An empty database is first filled from the
+        block log / legacy file, streamed in one transaction.
         """
-        import os
+        store = open_sqlite_store(path) if LEDGER_BACKEND == "sqlite" else None
+        log = open_block_log(path)
 
-        # If file exists but is empty -> new ledger
-        if os.path.getsize(path) == 0:
+        try:
+            if store is not None:
+                if store.count == 0:
+                    store.import_blocks(log.iter_blocks() if log.count else migrate_legacy_ledger(path, log))
+                chain = StoredChain(store)
+            elif log.count == 0:
+                chain = migrate_legacy_ledger(path, log)
+            else:
+                chain = list(log.iter_blocks())
+                # Blocks after a corrupted record are dropped; peers send them again
+                log.truncate(len(chain))
+        except (ValueError, OSError):
             return None
 
-        # Try reading JSON
-        try:
-            with open(path, "r") as f:
-                chain = json.load(f)
-        except (json.JSONDecodeError, OSError):
+        if not len(chain):
             return None
 
         # Create ledger object without running __init__ to avoid overwriting state
@@ -193,20 +649,32 @@ class Ledger:
         ledger.chain = chain
         ledger.current_actions = []
         ledger.max_actions = 1
+        ledger.bloom = None
+        ledger.store = None
+        ledger.index_checkpoint_height = -1
+
+        # Every stored block was verified before this node wrote it
+        ledger.mark_verified()
+
+        if store is not None:
+            ledger.attach_store(store)
+        else:
+            ledger.load_indexes(index_path(path))
 
         return ledger
     
     def token_used(self, token):
         """
         Checks if a specific token ID has already been recorded in the blockchain,
-        effectively preventing Double-Spending.
+        effectively preventing Double-Spending. Constant time, via the token index
+        (or the Bloom filter and an indexed query with the SQLite store).
         """
-        for block in self.chain:
-            for action in block.get("events", []):
-                if not action.get("type") == "genesis":
-                    if action.get("token").get("token_id") == token:
-                        return True
-        return False
+        if self.store is not None:
+            if self.bloom is not None and not self.bloom.might_contain(token):
+                return False
+            return self.store.token_used(token)
+
+        return token in self.token_index
 
 
 # ============= Ledger Helpers =============
@@ -230,6 +698,24 @@ def validate_block(block, prev_block):
     return True, "OK"
 
 
+def validate_genesis(block):
+    """
+    Validates a received Genesis Block. Every node creates its own (see 'create_ledger'),
+    so only its shape and its hash can be checked, not a fixed value.
+    """
+    if block.get("height") != 0 or block.get("prev_hash") != "0":
+        return False, "Not a genesis block"
+
+    events = block.get("events")
+    if not isinstance(events, list) or len(events) != 1 or events[0].get("type") != "genesis":
+        return False, "Genesis block must only hold the genesis event"
+
+    if compute_hash(block) != block.get("block_hash"):
+        return False, "Hash mismatch"
+
+    return True, "OK"
+
+
 def receive_block(ledger, block):
     """
     Attempts to append a received block to the local ledger after validation.
@@ -241,6 +727,8 @@ def receive_block(ledger, block):
         return False, msg
 
     ledger.chain.append(block)
+    ledger.index_block(block)
+    ledger.extend_verified()
     return True, "Block accepted"
 
 
@@ -0,0 +1,336 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Decoded blocks kept in memory by a store (the tip and the blocks around it are read the most)
+BLOCK_CACHE_SIZE = 256
+
+# Rows fetched per query by the streaming reads, each one under the store lock
+STREAM_PAGE_ROWS = 512
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    height      INTEGER PRIMARY KEY,
+    block_hash  TEXT NOT NULL,
+    prev_hash   TEXT,
+    timestamp   TEXT,
+    data        TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    height      INTEGER NOT NULL,
+    idx         INTEGER NOT NULL,
+    type        TEXT,
+    event_id,
+    auction_id,
+    token_id    TEXT,
+    token_sig   TEXT,
+    public_key  TEXT,
+    bid         REAL,
+    PRIMARY KEY (height, idx)
+);
+
+CREATE INDEX IF NOT EXISTS idx_events_token ON events(token_id);
+CREATE INDEX IF NOT EXISTS idx_events_auction ON events(auction_id, type);
+CREATE INDEX IF NOT EXISTS idx_events_creation ON events(type, event_id);
+"""
+
+
+def event_row(height, idx, event):
+    """
+    Flattens the queryable fields of a ledger event into an 'events' row.
+    """
+    token = event.get("token")
+    if not isinstance(token, dict):
+        token = {}
+
+    try:
+        bid = float(event["bid"]) if event.get("bid") is not None else None
+    except (TypeError, ValueError):
+        bid = None
+
+    return (
+        height,
+        idx,
+        event.get("type"),
+        event.get("id"),
+        event.get("auction_id"),
+        token.get("token_id"),
+        token.get("token_sig"),
+        event.get("public_key"),
+        bid,
+    )
+
+
+class SQLiteLedgerStore:
+    def __init__(self, db_path):
+        """
+        SQLite storage of the blockchain. Blocks are kept as JSON in 'blocks' and their
+        events are flattened into 'events', indexed by token, auction and type, so the
+        Ledger lookups are indexed queries instead of in-memory indexes that grow with
+        the chain. Runs in WAL mode so reads are not blocked by the block writer.
+        """
+        self.db_path = str(db_path)
+        self.lock = threading.Lock()
+        self.block_cache = OrderedDict()
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        row = self.conn.execute("SELECT COUNT(*), MAX(height) FROM blocks").fetchone()
+        self.count = row[0]
+        self.tip_hash = self.block_hash_at(row[1]) if row[1] is not None else None
+
+    # ============= Blocks =============
+
+    def block_hash_at(self, height):
+        row = self.conn.execute("SELECT block_hash FROM blocks WHERE height=?", (height,)).fetchone()
+        return row[0] if row else None
+
+    def _cache_block(self, height, block):
+        self.block_cache[height] = block
+        self.block_cache.move_to_end(height)
+        if len(self.block_cache) > BLOCK_CACHE_SIZE:
+            self.block_cache.popitem(last=False)
+
+    def block_at(self, height):
+        """
+        Returns the block stored at 'height' (None if there is none), from the block cache
+        when possible.
+        """
+        with self.lock:
+            block = self.block_cache.get(height)
+            if block is not None:
+                self.block_cache.move_to_end(height)
+                return block
+
+            row = self.conn.execute("SELECT data FROM blocks WHERE height=?", (height,)).fetchone()
+            if row is None:
+                return None
+
+            block = json.loads(row[0])
+            self._cache_block(height, block)
+            return block
+
+    def blocks_between(self, start, stop):
+        """
+        Returns the blocks of heights [start, stop), in chain order.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM blocks WHERE height>=? AND height<? ORDER BY height", (start, stop)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def iter_blocks(self, start_height=0):
+        """
+        Streams the stored blocks from 'start_height', in chain order. Read in pages,
+        each under the store lock, so the shared connection is never used concurrently
+        and the consumer may use the store between two blocks.
+        """
+        height = start_height
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT height, data FROM blocks WHERE height>=? ORDER BY height LIMIT ?",
+                    (height, STREAM_PAGE_ROWS)
+                ).fetchall()
+            if not rows:
+                return
+
+            for height, data in rows:
+                yield json.loads(data)
+            height += 1
+
+    def _insert_block(self, height, block):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO blocks(height, block_hash, prev_hash, timestamp, data) VALUES(?,?,?,?,?)",
+            (height, block.get("block_hash"), block.get("prev_hash"), block.get("timestamp"),
+             json.dumps(block, separators=(",", ":")))
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO events(height, idx, type, event_id, auction_id, token_id, token_sig, public_key, bid) "
+            "VALUES(?,?,?,?,?,?,?,?,?)",
+            [event_row(height, idx, event) for idx, event in enumerate(block.get("events", []))]
+        )
+
+    def _truncate(self, height):
+        self.conn.execute("DELETE FROM blocks WHERE height>=?", (height,))
+        self.conn.execute("DELETE FROM events WHERE height>=?", (height,))
+        for cached in [cached for cached in self.block_cache if cached >= height]:
+            del self.block_cache[cached]
+
+    def append_block(self, block, height):
+        """
+        Stores one block at 'height' (replacing whatever followed it) and commits.
+        """
+        with self.lock:
+            if height < self.count:
+                self._truncate(height)
+            self._insert_block(height, block)
+            self.conn.commit()
+            self.count = height + 1
+            self.tip_hash = block.get("block_hash")
+            self._cache_block(height, block)
+
+    def replace_from(self, height, blocks):
+        """
+        Replaces every stored block from 'height' on by 'blocks' (a fork), in one transaction.
+        """
+        with self.lock:
+            self._truncate(height)
+            for position, block in enumerate(blocks, height):
+                self._insert_block(position, block)
+            self.conn.commit()
+
+            self.count = height + len(blocks)
+            self.tip_hash = self.block_hash_at(self.count - 1) if self.count else None
+
+    def import_blocks(self, blocks):
+        """
+        Stores the blocks of an iterable (e.g. a block log being migrated) after the
+        stored ones, in one transaction, without holding them all in memory.
+        """
+        with self.lock:
+            height = self.count
+            for block in blocks:
+                self._insert_block(height, block)
+                self.tip_hash = block.get("block_hash")
+                height += 1
+            self.conn.commit()
+            self.count = height
+
+    def common_prefix(self, chain):
+        """
+        Returns how many leading blocks of 'chain' are already stored.
+        """
+        limit = min(self.count, len(chain))
+
+        if self.count <= len(chain) and (self.count == 0 or chain[self.count - 1]["block_hash"] == self.tip_hash):
+            return limit
+
+        for height in range(limit):
+            if self.block_hash_at(height) != chain[height]["block_hash"]:
+                return height
+        return limit
+
+    def save_chain(self, chain):
+        """
+        Makes the stored blocks match 'chain' in one transaction: the blocks past the
+        common prefix are replaced and the missing ones inserted.
+        """
+        with self.lock:
+            common = self.common_prefix(chain)
+            if common == len(chain) == self.count:
+                return
+
+            self._truncate(common)
+            for height in range(common, len(chain)):
+                self._insert_block(height, chain[height])
+            self.conn.commit()
+
+            self.count = len(chain)
+            self.tip_hash = chain[-1]["block_hash"] if chain else None
+
+    # ============= Queries =============
+
+    def token_count(self):
+        row = self._fetchone("SELECT COUNT(DISTINCT token_id) FROM events WHERE token_id IS NOT NULL", ())
+        return row[0]
+
+    def iter_token_ids(self):
+        """
+        Streams the distinct token IDs recorded in the chain (paged, like 'iter_blocks').
+        """
+        last = ""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT DISTINCT token_id FROM events WHERE token_id > ? ORDER BY token_id LIMIT ?",
+                    (last, STREAM_PAGE_ROWS)
+                ).fetchall()
+            if not rows:
+                return
+
+            for (last,) in rows:
+                yield last
+
+    def _fetchone(self, sql, params):
+        # The connection is shared by the network and input threads
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def token_used(self, token_id):
+        row = self._fetchone("SELECT 1 FROM events WHERE token_id=? LIMIT 1", (token_id,))
+        return row is not None
+
+    def token_signature(self, token_id):
+        row = self._fetchone(
+            "SELECT token_sig FROM events WHERE token_id=? ORDER BY height, idx LIMIT 1", (token_id,)
+        )
+        return row[0] if row else None
+
+    def auction_public_key(self, auction_id):
+        row = self._fetchone(
+            "SELECT public_key FROM events WHERE type='auction' AND event_id=? ORDER BY height, idx LIMIT 1",
+            (auction_id,)
+        )
+        return row[0] if row else None
+
+    def auction_bids(self, auction_id):
+        """
+        Returns the 'bid' events of an auction, in chain order.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT b.data, e.idx FROM events e JOIN blocks b ON b.height = e.height "
+                "WHERE e.type='bid' AND e.auction_id=? ORDER BY e.height, e.idx",
+                (auction_id,)
+            ).fetchall()
+        return [json.loads(data)["events"][idx] for data, idx in rows]
+
+    def highest_bid(self, auction_id):
+        row = self._fetchone(
+            "SELECT MAX(bid) FROM events WHERE type='bid' AND auction_id=?", (auction_id,)
+        )
+        return row[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class StoredChain:
+    def __init__(self, store):
+        """
+        Read-only list view of the blocks of a SQLite store, used as 'Ledger.chain' with
+        the "sqlite" backend: lengths, indexes (negative ones included), slices and
+        iteration are answered by the store, so the chain is never loaded as a whole.
+        "append" stores the block right away.
+        """
+        self.store = store
+
+    def __len__(self):
+        return self.store.count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return [self[height] for height in range(start, stop, step)]
+            return self.store.blocks_between(start, stop) if start < stop else []
+
+        height = key + len(self) if key < 0 else key
+        if not 0 <= height < len(self):
+            raise IndexError("chain index out of range")
+        return self.store.block_at(height)
+
+    def __iter__(self):
+        return self.store.iter_blocks()
+
+    def append(self, block):
+        self.store.append_block(block, len(self))
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+# A segment is closed (fsynced) and a new one started after this many blocks
+SEGMENT_MAX_BLOCKS = 10000
+
+# Appended blocks are fsynced in batches: after this many blocks or this many seconds,
+# whichever comes first (a timer syncs the tail when no further block arrives). A crash can lose at most the last unsynced batch, which the
+# node then receives again from its peers on the next ledger sync.
+FSYNC_BATCH_BLOCKS = 32
+FSYNC_INTERVAL = 1.0
+
+SEGMENT_PREFIX = "segment_"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def segment_name(start_height):
+    return f"{SEGMENT_PREFIX}{start_height:010d}{SEGMENT_SUFFIX}"
+
+
+def encode_block(block):
+    """
+    Serializes a block into a single JSON-lines record.
+    """
+    return json.dumps(block, separators=(",", ":")).encode() + b"\n"
+
+
+class BlockLog:
+    def __init__(self, directory, segment_max_blocks=SEGMENT_MAX_BLOCKS,
+                 fsync_batch=FSYNC_BATCH_BLOCKS, fsync_interval=FSYNC_INTERVAL):
+        """
+        Append-only storage of the blockchain, split in JSON-lines segment files:
+
+            <directory>/segment_0000000000.jsonl   blocks 0 .. N-1
+            <directory>/segment_<N>.jsonl          blocks N .. 2N-1
+            ...
+
+        Each block is one line, written once. Saving a new block costs one append
+        instead of rewriting the whole chain. A torn tail left by a crash (partial
+        or corrupted last record) is truncated when the log is opened; a corrupted
+        record further back ends the readable chain (see "iter_blocks").
+        """
+        self.directory = str(directory)
+        self.segment_max_blocks = segment_max_blocks
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        self.count = 0
+        self.tip_hash = None
+        self.file = None
+        self.file_start = 0
+        self.pending_sync = 0
+        self.last_sync = time.monotonic()
+        self.sync_timer = None
+        self.lock = threading.RLock()
+
+        # Height of the first corrupted record met by "iter_blocks", if any
+        self.corrupt_height = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.recover()
+
+        # Flush the last unsynced batch on a clean exit
+        atexit.register(self.close)
+
+    # ============= Segments =============
+
+    def segment_starts(self):
+        """
+        Returns the starting heights of the segments on disk, in order.
+        """
+        starts = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    starts.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(starts)
+
+    def segment_path(self, start_height):
+        return os.path.join(self.directory, segment_name(start_height))
+
+    def recover(self):
+        """
+        Finds the tip of the log. Only the last segment is scanned: every valid record
+        is kept and the file is truncated right after the last one, so a half-written
+        block never reaches the chain. Segments left empty are removed.
+        """
+        starts = self.segment_starts()
+
+        while starts:
+            start = starts[-1]
+            path = self.segment_path(start)
+
+            valid_end = 0
+            records = 0
+            tip_hash = None
+
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        block = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_end += len(line)
+                    records += 1
+                    tip_hash = block.get("block_hash")
+
+            if valid_end < os.path.getsize(path):
+                print(f"[Ledger] Truncating torn tail of {path} at byte {valid_end}")
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if records == 0:
+                os.remove(path)
+                starts.pop()
+                continue
+
+            self.count = start + records
+            self.tip_hash = tip_hash
+            self.corrupt_height = None
+            return
+
+        self.count = 0
+        self.tip_hash = None
+        self.corrupt_height = None
+
+    # ============= Reading =============
+
+    def iter_blocks(self, start_height=0):
+        """
+        Streams the blocks of the log from 'start_height', one record at a time.
+        Stops at the first corrupted record: the blocks before it are the readable
+        chain, and 'save_chain' / 'truncate' cut the log back to them.
+        """
+        starts = self.segment_starts()
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else self.count
+            if end <= start_height:
+                continue
+
+            path = self.segment_path(start)
+            with open(path, "rb") as f:
+                for height, line in enumerate(f, start):
+                    if height >= self.count:
+                        return
+                    if height < start_height:
+                        continue
+                    try:
+                        block = json.loads(line)
+                    except ValueError:
+                        print(f"[Ledger] Corrupted record at height {height} in {path}, ignoring the blocks from there")
+                        self.corrupt_height = height
+                        return
+                    yield block
+
+    # ============= Writing =============
+
+    def append(self, block):
+        """
+        Appends one block. The record is handed to the OS right away and fsynced in
+        batches (see FSYNC_BATCH_BLOCKS). Returns True if the write started a new segment.
+        """
+        with self.lock:
+            rotated = False
+
+            if self.file is not None and self.count - self.file_start >= self.segment_max_blocks:
+                self.close()
+
+            if self.file is None:
+                starts = self.segment_starts()
+                start = starts[-1] if starts else 0
+                if self.count - start >= self.segment_max_blocks:
+                    start = self.count
+                    rotated = True
+                self.file = open(self.segment_path(start), "ab")
+                self.file_start = start
+
+            self.file.write(encode_block(block))
+            self.file.flush()
+            self.count += 1
+            self.tip_hash = block.get("block_hash")
+
+            self.pending_sync += 1
+            if self.pending_sync >= self.fsync_batch or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self.sync()
+            elif self.sync_timer is None:
+                # Last block of a burst: synced by the timer if nothing else comes
+                self.sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+            return rotated
+
+    def sync(self):
+        """
+        Flushes the open segment and fsyncs it.
+        """
+        with self.lock:
+            if self.sync_timer is not None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+
+            if self.file is None or self.pending_sync == 0:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending_sync = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.sync()
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+
+    def truncate(self, height):
+        """
+        Drops every block from 'height' on (used when the local chain is replaced by a fork).
+        """
+        if height >= self.count:
+            return
+
+        with self.lock:
+            self.close()
+
+            for start in reversed(self.segment_starts()):
+                path = self.segment_path(start)
+                if start >= height:
+                    os.remove(path)
+                    continue
+
+                with open(path, "r+b") as f:
+                    offset = 0
+                    for _ in range(height - start):
+                        offset += len(f.readline())
+                    f.truncate(offset)
+                    f.flush()
+                    os.fsync(f.fileno())
+                break
+
+            self.recover()
+
+    def common_prefix(self, chain):
+        """
+        Returns how many leading blocks of 'chain' are already stored in the log.
+        """
+        limit = min(self.count, len(chain))
+
+        # Only the blocks before a corrupted record count as stored
+        if self.corrupt_height is not None:
+            limit = min(limit, self.corrupt_height)
+
+        # Fast path: the log holds a prefix of the chain (the usual append case)
+        elif self.count <= len(chain) and (self.count == 0 or chain[self.count - 1]["block_hash"] == self.tip_hash):
+            return limit
+
+        height = 0
+        for block in self.iter_blocks():
+            if height >= limit or block.get("block_hash") != chain[height]["block_hash"]:
+                break
+            height += 1
+        return height
+
+    def save_chain(self, chain):
+        """
+        Makes the log match 'chain', writing only what changed: new blocks are appended
+        and, if the chain forked, the log is first cut back to the common prefix.
+        Returns True if a new segment was started in the process.
+        """
+        common = self.common_prefix(chain)
+        self.truncate(common)
+
+        rotated = False
+        for block in chain[common:]:
+            rotated = self.append(block) or rotated
+        return rotated
@@ -1,3 +1,5 @@
+import os
+import copy
 import json
 
 # ============= Parsing Utilities =============
@@ -83,12 +85,13 @@ def handle_auction_open(auctions, event, token_manager):
         t_id = token_data.get("token_id")
         
         if t_id and token_manager and token_manager.is_token_owner(t_id):
-            auctions["my_auctions"][str(key)] = {
+            # Same int key as 'add_my_auction'; fields set locally (e.g. 'private_key') are kept
+            auctions["my_auctions"].setdefault(key, {}).update({
                 "public_key": pub_key,
                 "auction_token_data": token_data,
                 "highest_bid": entry["highest_bid"], 
                 "finished": entry["finished"]
-            }
+            })
 
     # Update global counter for ID generation
     try:
@@ -136,11 +139,10 @@ def handle_bid_event(auctions, event, token_manager):
         entry["my_bid"] = "True" if is_mine else "False"
 
         # 3. Sync with My Auctions
-        str_key = str(key)
-        if str_key in auctions["my_auctions"]:
-            auctions["my_auctions"][str_key]["highest_bid"] = bid_val
+        if key in auctions["my_auctions"]:
+            auctions["my_auctions"][key]["highest_bid"] = bid_val
             if token_data:
-                 auctions["my_auctions"][str_key]["last_bid_token_data"] = token_data
+                 auctions["my_auctions"][key]["last_bid_token_data"] = token_data
 
 
 def handle_auction_end(auctions, event):
@@ -162,50 +164,56 @@ def handle_auction_end(auctions, event):
         auctions["auction_list"][key]["finished"] = True
         
         # If it is in 'my_auctions', mark it finished there too
-        if str(key) in auctions["my_auctions"]:
-            auctions["my_auctions"][str(key)]["finished"] = True
+        if key in auctions["my_auctions"]:
+            auctions["my_auctions"][key]["finished"] = True
 
         # If I am the highest bidder, register as a winning auction
         if auctions["auction_list"][key]["my_bid"] == "True":
             auctions["winning_auction"][str(key)] = auctions["auction_list"][key]
 
 
-# ============= Main Conversion Logic =============
+# ============= Projection Engine =============
 
-def ledger_to_auction_dict(ledger, token_manager):
-    """
-    Reconstructs the full current application state (auctions, bids, winners) by 
-    replaying the entire blockchain history (Ledger) from Genesis to the latest block.
-    """
-    auctions = {
+# Auction sections that map an auction ID to its entry
+AUCTION_SECTIONS = ("auction_list", "my_auctions", "winning_auction")
+
+# Format of the projection checkpoint; checkpoints of another version are replayed from Genesis
+CHECKPOINT_VERSION = 2
+
+
+def empty_auction_state():
+    return {
         "last_auction_id": 0,
         "auction_list": {},
         "my_auctions": {},
         "winning_auction": {},
     }
 
-    # Access the chain safely
-    chain = getattr(ledger, "chain", []) or []
 
-    for block in chain:
-        events = block.get("events", [])
-        for raw_event in events:
-            event = parse_event(raw_event)
-            if not event:
-                continue
+def apply_event(auctions, raw_event, token_manager):
+    """
+    Applies a single ledger event to the auction state.
+    """
+    event = parse_event(raw_event)
+    if not event:
+        return
+
+    event_type = event.get("type")
+
+    if event_type == "auction":
+        handle_auction_open(auctions, event, token_manager)
 
-            event_type = event.get("type")
+    elif event_type == "bid":
+        handle_bid_event(auctions, event, token_manager)
 
-            if event_type == "auction":
-                handle_auction_open(auctions, event, token_manager)
-            
-            elif event_type == "bid":
-                handle_bid_event(auctions, event, token_manager)
-            
-            elif event_type == "auctionEnd":
-                handle_auction_end(auctions, event)
+    elif event_type == "auctionEnd":
+        handle_auction_end(auctions, event)
 
-    # Ensure last_auction_id is consistent
+
+def fix_last_auction_id(auctions):
+    """
+    Ensures last_auction_id is consistent with the known auctions.
+    """
     try:
         keys = [int(k) for k in auctions["auction_list"].keys() if str(k).isdigit()]
         if keys:
@@ -214,4 +222,183 @@ def ledger_to_auction_dict(ledger, token_manager):
     except Exception:
         pass
 
-    return auctions
\ No newline at end of file
+
+def encode_auction_state(auctions):
+    """
+    Converts the auction state to JSON data. Sections are stored as (key, value) pairs so
+    integer and string auction IDs survive the round trip; values that are not plain data
+    (e.g. the bytes 'deal_key' of the reveal phase) are left out.
+    """
+    data = {"last_auction_id": auctions.get("last_auction_id", 0)}
+
+    for section in AUCTION_SECTIONS:
+        pairs = []
+        for key, value in auctions.get(section, {}).items():
+            if isinstance(value, (bytes, bytearray)):
+                continue
+            if isinstance(value, dict):
+                value = {k: v for k, v in value.items() if not isinstance(v, (bytes, bytearray))}
+            pairs.append([key, value])
+        data[section] = pairs
+
+    return data
+
+
+def empty_local_state():
+    return {"my_auctions": {}, "auction_list": {}}
+
+
+def decode_auction_state(data):
+    auctions = empty_auction_state()
+    auctions["last_auction_id"] = data.get("last_auction_id", 0)
+    for section in AUCTION_SECTIONS:
+        auctions[section] = {key: value for key, value in data.get(section, [])}
+    return auctions
+
+
+class AuctionProjection:
+    def __init__(self, token_manager, checkpoint_path=None):
+        """
+        Keeps the auction state (see 'ledger_to_auction_dict') in step with the ledger
+        by applying only the blocks appended since the last update. 'height' and 'tip_hash'
+        identify the last applied block; if that block is no longer in the chain (the
+        ledger was replaced by a fork) the state is rebuilt from Genesis.
+        The projected state is private: callers get a copy, on top of which the fields only
+        this node knows (see 'keep_local') are restored, so the live state can be modified
+        freely and blocks are never applied twice to the same dict.
+        The state can be checkpointed to 'checkpoint_path' so a restart resumes from it.
+        """
+        self.token_manager = token_manager
+        self.checkpoint_path = checkpoint_path
+        self.local = empty_local_state()
+        self.deal_keys = {}
+        self.reset()
+
+    def reset(self):
+        self.auctions = empty_auction_state()
+        self.height = -1
+        self.tip_hash = None
+
+    def keep_local(self, auctions):
+        """
+        Records the fields of the live state 'auctions' that are not derived from the ledger:
+        the private key of each auction created here, the 'my_bid' flag set when this node
+        bid (with the bid it refers to) and the reveal deal keys.
+        """
+        for key, entry in auctions.get("my_auctions", {}).items():
+            if isinstance(entry, dict) and entry.get("private_key"):
+                self.local["my_auctions"][key] = {"private_key": entry["private_key"]}
+
+        for key, entry in auctions.get("auction_list", {}).items():
+            if isinstance(entry, dict) and "my_bid" in entry:
+                self.local["auction_list"][key] = {"my_bid": entry["my_bid"],
+                                                   "highest_bid": entry.get("highest_bid")}
+
+        self.deal_keys = {key: value for key, value in auctions.get("winning_auction", {}).items()
+                          if isinstance(value, (bytes, bytearray))}
+
+    def restore_local(self, auctions):
+        """
+        Puts the fields recorded by 'keep_local' back into a copy of the projected state.
+        A 'my_bid' flag only applies while the highest bid is still the one it was set for.
+        """
+        for key, kept in self.local["my_auctions"].items():
+            entry = auctions["my_auctions"].get(key)
+            if isinstance(entry, dict):
+                entry.update(kept)
+
+        for key, kept in self.local["auction_list"].items():
+            entry = auctions["auction_list"].get(key)
+            if isinstance(entry, dict) and entry.get("highest_bid") == kept["highest_bid"]:
+                entry["my_bid"] = kept["my_bid"]
+
+        auctions["winning_auction"].update(self.deal_keys)
+
+    def update(self, ledger, live=None):
+        """
+        Applies the new blocks of 'ledger' and returns a copy of the (updated) auction state.
+        The local-only fields of 'live', the state being replaced, are carried over.
+        """
+        if live is not None:
+            self.keep_local(live)
+
+        chain = getattr(ledger, "chain", []) or []
+
+        if self.height >= 0 and (self.height >= len(chain) or chain[self.height].get("block_hash") != self.tip_hash):
+            self.reset()
+
+        for height in range(self.height + 1, len(chain)):
+            for raw_event in chain[height].get("events", []):
+                apply_event(self.auctions, raw_event, self.token_manager)
+
+        if chain:
+            self.height = len(chain) - 1
+            self.tip_hash = chain[-1].get("block_hash")
+
+        fix_last_auction_id(self.auctions)
+
+        auctions = copy.deepcopy(self.auctions)
+        self.restore_local(auctions)
+        return auctions
+
+    def save_checkpoint(self):
+        """
+        Persists the projected state together with the block it was projected up to,
+        and the local-only fields (the deal keys stay in memory).
+        """
+        if not self.checkpoint_path or self.height < 0:
+            return
+
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "height": self.height,
+            "tip_hash": self.tip_hash,
+            "auctions": encode_auction_state(self.auctions),
+            "local": {section: list(entries.items()) for section, entries in self.local.items()},
+        }
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def load_checkpoint(self, ledger):
+        """
+        Restores a checkpoint if it was projected from a block of 'ledger'.
+        Returns True if it was used; otherwise the next update replays from Genesis.
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                data = json.load(f)
+
+            self.local = empty_local_state()
+            for section in self.local:
+                self.local[section] = {key: value for key, value in data.get("local", {}).get(section, [])}
+
+            height = data["height"]
+            chain = ledger.chain
+            if data.get("version") != CHECKPOINT_VERSION or not (0 <= height < len(chain)) \
+                    or chain[height].get("block_hash") != data["tip_hash"]:
+                return False
+
+            self.auctions = decode_auction_state(data["auctions"])
+            self.height = height
+            self.tip_hash = data["tip_hash"]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.reset()
+            return False
+
+        return True
+
+
+# ============= Main Conversion Logic =============
+
+def ledger_to_auction_dict(ledger, token_manager):
+    """
+    Reconstructs the full current application state (auctions, bids, winners) by 
+    replaying the entire blockchain history (Ledger) from Genesis to the latest block.
+    For incremental updates use 'AuctionProjection'.
+    """
+    return AuctionProjection(token_manager).update(ledger)
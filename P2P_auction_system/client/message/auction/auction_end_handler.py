@@ -16,7 +16,7 @@ def handle_auction_end(client_state, obj):
     Processes the 'auctionEnd' event. It notifies the user via CLI and, if the local user 
     is the winner, initiates the cryptographic identity reveal protocol (Proof of Winning).
     """
-    from network.tcp import send_to_peers
+    from network.tcp import send_to_peers, encrypt_for_peers
     now = int(time.time())
 
     auction_list = client_state.auctions["auction_list"]
@@ -103,7 +103,7 @@ def handle_auction_end(client_state, obj):
                 }
 
                 response_json = json.dumps(public_payload_obj)
-                c_response_json = encrypt_message_symmetric_gcm(response_json, client_state.group_key)
+                c_response_json = encrypt_for_peers(response_json, client_state)
 
                 UI.sub_step("Action", "Submitting blind factor 'r' revelation")
                 send_to_peers(c_response_json, client_state.peer.connections)
@@ -1,16 +1,16 @@
 import json
 import time
 from datetime import datetime
-from crypto.keys.group_keys import find_my_new_key
+from crypto.keys.group_keys import find_my_new_key, apply_lkh_update
 from security_monitor import log_security_event, record_latency
 from client.ca_handler.ca_message import verify_timestamp_signature
-from crypto.crypt_decrypt.crypt import encrypt_message_symmetric_gcm
 from client.message.auction.auction_end_handler import handle_auction_end
 from client.message.winner_reveal.winner_reveal_handler import handle_winner_reveal
 from client.message.auction.auction_handler import update_auction_higher_bid, add_auction, get_auction_higher_bid, get_auction_higher_bid_timestamp
 from client.message.winner_reveal.final_revelation import prepare_winner_identity, get_client_identity
-from client.ledger.ledger_handler import ledger_request_handler, ledger_update_handler
+from client.ledger.ledger_handler import ledger_request_handler, ledger_update_handler, is_ledger_update_for_me
 from design.ui import UI 
+from network.framing import WIRE_JSON, WIRE_BINARY, WIRE_NEGOTIATION_WINDOW
         
 
 # ============= Helper Functions  =============
@@ -86,14 +86,61 @@ def update_personal_auctions(client, msg):
 
 
 
+def negotiate_wire_format(client, obj, wire_format):
+    """
+    Records the envelope formats the peers advertise in their sync messages.
+    Every peer sends a 'ledger_request' when it joins and legacy peers answer every
+    'ledger_request' with a full 'ledger_update', so each legacy peer of the group shows
+    up as a JSON sync message without 'wire_formats'. One such peer keeps this client on the
+    legacy JSON envelope for good. Other message types say nothing about the sender.
+    """
+    mtype = obj.get("type")
+    if client.legacy_peer or mtype not in ("ledger_request", "ledger_update"):
+        return
+
+    if wire_format == WIRE_BINARY or WIRE_BINARY in (obj.get("wire_formats") or []):
+        client.bin1_peers += 1
+        return
+
+    client.legacy_peer = True
+    if client.wire_format != WIRE_JSON:
+        UI.sub_warn("Legacy peer detected, falling back to JSON envelopes")
+        client.wire_format = WIRE_JSON
+
+
+def outgoing_wire_format(client):
+    """
+    Envelope format for the next group message. Starts with the legacy JSON envelope and
+    switches to binary frames only once the join window is over, at least one peer
+    advertised 'bin1' and no peer of the group turned out to be legacy.
+    """
+    if client.wire_format == WIRE_JSON and not client.legacy_peer and client.bin1_peers:
+        deadline = client.wire_deadline
+        if deadline is not None and time.monotonic() >= deadline:
+            UI.sub_peer("Every peer advertised binary envelopes, switching to binary frames")
+            client.wire_format = WIRE_BINARY
+
+    return client.wire_format
+
+
+def start_wire_negotiation(client):
+    """
+    Opens the join window: sync answers arriving within it are counted before
+    'outgoing_wire_format' may pick binary frames.
+    """
+    if client.wire_deadline is None:
+        client.wire_deadline = time.monotonic() + WIRE_NEGOTIATION_WINDOW
+
+
 #  ============= Core Message Processing  =============
 
 
-def process_message(msg, client_state):
+def process_message(msg, client_state, wire_format=None):
     """
     The main logic router. Decodes incoming JSON messages, enforces security checks 
     (Token Validity, Double Spending, CA Timestamps), and routes the payload to 
     the specific handler (Auction, Ledger, or Reveal protocols).
+    'wire_format' is the envelope the message arrived in, used for format negotiation.
     """
 
     #print(client_state.auctions)
@@ -118,8 +165,14 @@ def process_message(msg, client_state):
     mtype = obj.get("type")
     UI.peer(f"Received new {mtype}")
 
+    negotiate_wire_format(client_state, obj, wire_format)
+
     if mtype in message_types:
 
+        # Sync answers meant for another peer: drop before any crypto check
+        if mtype == "ledger_update" and not is_ledger_update_for_me(client_state, obj):
+            return
+
         # 1. Security Verification (Tokens & Anti-Double Spending)
         token_data = obj.get("token")
         if not token_data:
@@ -193,23 +246,33 @@ def process_message(msg, client_state):
 
         # 5. Ledger Synchronization Logic
         elif mtype == "ledger_request":
-            from network.tcp import send_to_peers
-            update_json = ledger_request_handler(obj.get("request_id"), client_state)
+            from network.tcp import send_to_peers, encrypt_for_peers
+            update_json = ledger_request_handler(client_state, obj)
 
             if update_json:
-                c_update_json = encrypt_message_symmetric_gcm(update_json, client_state.group_key)
+                c_update_json = encrypt_for_peers(update_json, client_state)
                 send_to_peers(c_update_json, client_state.peer.connections)
 
         elif mtype == "ledger_update":
-            if not client_state.ledger_request_id == 0:
-                UI.sub_peer("Ledger Synchronized Successfully")
-                ledger_update_handler(client_state, obj)
+            from network.tcp import send_to_peers, encrypt_for_peers
+            UI.sub_peer("Ledger Synchronized Successfully")
+            next_request = ledger_update_handler(client_state, obj)
+
+            if next_request:
+                c_next_request = encrypt_for_peers(next_request, client_state)
+                send_to_peers(c_next_request, client_state.peer.connections)
 
 
     # 6. Group Key Rotation
     elif mtype == "new_key":
-        keys = obj.get("encrypted_keys")
-        new_group_key = find_my_new_key(keys, client_state.private_key)
+        # Peers in the CA key tree follow their path; the others get an RSA-encrypted copy
+        new_group_key = None
+        if client_state.lkh_keys and obj.get("lkh"):
+            new_group_key = apply_lkh_update(client_state.lkh_keys, obj["lkh"])
+
+        if new_group_key is None:
+            keys = obj.get("encrypted_keys")
+            new_group_key = find_my_new_key(keys, client_state.private_key)
 
         if not new_group_key == None:
             client_state.group_key = new_group_key
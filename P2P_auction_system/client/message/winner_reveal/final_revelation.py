@@ -109,9 +109,9 @@ def send_winner_identity(client_state, auction_id, deal_key):
     response_json = json.dumps(msg)
     
     # Encrypt the outer message with the GROUP KEY (Network transport security)
-    c_response_json = encrypt_message_symmetric_gcm(response_json, client_state.group_key)
+    from network.tcp import send_to_peers, encrypt_for_peers
+    c_response_json = encrypt_for_peers(response_json, client_state)
 
-    from network.tcp import send_to_peers
     send_to_peers(c_response_json, client_state.peer.connections)    
 
 
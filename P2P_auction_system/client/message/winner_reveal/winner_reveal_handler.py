@@ -71,10 +71,10 @@ def send_auction_creation_proof(client_state, auction_id, deal_key):
 
             response_json = json.dumps(msg)
             # Encrypt the outer message for the broadcast group
-            c_response_json = encrypt_message_symmetric_gcm(response_json, client_state.group_key)
+            from network.tcp import send_to_peers, encrypt_for_peers
+            c_response_json = encrypt_for_peers(response_json, client_state)
 
             UI.sub_step("Action", "Submitting blind factor 'r' disclosure")
-            from network.tcp import send_to_peers
             send_to_peers(c_response_json, client_state.peer.connections)
 
 
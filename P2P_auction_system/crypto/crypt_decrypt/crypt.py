@@ -1,42 +1,16 @@
-import os
-import json
-import base64
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import hashes # Não usado diretamente para GCM, mas útil para funções de chave
 from cryptography.hazmat.primitives.asymmetric import padding as asym_padding, rsa
 from cryptography.hazmat.primitives import hashes, serialization
+from crypto.crypt_decrypt.session import CryptoSession
 
 def encrypt_message_symmetric_gcm(message: str, key: bytes) -> str:
     """
     message: string a cifrar
     key: bytes de 32 bytes (AES-256)
-    """
-    # 1. Generate random nonce (AES-GCM uses 12 bytes by default)
-    # The nonce MUST be unique for each encryption with the same key.
-    nonce = os.urandom(12)
-
-    # 2. Configure the cipher with AES-256 and GCM mode
-    cipher = Cipher(algorithms.AES(key), modes.GCM(nonce))
-    encryptor = cipher.encryptor()
-
-    # Authenticated Additional Data (AAD). Optional, but good practice.
-    # In this case, we use empty AAD, but it is authenticated along with the message.
-    aad = b""
-    encryptor.authenticate_additional_data(aad)
 
-    # 3. Encrypt the message (without padding)
-    ciphertext = encryptor.update(message.encode()) + encryptor.finalize()
-
-    # 4. Obtain the GCM authentication tag
-    tag = encryptor.tag
-
-    # 5. Create JSON with Nonce + ciphertext + tag
-    payload = {
-        "nonce": base64.b64encode(nonce).decode(),
-        "ciphertext": base64.b64encode(ciphertext).decode(),
-        "tag": base64.b64encode(tag).decode()
-    }
-    return json.dumps(payload)
+    One-off helper returning the legacy JSON envelope (Nonce + ciphertext + tag, Base64).
+    Hot paths should keep a "CryptoSession" for the key instead.
+    """
+    return CryptoSession(key).encrypt_json(message)
 
 def encrypt_with_public_key(message_bytes: bytes, public_key_pem: bytes) -> bytes:
     """
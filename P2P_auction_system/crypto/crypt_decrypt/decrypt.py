@@ -1,49 +1,19 @@
-import base64
-import json
-
-from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
 from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-
+from crypto.crypt_decrypt.session import CryptoSession
 
-def decrypt_message_symmetric_gcm(payload_json: str, key: bytes) -> str:
+def decrypt_message_symmetric_gcm(payload_json, key: bytes) -> str:
     """
-    payload_json: string JSON con "nonce", "ciphertext", y "tag"
+    payload_json: string JSON con "nonce", "ciphertext", y "tag" (legacy envelope),
+                  or the raw binary envelope body produced by "CryptoSession.encrypt"
     key: bytes de 32 bytes (AES-256)
-    """
-    data = json.loads(payload_json)
-
-    # 1. Decoding Nonce, Ciphertext, and Tag
-    nonce = base64.b64decode(data["nonce"])
-    ciphertext = base64.b64decode(data["ciphertext"])
-    tag = base64.b64decode(data["tag"]) # The tag is crucial for authentication.
-
-    # 2. Configure the cipher with AES-256 and GCM mode
-    # NOTE: In GCM, it is more common (and idiomatic) to use the AESGCM interface, 
-    # but to maintain consistency with your use of Cipher/modes, 
-    # we will continue with it, even though it is a little more verbose.
 
-    cipher = Cipher(algorithms.AES(key), modes.GCM(nonce))
-    decryptor = cipher.decryptor()
-
-    # Authenticated Additional Data (AAD). Must be the same as that used in encryption.
-    aad = b""
-    decryptor.authenticate_additional_data(aad)
-
-    # 3. Decrypt and verify the Tag
-    try:
-        # The finalize_with_tag call performs decryption AND tag verification.
-        plaintext_bytes = decryptor.update(ciphertext) + decryptor.finalize_with_tag(tag)
-    except InvalidTag:
-        # THIS IS THE CRITICAL POINT: if the tag is invalid, the message has been altered.
-        raise ValueError("Invalid authentication tag. Data integrity check failed.")
-
-    # 4. Decode and return the message (GCM does not have padding)
-    message = plaintext_bytes.decode()
-    return message
+    One-off helper. Raises ValueError if the tag is invalid (the message has been altered).
+    Hot paths should keep a "CryptoSession" for the key instead.
+    """
+    return CryptoSession(key).decrypt(payload_json)
 
 def decrypt_with_private_key(ciphertext: bytes, private_key_pem: bytes) -> bytes:
     """
@@ -0,0 +1,86 @@
+import os
+import json
+import base64
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+
+class CryptoSession:
+    def __init__(self, key: bytes):
+        """
+        Symmetric crypto session bound to one AES-256 key (e.g. the current Group Key).
+
+        The AESGCM instance is built once and reused for every message, instead of
+        creating a new Cipher/encryptor per call. The session is immutable: on key
+        rotation a new session is created and swapped in with a single assignment,
+        so a reader never sees a key and a cipher that do not match.
+        """
+        self.key = key
+        self.aesgcm = AESGCM(key)
+
+    # ---- Binary envelope: nonce + ciphertext + tag ----
+
+    def encrypt(self, message: str) -> bytes:
+        """
+        Encrypts a message into the raw binary envelope body: nonce (12 bytes) + ciphertext + tag (16 bytes),
+        without the Base64/JSON wrapping (sent in a binary frame, see network/framing.py).
+        """
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self.aesgcm.encrypt(nonce, message.encode(), None)
+
+    def decrypt(self, payload) -> str:
+        """
+        Decrypts either a binary envelope body (bytes) or a legacy JSON envelope (str).
+        Raises ValueError if the authentication tag does not match.
+        """
+        if isinstance(payload, (bytes, bytearray)):
+            if len(payload) < NONCE_SIZE + TAG_SIZE:
+                raise ValueError("Binary envelope too short.")
+            nonce = bytes(payload[:NONCE_SIZE])
+            data = bytes(payload[NONCE_SIZE:])
+        else:
+            wrapper = json.loads(payload)
+            nonce = base64.b64decode(wrapper["nonce"])
+            data = base64.b64decode(wrapper["ciphertext"]) + base64.b64decode(wrapper["tag"])
+
+        try:
+            return self.aesgcm.decrypt(nonce, data, None).decode()
+        except InvalidTag:
+            raise ValueError("Invalid authentication tag. Data integrity check failed.")
+
+    # ---- Legacy JSON envelope ----
+
+    def encrypt_json(self, message: str) -> str:
+        """
+        Encrypts a message into the legacy JSON envelope (see "encrypt_message_symmetric_gcm").
+        """
+        nonce = os.urandom(NONCE_SIZE)
+        sealed = self.aesgcm.encrypt(nonce, message.encode(), None)
+
+        payload = {
+            "nonce": base64.b64encode(nonce).decode(),
+            "ciphertext": base64.b64encode(sealed[:-TAG_SIZE]).decode(),
+            "tag": base64.b64encode(sealed[-TAG_SIZE:]).decode()
+        }
+        return json.dumps(payload)
+
+    # ---- Several envelopes ----
+
+    def decrypt_each(self, payloads) -> list:
+        """
+        Decrypts the envelopes of one socket read, one "decrypt" call per envelope.
+        This is not a batched AES-GCM path (the library offers none, and every envelope has
+        its own nonce and tag): the only saving is the shared AESGCM context of the session.
+        Entries that fail authentication (or are malformed) are returned as None, so the
+        caller can log a forged frame and still process the rest of the read in order.
+        """
+        results = []
+        for payload in payloads:
+            try:
+                results.append(self.decrypt(payload))
+            except (ValueError, KeyError, TypeError):
+                results.append(None)
+        return results
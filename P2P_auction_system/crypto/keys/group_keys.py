@@ -1,56 +1,130 @@
+import os
 from design.ui import UI
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from crypto.encoding.b64 import b64d
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from crypto.encoding.b64 import b64e, b64d
+from crypto.keys.keys_crypto import public_key_fingerprint
 
-def find_my_new_key(encrypted_keys_list, private_key):
+NONCE_SIZE = 12
+
+def decrypt_group_key(enc_b64, private_key):
+    """
+    Decrypts one Base64 RSA-OAEP (SHA-256) encrypted key with the given private key.
+    Raises if the ciphertext was not encrypted for this key.
+    """
+
+    return private_key.decrypt(
+        b64d(enc_b64),
+        padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None
+        )
+    )
+
+
+def find_my_new_key(encrypted_keys, private_key):
     """
-    Iterates through a list of encrypted keys, attempting to decrypt each one with the given private key.
-    
-    This is typically used in multi-recipient systems where a sender encrypts the same symmetric key 
-    multiple times (once for each recipient's public key) and bundles them. The recipient must 
-    find which encrypted blob belongs to them.
+    Finds and decrypts this peer's copy of a rotated Group Key.
+
+    The CA encrypts the same symmetric key once for each recipient's public key and bundles them.
+    A keyed bundle ({public key fingerprint: encrypted key}) costs exactly one decryption:
+    the entry is looked up by the fingerprint of this peer's public key.
+    A legacy bundle (plain list) is searched by trial decryption of every entry.
 
     Args:
-        encrypted_keys_list (list): A list of Base64 encoded strings, each representing an encrypted key.
-        private_key (rsa.RSAPrivateKey): The private key used to attempt decryption.
+        encrypted_keys (dict | list): Base64 encoded encrypted keys, keyed by recipient fingerprint
+                                      or as a plain list.
+        private_key (rsa.RSAPrivateKey): The private key used for decryption.
 
     Returns:
         bytes | None: The decrypted raw key bytes if successful, or None if no matching key is found.
     """
 
+    if isinstance(encrypted_keys, dict):
+        enc_b64 = encrypted_keys.get(public_key_fingerprint(private_key.public_key()))
+
+        if enc_b64 is None:
+            UI.sub_error("No key for this peer in the rotation bundle.")
+            return None
+
+        try:
+            return decrypt_group_key(enc_b64, private_key)
+        except Exception:
+            UI.sub_error("Could not decrypt the key addressed to this peer.")
+            return None
+
     # User Interface log: Notify start of search
-    UI.sub_peer("Attempting to decrypt {len(encrypted_keys_list)} keys...")
+    UI.sub_peer(f"Attempting to decrypt {len(encrypted_keys or [])} keys...")
 
     # Iterate through every encrypted key in the provided list
-    for i, enc_b64 in enumerate(encrypted_keys_list):
+    for i, enc_b64 in enumerate(encrypted_keys or []):
         try:
-            # Decode Base64 to get raw ciphertext bytes
-            ciphertext = b64d(enc_b64)
-            
             # Attempt decryption.
-            # If 'ciphertext' was not encrypted with the Public Key corresponding to this 'private_key',
-            # or if the padding is incorrect, this method will raise an exception (usually ValueError or InvalidKey).
-            plaintext_bytes = private_key.decrypt(
-                ciphertext,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
-            
+            # If the ciphertext was not encrypted with the Public Key corresponding to this 'private_key',
+            # or if the padding is incorrect, this raises an exception (usually ValueError or InvalidKey).
+            plaintext_bytes = decrypt_group_key(enc_b64, private_key)
+
             # If we reach this line, decryption was successful. We found our key.
-            UI.sub_peer("Success! Key found at index {i}")
+            UI.sub_peer(f"Success! Key found at index {i}")
             return plaintext_bytes
-            
+
         except Exception:
-            # Decryption failed for this specific item. 
+            # Decryption failed for this specific item.
             # This is expected behavior for items belonging to OTHER recipients.
             # We silently ignore the error and continue to the next item.
             continue
-    
+
     # If the loop finishes without returning, none of the keys could be decrypted.
-    UI.sub_error("Could not decrypt any key in the list.")        
+    UI.sub_error("Could not decrypt any key in the list.")
+
+    return None
+
+
+# ============= Key Tree (LKH) =============
+
+def wrap_key(key_under: bytes, key: bytes, node: int) -> str:
+    """
+    Encrypts a key tree node key under another key (AES-GCM, node number as associated data).
+    Returns Base64 of nonce + ciphertext + tag.
+    """
+
+    nonce = os.urandom(NONCE_SIZE)
+    return b64e(nonce + AESGCM(key_under).encrypt(nonce, key, str(node).encode()))
+
+
+def unwrap_key(key_under: bytes, wrapped_b64: str, node: int) -> bytes:
+    """Reverse of "wrap_key". Raises if the key or the node number do not match."""
+
+    data = b64d(wrapped_b64)
+    return AESGCM(key_under).decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], str(node).encode())
+
+
+def apply_lkh_update(path_keys: dict, entries: list):
+    """
+    Applies a key tree rekey to this peer's path keys ({node: key}).
+    Entries come bottom-up, so each new key this peer needs is encrypted under a key it
+    already holds (or has just updated). Costs at most one AES decryption per tree level.
+
+    Returns:
+        bytes | None: The new Group Key (root), or None if no entry was addressed to this peer.
+    """
+
+    root = None
+    for entry in entries:
+        node = entry["node"]
+        key_under = path_keys.get(entry["under"])
+        if node not in path_keys or key_under is None:
+            continue
+
+        try:
+            path_keys[node] = unwrap_key(key_under, entry["key"], node)
+        except Exception:
+            UI.sub_error(f"Could not decrypt the key of tree node {node}.")
+            return None
+
+        if node == 1:
+            root = path_keys[node]
 
-    return None
\ No newline at end of file
+    return root
@@ -1,5 +1,8 @@
 from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives import serialization, hashes
+
+# Length (in bytes) of a public key fingerprint, before hex encoding
+FINGERPRINT_BYTES = 8
 
 def load_rsa_public_key(pub_bytes: str) -> rsa.RSAPublicKey:
     
@@ -22,6 +25,26 @@ def get_pub_bytes(rsa_public_key):
     return ca_pub_bytes
 
 
+def public_key_fingerprint(public_key) -> str:
+    """
+    Short identifier of a public key: hex of the first FINGERPRINT_BYTES of
+    SHA-256 over its DER (SubjectPublicKeyInfo) encoding.
+    Accepts a public key object or its PEM bytes.
+    """
+
+    if isinstance(public_key, (bytes, str)):
+        public_key = load_rsa_public_key(public_key.encode() if isinstance(public_key, str) else public_key)
+
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    digest = hashes.Hash(hashes.SHA256())
+    digest.update(der)
+    return digest.finalize()[:FINGERPRINT_BYTES].hex()
+
+
 def load_private_and_public_key(private_key_path, public_key_path):
 
     # Load private key
@@ -1,15 +1,38 @@
+import os
 import json
+import atexit
 import base64
 import secrets
+import threading
 import requests
+from collections import OrderedDict, deque
 from pathlib import Path
 from design.ui import UI
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from cryptography.hazmat.primitives import hashes
 from crypto.token.crypto_token import BlindRSACore
 from client.ca_handler.ca_message import get_valid_timestamp
 from client.ca_handler.ca_info import CA_URL
 
+# Number of already verified (token_id, token_sig) pairs remembered by a TokenManager
+VERIFIED_TOKEN_CACHE_SIZE = 8192
+
+# Pre-minted token pool (see "TokenManager.get_token"): tokens kept ready, and the size
+# below which the background worker refills it. A pool size of 0 disables the pool.
+# Pooled tokens are kept in the wallet as unspent entries, so they survive a restart.
+TOKEN_POOL_SIZE = int(os.environ.get("TOKEN_POOL_SIZE", 8))
+TOKEN_POOL_LOW_WATER = int(os.environ.get("TOKEN_POOL_LOW_WATER", 3))
+
+# Seconds the refill worker waits after a failed CA request
+TOKEN_POOL_RETRY_DELAY = 5
+
+# Seconds during which the spent markers of handed out pool tokens are gathered
+# before being written to the wallet in one append
+TOKEN_SPENT_FLUSH_INTERVAL = 1.0
+
+# Largest number of tokens signed by the CA in one "/blind_sign_batch" request
+TOKEN_BATCH_MAX = 100
+
 
 def verify_peer_blinding_data(ca_pub_pem: bytes, peer_uid: str, peer_token_id: str, peer_r: int, peer_signature_b64: str) -> bool:
 
@@ -63,12 +86,40 @@ def verify_peer_blinding_data(ca_pub_pem: bytes, peer_uid: str, peer_token_id: s
         return False
 
 class TokenManager:
-    def __init__(self, config_name: str, ca_pub_pem: bytes, uid: str):
+    def __init__(self, config_name: str, ca_pub_pem: bytes, uid: str,
+                 pool_size: int = TOKEN_POOL_SIZE, pool_low_water: int = TOKEN_POOL_LOW_WATER):
         self.config_dir = Path("config") / config_name / "user"
         self.wallet_path = self.config_dir / "token_wallet.json"
+        self.wallet_log_path = self.config_dir / "token_wallet.jsonl"
         self.uid = uid
         self.crypto = BlindRSACore(ca_pub_pem)
 
+        # CA public numbers, extracted once instead of on every token operation
+        self.n = self.crypto.n
+        self.e = self.crypto.e
+
+        # LRU of tokens whose signature was already checked (messages and ledger replays)
+        self._verified_tokens = OrderedDict()
+        self._verified_lock = threading.Lock()
+
+        # In-memory wallet (token_id -> entry), loaded on first use
+        self._wallet = None
+        self._wallet_lock = threading.Lock()
+
+        # Pool of signed tokens, refilled by a background worker (see "start_token_pool")
+        self.pool_size = pool_size
+        self.pool_low_water = min(pool_low_water, pool_size)
+        self._pool = deque()
+        self._pool_lock = threading.Lock()
+        self._refill_event = threading.Event()
+        self._pool_stop = threading.Event()
+        self._pool_thread = None
+
+        # Pool tokens handed out whose spent marker is not written yet (see "_mark_spent")
+        self._spent_pending = []
+        self._spent_timer = None
+        atexit.register(self.flush_spent)
+
     def _token_id_to_int(self, token_id: str, n: int) -> int:
         digest = hashes.Hash(hashes.SHA256())
         digest.update(token_id.encode("utf-8"))
@@ -90,9 +141,8 @@ class TokenManager:
         return t
 
     def blind_token(self, token_id: str) -> Tuple[str, int]:
-        pub_numbers = self.crypto.ca_pub.public_numbers()
-        n = pub_numbers.n
-        e = pub_numbers.e
+        n = self.n
+        e = self.e
         m = self._token_id_to_int(token_id, n)
 
         while True:
@@ -110,8 +160,7 @@ class TokenManager:
         return blinded_b64, r
 
     def unblind_signature(self, blind_sig_b64: str, r: int) -> str:
-        pub_numbers = self.crypto.ca_pub.public_numbers()
-        n = pub_numbers.n
+        n = self.n
         s_blinded = int.from_bytes(base64.b64decode(blind_sig_b64), "big")
         r_inv = self._modinv(r, n)
         s = (s_blinded * r_inv) % n
@@ -119,26 +168,55 @@ class TokenManager:
         return base64.b64encode(sig_bytes).decode("ascii")
 
     def verify_token(self, token_id: str, token_sig_b64: str) -> bool:
-        pub_numbers = self.crypto.ca_pub.public_numbers()
-        n = pub_numbers.n
-        e = pub_numbers.e
-        m = self._token_id_to_int(token_id, n)
+        key = (token_id, token_sig_b64)
+
+        with self._verified_lock:
+            if key in self._verified_tokens:
+                self._verified_tokens.move_to_end(key)
+                return True
+
+        m = self._token_id_to_int(token_id, self.n)
         sig_bytes = base64.b64decode(token_sig_b64)
         s = int.from_bytes(sig_bytes, byteorder="big")
-        m_check = pow(s, e, n)
-        return m_check == m
+        m_check = pow(s, self.e, self.n)
+
+        if m_check != m:
+            return False
 
+        with self._verified_lock:
+            self._verified_tokens[key] = True
+            if len(self._verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+                self._verified_tokens.popitem(last=False)
 
-    def _save_to_wallet(self, token_id: str, blinded_token: str, r: int, token_sig: str):
-        wallet = []
-        if self.wallet_path.exists():
+        return True
+
+    def verify_tokens(self, tokens) -> list:
+        """
+        Batch version of "verify_token" for a list of (token_id, token_sig) pairs,
+        e.g. every token of a received ledger. Duplicated pairs are only checked once
+        and malformed entries are reported as invalid instead of raising.
+        """
+        results = {}
+        for token_id, token_sig_b64 in tokens:
+            key = (token_id, token_sig_b64)
+            if key in results:
+                continue
             try:
-                with self.wallet_path.open("r") as f:
-                    wallet = json.load(f)
-            except:
-                pass
+                results[key] = bool(token_id and token_sig_b64) and self.verify_token(token_id, token_sig_b64)
+            except Exception:
+                results[key] = False
 
-        timestamp = get_valid_timestamp()
+        return [results[(token_id, token_sig_b64)] for token_id, token_sig_b64 in tokens]
+
+
+    def _save_to_wallet(self, token_id: str, blinded_token: str, r: int, token_sig: str, timestamp=None, spent: bool = True):
+        """
+        Adds a token to the wallet. The entry is appended as one line to the JSON-lines
+        wallet file instead of rewriting the whole wallet.
+        Pooled tokens are saved with spent=False until they are handed out.
+        """
+        if timestamp is None:
+            timestamp = get_valid_timestamp()
 
         entry = {
             "token_id": token_id,
@@ -146,48 +224,220 @@ class TokenManager:
             "blinding_factor_r": str(r),
             "token_signature_b64": token_sig,
             "timestamp": timestamp,
+            "spent": spent,
         }
 
-        wallet.append(entry)
+        self._append_to_wallet(entry)
+
+    def _append_to_wallet(self, *entries: dict):
+        """
+        Appends entries to the JSON-lines wallet in one write. The last line of a token wins on load.
+        """
+        wallet = self._load_wallet()
 
-        self.config_dir.mkdir(parents=True, exist_ok=True)
-        with self.wallet_path.open("w") as f:
-            json.dump(wallet, f, indent=4)
+        with self._wallet_lock:
+            self.config_dir.mkdir(parents=True, exist_ok=True)
+            with self.wallet_log_path.open("a") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            for entry in entries:
+                wallet[entry["token_id"]] = entry
+
+    def _mark_spent(self, token_id: str):
+        """
+        Records that a pooled token was handed out. Markers are gathered and written by
+        "flush_spent" at most TOKEN_SPENT_FLUSH_INTERVAL later, so the message path never
+        waits on the wallet file. A marker lost in a crash only means the token is pooled
+        again on restart; "discard_used_tokens" then drops it once the ledger is loaded.
+        """
+        with self._pool_lock:
+            self._spent_pending.append(token_id)
+            if self._spent_timer is None:
+                self._spent_timer = threading.Timer(TOKEN_SPENT_FLUSH_INTERVAL, self.flush_spent)
+                self._spent_timer.daemon = True
+                self._spent_timer.start()
+
+    def flush_spent(self):
+        """
+        Writes the pending spent markers to the wallet (timer, pool stop and process exit).
+        """
+        with self._pool_lock:
+            pending = self._spent_pending
+            self._spent_pending = []
+            if self._spent_timer is not None:
+                self._spent_timer.cancel()
+                self._spent_timer = None
+
+        if not pending:
+            return
 
-    def _load_wallet(self) -> list:
-        wallet = []
-        if self.wallet_path.exists():
-            try:
-                with self.wallet_path.open("r") as f:
-                    wallet = json.load(f)
-            except Exception as e:
-                UI.warn(f"Error loading wallet: {e}")
-                pass
-        return wallet
+        wallet = self._load_wallet()
+        entries = [
+            dict(wallet[token_id], spent=True)
+            for token_id in pending
+            if wallet.get(token_id, {}).get("spent") is False
+        ]
+        if entries:
+            self._append_to_wallet(*entries)
+
+    def discard_used_tokens(self, token_used):
+        """
+        Drops the pooled tokens that 'token_used' (the ledger double-spend check) reports
+        as already recorded, e.g. reloaded after a crash lost their spent marker.
+        """
+        with self._pool_lock:
+            used = [token for token in self._pool if token_used(token["token_id"])]
+            for token in used:
+                self._pool.remove(token)
+
+        for token in used:
+            self._mark_spent(token["token_id"])
+        if used:
+            self._refill_event.set()
+
+    def _unspent_tokens(self) -> List[Dict]:
+        """
+        Returns the pooled tokens saved in the wallet and never handed out, in minting order.
+        Entries without a "spent" field (older wallets) count as spent.
+        """
+        return [
+            {"token_id": entry["token_id"], "token_sig": entry["token_signature_b64"]}
+            for entry in self._load_wallet().values()
+            if entry.get("spent") is False
+        ]
+
+    def _load_wallet(self) -> dict:
+        """
+        Returns the in-memory wallet (token_id -> entry), reading it from disk only once:
+        the legacy JSON array wallet first, then the JSON-lines wallet.
+        """
+        if self._wallet is not None:
+            return self._wallet
+
+        with self._wallet_lock:
+            if self._wallet is not None:
+                return self._wallet
+
+            wallet = {}
+            if self.wallet_path.exists():
+                try:
+                    with self.wallet_path.open("r") as f:
+                        for entry in json.load(f):
+                            wallet[entry.get("token_id")] = entry
+                except Exception as e:
+                    UI.warn(f"Error loading wallet: {e}")
+
+            if self.wallet_log_path.exists():
+                valid_end = 0
+                with self.wallet_log_path.open("rb") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            entry = None
+                        if entry is None or not line.endswith(b"\n"):
+                            # Torn last line of an interrupted write
+                            break
+                        valid_end += len(line)
+                        wallet[entry.get("token_id")] = entry
+
+                if valid_end < self.wallet_log_path.stat().st_size:
+                    with self.wallet_log_path.open("r+b") as f:
+                        f.truncate(valid_end)
+
+            self._wallet = wallet
+            return wallet
 
     def is_token_owner(self, token_id: str) -> bool:
 
         if not token_id:
             return False
-            
-        wallet = self._load_wallet()
-        for entry in wallet:
-            if entry.get("token_id") == token_id:
-                return True
-        return False
+
+        return token_id in self._load_wallet()
 
     def get_blinding_factor_r(self, token_id: str) -> Optional[int]:
-        wallet = self._load_wallet()
-        
-        for entry in wallet:
-            if entry.get("token_id") == token_id:
-                return int(entry.get("blinding_factor_r"))
-        
-        return None
+        entry = self._load_wallet().get(token_id)
+
+        if entry is None:
+            return None
+
+        return int(entry.get("blinding_factor_r"))
+
+    # ============= Token Pool =============
+
+    def start_token_pool(self):
+        """
+        Starts the background worker that keeps the pool of signed tokens filled.
+        Unspent tokens left in the wallet by a previous run are pooled first, so the
+        worker only mints what is missing.
+        """
+        if self.pool_size <= 0 or self._pool_thread is not None:
+            return
+
+        with self._pool_lock:
+            pooled = {token["token_id"] for token in self._pool}
+            self._pool.extend(token for token in self._unspent_tokens() if token["token_id"] not in pooled)
+
+        self._pool_thread = threading.Thread(target=self._refill_loop, name="token-pool", daemon=True)
+        self._pool_thread.start()
+        self._refill_event.set()
+
+    def stop_token_pool(self):
+        self._pool_stop.set()
+        self._refill_event.set()
+        self.flush_spent()
+
+    def _refill_loop(self):
+        """
+        Worker: waits until the pool drops below the low-water mark, then mints
+        tokens until it is full again. CA failures are retried after a delay.
+        """
+        while not self._pool_stop.is_set():
+            self._refill_event.wait()
+            self._refill_event.clear()
+
+            while not self._pool_stop.is_set() and len(self._pool) < self.pool_size:
+                try:
+                    tokens = self.get_tokens(self.pool_size - len(self._pool), spent=False)
+                except Exception:
+                    self._pool_stop.wait(TOKEN_POOL_RETRY_DELAY)
+                    self._refill_event.set()
+                    break
+
+                with self._pool_lock:
+                    self._pool.extend(tokens)
+
+    def _take_pooled_token(self) -> Optional[Dict]:
+        with self._pool_lock:
+            token = self._pool.popleft() if self._pool else None
+            remaining = len(self._pool)
+
+        if token is not None:
+            self._mark_spent(token["token_id"])
+
+        if self._pool_thread is not None and remaining < self.pool_low_water:
+            self._refill_event.set()
+
+        return token
 
     def get_token(self) -> Dict:
+        """
+        Returns a fresh signed token. Tokens come from the pre-minted pool when available,
+        so the caller does not wait on the CA; otherwise one is minted on the spot.
+        """
+        token = self._take_pooled_token()
+        if token is not None:
+            return token
+
+        return self._mint_token()
+
+    def _mint_token(self, verbose: bool = True) -> Dict:
+        """
+        Obtains a new token from the CA: quota request, blinding, blind signature,
+        unblinding and wallet update.
+        """
         # Simplified main message
-        UI.step("Acquiring Security Token", "PENDING")
+        if verbose:
+            UI.step("Acquiring Security Token", "PENDING")
 
         # 1. Request Quota
         try:
@@ -195,7 +445,8 @@ class TokenManager:
             r_quota = requests.post(f"{CA_URL}/tokens", json=payload_quota, timeout=5)
             r_quota.raise_for_status()
         except Exception as e:
-            UI.error(f"Error contacting CA (/tokens): {e}")
+            if verbose:
+                UI.error(f"Error contacting CA (/tokens): {e}")
             raise e
 
         # 2. Generate and Blind
@@ -222,10 +473,52 @@ class TokenManager:
             self._save_to_wallet(token_id, blinded_b64, r, token_sig_b64)
             
             # Close the step cleanly
-            UI.end_step("Token Wallet", "UPDATED")
+            if verbose:
+                UI.end_step("Token Wallet", "UPDATED")
 
             return {"token_id": token_id, "token_sig": token_sig_b64}
 
         except Exception as e:
-            UI.error(f"Failure in the Blind Sign process: {e}")
-            raise e
\ No newline at end of file
+            if verbose:
+                UI.error(f"Failure in the Blind Sign process: {e}")
+            raise e
+
+    def get_tokens(self, count: int, spent: bool = True) -> List[Dict]:
+        """
+        Obtains up to TOKEN_BATCH_MAX new tokens with one quota request and one
+        "/blind_sign_batch" request, instead of two CA round trips per token.
+        'spent' is recorded in the wallet (False for tokens kept in the pool).
+        """
+        count = max(1, min(count, TOKEN_BATCH_MAX))
+
+        # 1. Request Quota
+        payload_quota = {"uid": self.uid, "count": count}
+        r_quota = requests.post(f"{CA_URL}/tokens", json=payload_quota, timeout=5)
+        r_quota.raise_for_status()
+
+        # 2. Generate and Blind
+        token_ids = [secrets.token_hex(16) for _ in range(count)]
+        blinded = [self.crypto.blind(token_id) for token_id in token_ids]
+
+        # 3. Request Blind Signatures
+        req_body = {"uid": self.uid, "blinded_tokens_b64": [blinded_b64 for blinded_b64, _ in blinded]}
+        resp = requests.post(f"{CA_URL}/blind_sign_batch", json=req_body, timeout=10)
+        resp.raise_for_status()
+        blind_sigs = resp.json()["blind_signatures_b64"]
+
+        if len(blind_sigs) != count:
+            raise Exception("CA returned a wrong number of signatures!")
+
+        # 4. Unblind, Verify and store every token (one timestamp for the whole batch)
+        timestamp = get_valid_timestamp()
+        tokens = []
+        for token_id, (blinded_b64, r), blind_sig_b64 in zip(token_ids, blinded, blind_sigs):
+            token_sig_b64 = self.crypto.unblind(blind_sig_b64, r)
+
+            if not self.crypto.verify(token_id, token_sig_b64):
+                raise Exception("CA returned invalid signature!")
+
+            self._save_to_wallet(token_id, blinded_b64, r, token_sig_b64, timestamp, spent)
+            tokens.append({"token_id": token_id, "token_sig": token_sig_b64})
+
+        return tokens
@@ -0,0 +1,133 @@
+# Messages on the wire are either newline-delimited (legacy JSON envelopes, see "send_to_peers")
+# or length-prefixed binary frames:
+#
+#   | magic (1) | version (1) | body length (4, big-endian) | body |
+#
+# JSON envelopes always start with "{", so the magic byte is enough to tell both apart.
+FRAME_DELIMITER = b"\n"
+BINARY_FRAME_MAGIC = 0xB1
+BINARY_FRAME_VERSION = 1
+BINARY_HEADER_SIZE = 6
+
+# Envelope formats a peer can speak. "json" is the legacy Base64-in-JSON envelope,
+# "bin1" the raw nonce + ciphertext + tag body carried in a binary frame.
+WIRE_JSON = "json"
+WIRE_BINARY = "bin1"
+SUPPORTED_WIRE_FORMATS = [WIRE_JSON, WIRE_BINARY]
+
+# Seconds after joining during which the peers' sync answers (and the formats they advertise)
+# are collected before binary envelopes may be used
+WIRE_NEGOTIATION_WINDOW = 5.0
+
+# Largest accepted frame, delimiter/header included. Full ledger_update messages are the biggest ones.
+MAX_FRAME_SIZE = 8 * 1024 * 1024
+
+
+def encode_binary_frame(body: bytes) -> bytes:
+    """
+        Prefixes a binary payload with the versioned length header.
+    """
+
+    header = bytes([BINARY_FRAME_MAGIC, BINARY_FRAME_VERSION]) + len(body).to_bytes(4, "big")
+    return header + body
+
+
+def is_binary_frame(frame: bytes) -> bool:
+    """
+        Checks if a frame returned by "FrameDecoder" is a length-prefixed binary frame.
+    """
+
+    return len(frame) >= BINARY_HEADER_SIZE and frame[0] == BINARY_FRAME_MAGIC
+
+
+def decode_binary_frame(frame: bytes) -> bytes:
+    """
+        Validates the header of a binary frame and returns its body.
+    """
+
+    if not is_binary_frame(frame):
+        raise ValueError("Not a binary frame")
+
+    if frame[1] != BINARY_FRAME_VERSION:
+        raise ValueError(f"Unsupported binary frame version: {frame[1]}")
+
+    return frame[BINARY_HEADER_SIZE:]
+
+
+class FrameDecoder:
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        """
+            Incremental stream decoder that turns raw TCP chunks into complete frames.
+            Frames larger than "max_frame_size" are discarded (up to the next delimiter, or
+            by their declared length for binary frames), so a single oversized (or malicious)
+            message cannot grow the buffer without bound.
+        """
+
+        self.buffer = bytearray()
+        self.max_frame_size = max_frame_size
+        self.discarding = False
+        self.skip_bytes = 0
+        self.oversized = 0
+
+    def feed(self, data):
+        """
+            Appends a chunk to the internal buffer and returns the list of complete frames
+            it produced. Each frame keeps its delimiter/header so it can be forwarded as is.
+        """
+
+        if self.skip_bytes:
+            skipped = min(self.skip_bytes, len(data))
+            self.skip_bytes -= skipped
+            data = data[skipped:]
+
+        self.buffer += data
+        frames = []
+        start = 0
+
+        while start < len(self.buffer):
+
+            # Length-prefixed binary frame
+            if not self.discarding and self.buffer[start] == BINARY_FRAME_MAGIC:
+                if len(self.buffer) - start < BINARY_HEADER_SIZE:
+                    break
+
+                length = int.from_bytes(self.buffer[start + 2:start + BINARY_HEADER_SIZE], "big")
+                end = start + BINARY_HEADER_SIZE + length
+
+                if end - start > self.max_frame_size:
+                    self.oversized += 1
+                    self.skip_bytes = max(0, end - len(self.buffer))
+                    start = min(end, len(self.buffer))
+                    continue
+
+                if end > len(self.buffer):
+                    break
+
+                frames.append(bytes(self.buffer[start:end]))
+                start = end
+                continue
+
+            # Newline-delimited frame
+            end = self.buffer.find(FRAME_DELIMITER, start)
+            if end == -1:
+                break
+            end += len(FRAME_DELIMITER)
+
+            if self.discarding:
+                # Tail of an oversized frame: drop it and resynchronise on the delimiter
+                self.discarding = False
+            elif end - start > self.max_frame_size:
+                self.oversized += 1
+            else:
+                frames.append(bytes(self.buffer[start:end]))
+            start = end
+
+        del self.buffer[:start]
+
+        if len(self.buffer) > self.max_frame_size:
+            self.buffer.clear()
+            if not self.discarding:
+                self.oversized += 1
+            self.discarding = True
+
+        return frames
@@ -5,12 +5,13 @@ import threading
 from design.ui import UI
 from local_test import TEST
 from datetime import datetime
-from network.tcp import send_to_peers, connect_to_relay
+from network.tcp import send_to_peers, connect_to_relay, encrypt_for_peers
 from config.config import parse_config
 from network.peer_state import PeerState
 from client.message.peer_input import peer_input, menu_user
 from client.ca_handler.ca_message import get_valid_timestamp
 from client.ledger.ledger_handler import prepare_ledger_request
+from client.message.process_message import start_wire_negotiation
 from crypto.crypt_decrypt.crypt import encrypt_message_symmetric_gcm
 
 def check_auctions(client_state):
@@ -62,7 +63,7 @@ def check_auctions(client_state):
                 }
 
                 auctionEnd_json = json.dumps(auctionEnd_obj)
-                msg = encrypt_message_symmetric_gcm(auctionEnd_json, client_state.group_key)
+                msg = encrypt_for_peers(auctionEnd_json, client_state)
 
                 send_to_peers(msg, client_state.peer.connections)
                 client_state.auctions["auction_list"][auction_id]["finished"] = True
@@ -84,8 +85,10 @@ def user_auction_input(connections, stop_event, client):
     request = prepare_ledger_request(client)
 
     if not request == None:
+        # Always sent as a legacy JSON envelope: peers learn from it which formats we speak
         c_request = encrypt_message_symmetric_gcm(request, client.group_key)
         send_to_peers(c_request, client.peer.connections)    
+        start_wire_negotiation(client)
 
     menu_user()
     UI.sys_ready()
@@ -103,7 +106,7 @@ def user_auction_input(connections, stop_event, client):
             client.is_running = False
             break
 
-        msg = encrypt_message_symmetric_gcm(msg, client.group_key)
+        msg = encrypt_for_peers(msg, client)
 
         if not connections:
             UI.error("No connection to Relay. Message not sent.")
@@ -182,6 +185,12 @@ def run_peer(host, port, client):
     UI.sys("Shutting down peer.")
     state.stop_event.set()
 
+    if client.ledger is not None:
+        client.ledger.close(client.user_path / "ledger.json")
+
+    if client.token_manager is not None:
+        client.token_manager.stop_token_pool()
+
     for c in state.connections:
         try:
             c.close()
@@ -0,0 +1,334 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from network.framing import FrameDecoder, MAX_FRAME_SIZE
+
+# Default high-water mark (bytes) of the outbound buffer of a single peer
+PEER_HIGH_WATER = 1024 * 1024
+
+# What to do with a peer whose outbound buffer is above the high-water mark:
+#   "drop"       -> the new data is discarded for that peer only
+#   "disconnect" -> the peer is evicted from the Relay
+SLOW_PEER_POLICIES = ("drop", "disconnect")
+
+# Size of the read buffer used for each peer socket
+READ_CHUNK_SIZE = 64 * 1024
+
+# Listen backlog, sized for bursts of thousands of peers (re)connecting at once
+LISTEN_BACKLOG = 1024
+
+# Number of recent disconnect broadcasts remembered to skip duplicates
+# (the CA answers every departure of a batched rotation with the same new key message)
+RECENT_DISCONNECT_BROADCASTS = 64
+
+# Threads running "on_disconnect" hooks. The CA holds each departure until its batch is
+# rotated, so a mass disconnect needs many calls in flight to land in one batch.
+DISCONNECT_WORKERS = 256
+
+# Period (seconds) of the stats snapshot published for other threads (e.g. the monitor)
+STATS_INTERVAL = 1.0
+
+
+class RelayPeer:
+    def __init__(self, reader, writer, addr, high_water=PEER_HIGH_WATER):
+        """
+            Holds the state of a single peer connected to the Relay.
+            Each peer owns an outbound queue, bounded by "high_water" bytes, that is drained
+            by its own writer task, so a slow receiver never blocks the broadcast path of
+            the other peers. Frames count against the bound until the socket has taken
+            them (end of "drain"), so at most "high_water" bytes are ever pending.
+        """
+
+        self.reader = reader
+        self.writer = writer
+        self.addr = addr
+        self.uuid = "NA"
+        self.high_water = high_water
+        self.queue = asyncio.Queue()
+        self.queued_bytes = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.evicted = False
+        self.writer_task = None
+
+    def enqueue(self, data):
+        """
+            Schedules data to be sent to this peer without blocking.
+            Returns False (and queues nothing) if it would push the buffer above the high-water mark.
+            A peer with nothing pending always takes the frame, even one larger than the mark
+            (e.g. a legacy full 'ledger_update'): it is not behind, so it is neither skipped
+            nor evicted for it.
+        """
+
+        if self.queued_bytes and self.queued_bytes + len(data) > self.high_water:
+            self.dropped += 1
+            return False
+
+        self.queued_bytes += len(data)
+        self.queue.put_nowait(data)
+        return True
+
+    async def drain_loop(self):
+        """
+            Writer task: sends queued frames to the peer socket until a None sentinel is received.
+            Every frame already waiting in the queue is flushed with a single vectored write.
+            A failed write ends the task and aborts the connection instead of dying silently.
+        """
+
+        while True:
+            data = await self.queue.get()
+            if data is None:
+                break
+
+            batch = [data]
+            while not self.queue.empty():
+                data = self.queue.get_nowait()
+                if data is None:
+                    break
+                batch.append(data)
+
+            size = sum(len(frame) for frame in batch)
+            try:
+                self.writer.writelines(batch)
+                await self.writer.drain()
+            except (ConnectionError, OSError) as e:
+                # Stop broadcasting to it and drop the socket: the reader loop then sees
+                # the connection end and performs the normal disconnect cleanup
+                print(f"[Relay] Write error {self.uuid} ({self.addr}): {e}")
+                self.evicted = True
+                self.writer.transport.abort()
+                break
+            self.queued_bytes -= size
+            self.sent_bytes += size
+
+            if data is None:
+                break
+
+    def close(self):
+        """
+            Stops the writer task and closes the underlying transport.
+        """
+
+        if self.writer_task:
+            self.writer_task.cancel()
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class RelayEngine:
+    def __init__(self, on_connect=None, on_register=None, on_message=None, on_disconnect=None,
+                 high_water=PEER_HIGH_WATER, slow_peer_policy="drop", max_frame_size=MAX_FRAME_SIZE):
+        """
+            Asyncio based broadcast engine for the Relay Server.
+            A single event loop serves every peer with non-blocking reads and writes.
+            "high_water" bounds the outbound buffer of each peer and "slow_peer_policy"
+            (see SLOW_PEER_POLICIES) decides what happens to peers that fall behind.
+            Messages larger than "max_frame_size" are discarded instead of forwarded.
+
+            Optional hooks:
+                on_connect(addr): called when a socket is accepted.
+                on_register(uuid, addr): called once the peer sends its UUID.
+                on_message(uuid): called for every complete message received from a peer.
+                on_disconnect(uuid): blocking call executed in a worker thread when a peer
+                                     leaves. If it returns bytes, they are broadcast to the
+                                     remaining peers (once, if several departures return
+                                     the same bytes).
+        """
+
+        if slow_peer_policy not in SLOW_PEER_POLICIES:
+            raise ValueError(f"Unknown slow peer policy: {slow_peer_policy}")
+
+        self.peers = {}
+        self.high_water = high_water
+        self.slow_peer_policy = slow_peer_policy
+        self.max_frame_size = max_frame_size
+        self.oversized_frames = 0
+        self.dropped_total = 0
+        self.dropped_bytes_total = 0
+        self.evictions = 0
+        self.on_connect = on_connect
+        self.on_register = on_register
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+        self.recent_disconnect_broadcasts = deque(maxlen=RECENT_DISCONNECT_BROADCASTS)
+        self.duplicate_disconnect_broadcasts = 0
+        self.disconnect_executor = None
+        self.stats_snapshot = {}
+
+    def broadcast(self, data, sender=None):
+        """
+            Queues a complete frame for every connected peer except the sender.
+            Never waits on a socket: peers whose queue is full simply miss the message.
+        """
+
+        for peer in list(self.peers.values()):
+            if peer is sender or peer.evicted:
+                continue
+
+            if not peer.enqueue(data):
+                self.dropped_total += 1
+                self.dropped_bytes_total += len(data)
+
+                if self.slow_peer_policy == "disconnect":
+                    self.evict(peer)
+
+    def evict(self, peer):
+        """
+            Disconnects a peer that fell behind. Its reader loop then sees the connection
+            drop and performs the normal disconnect cleanup.
+        """
+
+        peer.evicted = True
+        self.evictions += 1
+        print(f"[Relay] Evicting slow peer {peer.uuid} ({peer.addr}): {peer.queued_bytes} bytes pending")
+        if peer.writer_task:
+            peer.writer_task.cancel()
+        # abort() instead of close(): do not wait for the stuck buffer to flush
+        peer.writer.transport.abort()
+
+    def get_stats(self):
+        """
+            Returns the backpressure counters of the Relay, as of the last snapshot.
+            Safe to call from any thread: it never touches the live peer state, only the
+            dict that "refresh_stats" publishes from the event loop.
+        """
+
+        return dict(self.stats_snapshot)
+
+    def refresh_stats(self):
+        """
+            Computes the backpressure counters and publishes them as a new snapshot.
+            Must run on the event loop, which owns "self.peers" and the peer queues.
+        """
+
+        self.stats_snapshot = {
+            "peers": len(self.peers),
+            "queued_bytes": sum(p.queued_bytes for p in self.peers.values()),
+            "max_peer_queued_bytes": max((p.queued_bytes for p in self.peers.values()), default=0),
+            "dropped_msgs": self.dropped_total,
+            "dropped_bytes": self.dropped_bytes_total,
+            "evictions": self.evictions,
+            "oversized_frames": self.oversized_frames,
+            "duplicate_disconnect_broadcasts": self.duplicate_disconnect_broadcasts,
+        }
+
+    async def stats_loop(self):
+        """Refreshes the stats snapshot every STATS_INTERVAL seconds."""
+
+        while True:
+            self.refresh_stats()
+            await asyncio.sleep(STATS_INTERVAL)
+
+    async def handle_client(self, reader, writer):
+        """
+            Manages a single client connection on the Relay Server.
+            1. Registers the client's UUID.
+            2. Receives encrypted messages.
+            3. Broadcasts the received message to ALL other connected clients (Echo/Relay pattern).
+            4. Handles cleanup and notification when a client disconnects.
+        """
+
+        addr = writer.get_extra_info("peername")
+        print(f"[Relay] Peer conected: {addr}")
+
+        if self.on_connect:
+            self.on_connect(addr[0])
+
+        peer = RelayPeer(reader, writer, addr, self.high_water)
+
+        try:
+            # The UUID is the first line; anything after it is already message data
+            initial_data = (await reader.readline()).decode('utf-8').strip()
+            if not initial_data:
+                writer.close()
+                return
+            peer.uuid = initial_data
+            print(f"[Relay] UUID registered for {addr}: {peer.uuid}")
+
+            if self.on_register:
+                self.on_register(peer.uuid, addr[0])
+
+        except Exception as e:
+            print(f"[Relay] Error receiving UUID from {addr}: {e}")
+            writer.close()
+            return
+
+        peer.writer_task = asyncio.create_task(peer.drain_loop())
+        self.peers[writer] = peer
+
+        # Only whole messages are forwarded, so frames from different senders never interleave
+        decoder = FrameDecoder(self.max_frame_size)
+
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+
+                for frame in decoder.feed(data):
+                    if self.on_message:
+                        self.on_message(peer.uuid)
+
+                    # Broadcast
+                    self.broadcast(frame, sender=peer)
+
+                if decoder.oversized:
+                    self.oversized_frames += decoder.oversized
+                    print(f"[Relay] Discarded {decoder.oversized} oversized frame(s) from {peer.uuid} ({addr})")
+                    decoder.oversized = 0
+
+        except ConnectionResetError:
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down: no leave notification, just release the socket
+            self.peers.pop(writer, None)
+            peer.close()
+            return
+        except Exception as e:
+            print(f"[Relay] Connection error {peer.uuid} ({addr}): {e}")
+
+        print(f"[Relay] Peer disconnected: {peer.uuid} ({addr})")
+
+        self.peers.pop(writer, None)
+        peer.close()
+
+        if self.on_disconnect:
+            if self.disconnect_executor is None:
+                self.disconnect_executor = ThreadPoolExecutor(max_workers=DISCONNECT_WORKERS,
+                                                              thread_name_prefix="relay-disconnect")
+
+            loop = asyncio.get_running_loop()
+            to_send = await loop.run_in_executor(self.disconnect_executor, self.on_disconnect, peer.uuid)
+            if not to_send:
+                return
+
+            if to_send in self.recent_disconnect_broadcasts:
+                self.duplicate_disconnect_broadcasts += 1
+                return
+
+            self.recent_disconnect_broadcasts.append(to_send)
+            self.broadcast(to_send)
+
+    async def serve(self, host, port):
+        """
+            Starts the asyncio TCP server and serves peers until cancelled.
+        """
+
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=LISTEN_BACKLOG)
+        print(f"[Relay] Listening on {host}:{port} (Press CTRL+C to exit)...")
+
+        stats_task = asyncio.create_task(self.stats_loop())
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            stats_task.cancel()
+            self.refresh_stats()
+            for peer in list(self.peers.values()):
+                peer.close()
+            self.peers.clear()
+            if self.disconnect_executor is not None:
+                self.disconnect_executor.shutdown(wait=False)
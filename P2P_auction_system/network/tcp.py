@@ -1,23 +1,41 @@
-import threading, socket
+import threading, socket, time
 from design.ui import UI
+from network.framing import FrameDecoder, WIRE_JSON, WIRE_BINARY, encode_binary_frame, is_binary_frame, decode_binary_frame
 from network.peer_state import PeerState
-from client.message.process_message import process_message
+from client.message.process_message import process_message, outgoing_wire_format
 from security_monitor import log_security_event, record_latency
-from crypto.crypt_decrypt.decrypt import decrypt_message_symmetric_gcm
 
 
 # ======== TCP Utilities ========
 
+def encrypt_for_peers(msg, client_state):
+    """
+        Encrypts a message with the Group Key using the wire format negotiated with the network
+        (see "outgoing_wire_format"): a raw binary envelope (bytes) or the legacy JSON envelope (str).
+    """
+
+    session = client_state.group_session
+
+    if outgoing_wire_format(client_state) == WIRE_BINARY:
+        return session.encrypt(msg)
+    return session.encrypt_json(msg)
+
 def send_to_peers(msg, connections):
     """
         Broadcasts a message to a list of active TCP connections.
-        Appends a newline character as a delimiter to ensure proper message framing.
+        Binary envelopes (bytes) are sent in a length-prefixed frame, legacy JSON envelopes (str)
+        get a newline character appended as a delimiter to ensure proper message framing.
         Handles disconnected sockets by removing them from the list.
     """
 
+    if isinstance(msg, (bytes, bytearray)):
+        data = encode_binary_frame(msg)
+    else:
+        data = (msg + "\n").encode('utf-8')
+
     for conn in connections[:]:
         try:
-            conn.sendall((msg + "\n").encode('utf-8'))
+            conn.sendall(data)
         except Exception:
             if conn in connections:
                 connections.remove(conn)
@@ -26,24 +44,48 @@ def send_to_peers(msg, connections):
             except:
                 pass
 
+def process_binary_frames(frames, client_state):
+    """
+        Decrypts a run of consecutive binary frames, one by one with the current Group Key
+        session, and hands each valid message to "process_message", in order.
+    """
+
+    bodies = []
+    for frame in frames:
+        try:
+            bodies.append(decode_binary_frame(frame))
+        except ValueError:
+            bodies.append(b"")
+
+    for msg in client_state.group_session.decrypt_each(bodies):
+        if msg is None:
+            log_security_event("decryption_error", "failure", "AES-GCM decryption failed")
+            continue
+
+        try:
+            process_message(msg, client_state, WIRE_BINARY)
+        except Exception as e:
+            UI.error(f"Error processing message: {e}")
+
 def handle_connection(conn, addr, client_state):
     """
         The main TCP listener loop for a specific connection.
-        1. Reads raw bytes from the socket into a buffer.
-        2. Handles TCP fragmentation by processing data only when a newline delimiter is found.
-        3. Decrypts incoming messages using the Group Key (AES-GCM).
+        1. Reads raw bytes from the socket into a "FrameDecoder".
+        2. Handles TCP fragmentation by processing data only when a complete frame is available.
+        3. Decrypts incoming messages (binary or legacy JSON envelopes) using the Group Key session (AES-GCM).
+           Consecutive binary frames that arrived in the same read are handled as one run.
         4. Passes the valid message to the application logic (process_message).
     """
 
     UI.success(f"Connected: {addr}")
 
-    buffer = b""
+    decoder = FrameDecoder()
 
     while True:
         try:
             conn.settimeout(1.0)
             try:
-                data = conn.recv(8192)
+                data = conn.recv(65536)
             except socket.timeout:
                 if client_state.peer.stop_event.is_set():
                     break
@@ -54,10 +96,21 @@ def handle_connection(conn, addr, client_state):
             if not data:
                 break
 
-            buffer += data
+            frames = decoder.feed(data)
+            binary_run = []
+
+            for i, c_msg_bytes in enumerate(frames):
 
-            while b"\n" in buffer:
-                c_msg_bytes, buffer = buffer.split(b"\n", 1)
+                if is_binary_frame(c_msg_bytes):
+                    binary_run.append(c_msg_bytes)
+
+                    # Keep collecting until the run ends, then decrypt its frames in order
+                    if i + 1 < len(frames) and is_binary_frame(frames[i + 1]):
+                        continue
+
+                    process_binary_frames(binary_run, client_state)
+                    binary_run = []
+                    continue
 
                 try:
                     c_msg = c_msg_bytes.decode('utf-8').strip()
@@ -70,21 +123,26 @@ def handle_connection(conn, addr, client_state):
 
                 try:
                     try:
-                        
+                        start_time = time.time()
                         try:
-                            msg = decrypt_message_symmetric_gcm(c_msg, client_state.group_key)
-                        except Exception as e:
+                            msg = client_state.group_session.decrypt(c_msg)
+                        except Exception:
                             log_security_event("decryption_error", "failure", "AES-GCM decryption failed")
                             record_latency(start_time)
-                            return
-                        
-                        process_message(msg, client_state)
+                            # Not a group envelope: handled below as a plaintext message
+                            raise
+
+                        process_message(msg, client_state, WIRE_JSON)
                     except Exception:
                         process_message(c_msg, client_state)
 
                 except Exception as e:
                     UI.error(f"Error processing message: {e}")
 
+            if decoder.oversized:
+                UI.warn(f"Discarded {decoder.oversized} oversized message(s) from {addr}")
+                decoder.oversized = 0
+
         except ConnectionResetError:
             UI.warn(f"Connection closed by {addr}")
             break
@@ -167,7 +225,7 @@ def connect_to_relay(state: PeerState, relay_host, relay_port, client_state):
             conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             conn.connect((relay_host, relay_port))
 
-            UI.success(f"Successfully connected to Relay!")
+            UI.success("Successfully connected to Relay!")
 
             state.connections.append(conn)
 
@@ -20,6 +20,9 @@ class RelayMonitor:
         self.conn_attempts_per_ip = defaultdict(int)
         self.active_uuids = set()
 
+        # Função opcional que devolve os contadores de backpressure do Relay
+        self.stats_provider = None
+
         # Iniciar hilo en segundo plano para reportar métricas cada minuto
         self.running = True
         self.reporter_thread = threading.Thread(target=self._report_metrics, daemon=True)
@@ -74,10 +77,13 @@ class RelayMonitor:
         while self.running:
             time.sleep(60)
             with self.lock:
-                self._write_log("metric_report", {
+                report = {
                     "msgs_per_minute": self.msg_count_global,
                     "connections_per_minute": self.conn_count_global
-                })
+                }
+                if self.stats_provider:
+                    report["relay_backpressure"] = self.stats_provider()
+                self._write_log("metric_report", report)
                 # Resetear contadores para el siguiente minuto
                 self.msg_count_global = 0
                 self.conn_count_global = 0
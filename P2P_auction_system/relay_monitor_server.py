@@ -1,9 +1,9 @@
 from relay_monitor import RelayMonitor 
 MONITOR = RelayMonitor()
 
-import socket
+import os
 import sys
-import threading
+import asyncio
 from pathlib import Path
 
 from client.ca_handler.ca_connection import connect_and_register_to_ca
@@ -13,10 +13,8 @@ from config.config import parse_config
 from crypto.keys.keys_handler import prepare_key_pair_generation
 from local_test import TEST
 from network.ip import get_ip
+from network.relay_engine import RelayEngine, PEER_HIGH_WATER
 
-RELAY_CONNECTIONS = {} 
-RELAY_LOCK = threading.Lock()
-STOP_EVENT = threading.Event()
 RELAY_GROUP_KEY = None
 
 def peer_left(uuid):
@@ -25,96 +23,12 @@ def peer_left(uuid):
         that a specific peer (UUID) has disconnected.
     """
 
+    # [MONITOR] Retirar o UUID da lista de usuarios ativos ao desconectarse
+    MONITOR.remove_uuid(uuid)
+
     message = leave_network(uuid)
     return (message+'\n').encode()
 
-def handle_client(conn, addr):
-    """
-        Manages a single client connection on the Relay Server.
-        1. Registers the client's UUID.
-        2. Receives encrypted messages.
-        3. Broadcasts the received message to ALL other connected clients (Echo/Relay pattern).
-        4. Handles cleanup and notification when a client disconnects.
-    """
-
-    print(f"[Relay] Peer conected: {addr}")
-    
-    # [MONITOR] Registar o IP entrante para evaluar posiveis picos de conexões (DoS)
-    # e atualizar a métrica 'connections_per_minute'
-    MONITOR.log_connection(addr[0])
-    
-    user_uuid = "NA"
-    try:
-        initial_data = conn.recv(1024).decode('utf-8').strip()
-        if not initial_data:
-            return 
-        user_uuid = initial_data
-        print(f"[Relay] UUID registered for {addr}: {user_uuid}")
-        
-        # [MONITOR] Validar o UUID contra a lista de ativos para detetar colisões ou spoofing
-        MONITOR.register_uuid(user_uuid, addr[0])
-        
-    except Exception as e:
-        print(f"[Relay] Error receiving UUID from {addr}: {e}")
-        conn.close()
-        return
-
-    with RELAY_LOCK:
-        RELAY_CONNECTIONS[conn] = user_uuid
-
-    while not STOP_EVENT.is_set():
-        try:
-            conn.settimeout(1.0)
-            try:
-                data = conn.recv(4096)
-            except socket.timeout:
-                continue
-
-            if not data:
-                break
-
-            # [MONITOR] Contabilizar a mensagem recebida de este UUID para atualizar
-            # a métrica 'msgs_per_minute' e detetar 'Message Spamming'
-            MONITOR.log_message(user_uuid)
-
-            # Broadcast
-            msg = data
-            with RELAY_LOCK:
-                for c in RELAY_CONNECTIONS:
-                    if c != conn:
-                        try:
-                            c.sendall(msg)
-                        except:
-                            pass
-
-        except ConnectionResetError:
-            break
-        except Exception as e:
-            if not STOP_EVENT.is_set():
-                print(f"[Relay] Connection error {user_uuid} ({addr}): {e}")
-            break
-
-    print(f"[Relay] Peer disconnected: {user_uuid} ({addr})")
-    
-    # [MONITOR] Retirar o UUID da lista de usuarios ativos ao desconectarse
-    MONITOR.remove_uuid(user_uuid)
-    
-    to_send = peer_left(user_uuid)
-    with RELAY_LOCK:
-        if conn in RELAY_CONNECTIONS:
-            RELAY_CONNECTIONS.pop(conn, None) 
-            
-        for c in RELAY_CONNECTIONS:
-            try:
-                c.sendall(to_send)
-            except:
-                pass
-            
-    try:
-        conn.close()
-    except:
-        pass
-
 # def handle_client(conn, addr):
 #     """
 #         Manages a single client connection on the Relay Server.
@@ -191,44 +105,35 @@ def handle_client(conn, addr):
 def start_relay_server(host, port):
     """
         Starts the TCP server for the Relay.
-        Listens for incoming peer connections and spawns a "handle_client" thread for each one.
+        Runs the asyncio "RelayEngine" with the monitor hooks attached.
+        The per-peer high-water mark and the slow peer policy ("drop" or "disconnect")
+        are read from RELAY_HIGH_WATER and RELAY_SLOW_PEER_POLICY.
     """
 
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    engine = RelayEngine(
+        # [MONITOR] Registar o IP entrante para evaluar posiveis picos de conexões (DoS)
+        on_connect=MONITOR.log_connection,
+        # [MONITOR] Validar o UUID contra a lista de ativos para detetar colisões ou spoofing
+        on_register=MONITOR.register_uuid,
+        # [MONITOR] Contabilizar a mensagem recebida para detetar 'Message Spamming'
+        on_message=MONITOR.log_message,
+        on_disconnect=peer_left,
+        high_water=int(os.environ.get("RELAY_HIGH_WATER", PEER_HIGH_WATER)),
+        slow_peer_policy=os.environ.get("RELAY_SLOW_PEER_POLICY", "drop")
+    )
 
-    try:
-        server.bind((host, port))
-        server.listen()
-        server.settimeout(1.0)
-        print(f"[Relay] Listening on {host}:{port} (Press CTRL+C to exit)...")
-    except Exception as e:
-        print(f"[Relay] Failure to start server: {e}")
-        return
+    # [MONITOR] Incluir os contadores de backpressure no 'metric_report'
+    MONITOR.stats_provider = engine.get_stats
 
     try:
-        while not STOP_EVENT.is_set():
-            try:
-                conn, addr = server.accept()
-                t = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
-                t.start()
-            except socket.timeout:
-                continue
-            except Exception as e:
-                print(f"[Relay] Error in accept: {e}")
+        asyncio.run(engine.serve(host, port))
     except KeyboardInterrupt:
         print("\n[Relay] Shutting down server...")
-    finally:
-        STOP_EVENT.set()
-        server.close()
+    except OSError as e:
+        print(f"[Relay] Failure to start server: {e}")
+        return
 
-        with RELAY_LOCK:
-            for c in RELAY_CONNECTIONS:
-                try:
-                    c.close()
-                except:
-                    pass
-        print("[Relay] Server successfully shut down.")
+    print("[Relay] Server successfully shut down.")
 
 
 def main():
@@ -0,0 +1,132 @@
+import json
+from types import SimpleNamespace
+
+from client.ledger.ledger_handler import init_auction_projection, project_auctions
+from client.ledger.ledger_logic import Ledger
+from client.ledger.translation.ledger_to_dict import AuctionProjection, empty_auction_state
+from client.message.auction.auction_handler import add_my_auction, add_winning_key
+
+
+class Wallet:
+    def __init__(self, *owned):
+        self.owned = set(owned)
+
+    def is_token_owner(self, token_id):
+        return token_id in self.owned
+
+
+def auction_event(auction_id, token_id, min_bid=10):
+    return {"type": "auction", "id": auction_id, "min_bid": min_bid, "public_key": f"pub-{auction_id}",
+            "closing_date": 1700000000, "token": {"token_id": token_id}}
+
+
+def bid_event(auction_id, token_id, bid):
+    return {"type": "bid", "auction_id": auction_id, "bid": bid, "token": {"token_id": token_id}}
+
+
+def make_client(tmp_path, wallet, ledger):
+    return SimpleNamespace(user_path=tmp_path, token_manager=wallet, ledger=ledger,
+                           auction_projection=None, auctions=empty_auction_state())
+
+
+def create_my_auction(client, auction_id, token_id):
+    """What 'cmd_auction' does: live state first, then the ledger event."""
+    add_my_auction(client.auctions, auction_id, f"pub-{auction_id}", f"PRIVATE-{auction_id}", 10,
+                   1700000000, {"token_id": token_id}, f"pub-{auction_id}")
+    client.ledger.add_action(auction_event(auction_id, token_id))
+
+
+def test_private_key_survives_projection_and_restart(tmp_path):
+    wallet = Wallet("mine-1", "mine-2")
+    client = make_client(tmp_path, wallet, Ledger())
+    init_auction_projection(client, tmp_path)
+
+    create_my_auction(client, 1, "mine-1")
+    project_auctions(client)
+    assert client.auctions["my_auctions"][1]["private_key"] == "PRIVATE-1"
+    assert client.auctions["my_auctions"][1]["public_key"] == "pub-1"
+
+    checkpoint = json.loads((tmp_path / "auctions_checkpoint.json").read_text())
+    assert "PRIVATE-1" not in json.dumps(checkpoint["auctions"])
+
+    # Restart: fresh live state, projection resumed from the checkpoint
+    restarted = make_client(tmp_path, wallet, client.ledger)
+    init_auction_projection(restarted, tmp_path)
+    assert restarted.auction_projection.height == len(client.ledger.chain) - 1
+    assert restarted.auctions["my_auctions"] == client.auctions["my_auctions"]
+
+    create_my_auction(restarted, 2, "mine-2")
+    restarted.ledger.add_action(bid_event(1, "other", 25))
+    project_auctions(restarted)
+
+    mine = restarted.auctions["my_auctions"]
+    assert set(mine) == {1, 2}
+    assert mine[1]["private_key"] == "PRIVATE-1" and mine[1]["highest_bid"] == 25
+    assert mine[2]["private_key"] == "PRIVATE-2"
+
+
+def test_stale_checkpoint_replays_but_keeps_local_fields(tmp_path):
+    wallet = Wallet("mine-1")
+    client = make_client(tmp_path, wallet, Ledger())
+    init_auction_projection(client, tmp_path)
+    create_my_auction(client, 1, "mine-1")
+    project_auctions(client)
+
+    # The checkpointed tip is not in this chain (e.g. replaced by a fork)
+    other = Ledger()
+    other.add_action(auction_event(1, "mine-1"))
+    restarted = make_client(tmp_path, wallet, other)
+    init_auction_projection(restarted, tmp_path)
+
+    assert restarted.auctions["my_auctions"][1]["private_key"] == "PRIVATE-1"
+
+
+def test_blocks_are_applied_once_to_a_private_state():
+    wallet = Wallet("mine")
+    ledger = Ledger()
+    ledger.add_action(auction_event(1, "mine"))
+    projection = AuctionProjection(wallet)
+
+    first = projection.update(ledger)
+    first["auction_list"][1]["highest_bid"] = 999
+    first["my_auctions"].clear()
+
+    ledger.add_action(bid_event(1, "other", 20))
+    second = projection.update(ledger, first)
+
+    assert second is not first
+    assert second["auction_list"][1]["highest_bid"] == 20
+    assert second["my_auctions"][1]["highest_bid"] == 20
+    assert projection.auctions["auction_list"][1]["highest_bid"] == 20
+
+
+def test_my_bid_flag_only_holds_for_the_bid_it_was_set_for():
+    wallet = Wallet()
+    ledger = Ledger()
+    ledger.add_action(auction_event(1, "seller"))
+    ledger.add_action(auction_event(2, "seller"))
+    projection = AuctionProjection(wallet)
+    live = projection.update(ledger)
+
+    # This node bid 30 on both (e.g. before its bid was recorded by the projection)
+    for auction_id in (1, 2):
+        live["auction_list"][auction_id].update(highest_bid=30, my_bid="True")
+        ledger.add_action(bid_event(auction_id, "pending", 30))
+    ledger.add_action(bid_event(2, "other", 40))
+
+    auctions = projection.update(ledger, live)
+
+    assert auctions["auction_list"][1]["my_bid"] == "True"
+    assert auctions["auction_list"][2]["my_bid"] == "False"
+
+
+def test_deal_keys_are_carried_over_in_memory_only(tmp_path):
+    client = make_client(tmp_path, Wallet(), Ledger())
+    init_auction_projection(client, tmp_path)
+    add_winning_key(client.auctions, 7, b"deal-key")
+
+    client.ledger.add_action(auction_event(1, "seller"))
+    project_auctions(client)
+
+    assert client.auctions["winning_auction"][7] == b"deal-key"
+    assert "deal-key" not in (tmp_path / "auctions_checkpoint.json").read_text()
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from ca.ca_api.ca_api import blind_sign, blind_sign_batch, issue_tokens
+from ca.ca_api.BlindTokens import BlindSignReq, BlindSignBatchReq
+from ca.ca_api.Tokens import TokensReq
+from ca.ca_db import init_db, close_db, get_db
+from ca.ca_utils.sign_pool import SignerPool
+from crypto.encoding.b64 import b64e
+
+BLINDED = b64e((12345).to_bytes(4, "big"))
+
+
+@pytest.fixture
+def ca_request(tmp_path, ca_private_key):
+    db_path = str(tmp_path / "ca.db")
+    init_db(db_path)
+    with get_db(db_path) as conn:
+        conn.execute("INSERT INTO users(uid, user_pub_pem, csr_pem, cert_pem, created_at) VALUES('alice','','','','')")
+
+    state = SimpleNamespace(DB_PATH=db_path, SIGNER=SignerPool(ca_private_key, workers=0))
+    yield SimpleNamespace(app=SimpleNamespace(state=state), client=SimpleNamespace(host="127.0.0.1"))
+    close_db()
+
+
+def issue(request, count):
+    return issue_tokens(TokensReq(uid="alice", count=count), request)
+
+
+def sign_batch(request, count, uid="alice"):
+    req = BlindSignBatchReq(uid=uid, blinded_tokens_b64=[BLINDED] * count)
+    return asyncio.run(blind_sign_batch(req, request)).blind_signatures_b64
+
+
+def sign_one(request):
+    return asyncio.run(blind_sign(BlindSignReq(uid="alice", blinded_token_b64=BLINDED), request))
+
+
+def status_of(call):
+    with pytest.raises(HTTPException) as error:
+        call()
+    return error.value.status_code
+
+
+def test_batch_signs_up_to_the_issued_tokens(ca_request):
+    issue(ca_request, 5)
+
+    assert len(sign_batch(ca_request, 3)) == 3
+    # Two issued tokens left: a batch of three is refused as a whole
+    assert status_of(lambda: sign_batch(ca_request, 3)) == 403
+    assert len(sign_batch(ca_request, 2)) == 2
+    assert status_of(lambda: sign_batch(ca_request, 1)) == 403
+
+
+def test_single_and_batch_signing_share_the_quota(ca_request):
+    issue(ca_request, 2)
+
+    sign_one(ca_request)
+    assert len(sign_batch(ca_request, 1)) == 1
+    assert status_of(lambda: sign_one(ca_request)) == 403
+    assert status_of(lambda: sign_batch(ca_request, 1)) == 403
+
+    issue(ca_request, 1)
+    assert "blind_signature_b64" in sign_one(ca_request)
+
+
+def test_unknown_user_is_still_a_404(ca_request):
+    assert status_of(lambda: sign_batch(ca_request, 1, uid="mallory")) == 404
+
+
+def test_batch_size_is_capped():
+    BlindSignBatchReq(uid="alice", blinded_tokens_b64=[BLINDED] * 100)
+
+    with pytest.raises(ValidationError):
+        BlindSignBatchReq(uid="alice", blinded_tokens_b64=[BLINDED] * 101)
+    with pytest.raises(ValidationError):
+        BlindSignBatchReq(uid="alice", blinded_tokens_b64=[])
@@ -0,0 +1,97 @@
+import time
+
+from client.ledger.ledger_logic import Ledger, compute_hash
+from client.ledger.ledger_store import BlockLog, segment_name
+from client.ledger.ledger_sqlite import SQLiteLedgerStore, STREAM_PAGE_ROWS
+
+
+def make_chain(blocks):
+    chain = []
+    prev_hash = "0"
+    for height in range(blocks):
+        block = {"height": height, "prev_hash": prev_hash, "events": [{"type": "bid", "bid": height}]}
+        block["block_hash"] = compute_hash(block)
+        prev_hash = block["block_hash"]
+        chain.append(block)
+    return chain
+
+
+def corrupt_record(path, line_number):
+    lines = path.read_bytes().splitlines(keepends=True)
+    lines[line_number] = b'{"height": 1' + b"#" * 10 + b"\n"
+    path.write_bytes(b"".join(lines))
+
+
+def test_tail_is_synced_without_another_append(tmp_path):
+    log = BlockLog(tmp_path / "blocks", fsync_batch=100, fsync_interval=0.05)
+    log.save_chain(make_chain(3))
+    assert log.pending_sync > 0
+
+    deadline = time.monotonic() + 2
+    while log.pending_sync and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert log.pending_sync == 0
+    log.close()
+
+
+def test_close_syncs_the_tail(tmp_path):
+    log = BlockLog(tmp_path / "blocks", fsync_batch=100, fsync_interval=60)
+    log.save_chain(make_chain(3))
+
+    log.close()
+    assert log.pending_sync == 0 and log.sync_timer is None
+
+
+def test_corrupt_middle_segment_ends_the_readable_chain(tmp_path):
+    directory = tmp_path / "blocks"
+    chain = make_chain(30)
+    log = BlockLog(directory, segment_max_blocks=10)
+    log.save_chain(chain)
+    log.close()
+
+    corrupt_record(directory / segment_name(10), 5)
+
+    log = BlockLog(directory, segment_max_blocks=10)
+    assert [block["height"] for block in log.iter_blocks()] == list(range(15))
+
+    # Saving the chain rewrites the log from the last good block
+    log.save_chain(chain)
+    assert [block["block_hash"] for block in log.iter_blocks()] == [block["block_hash"] for block in chain]
+    log.close()
+
+
+def test_load_drops_the_blocks_after_a_corrupt_record(tmp_path):
+    path = tmp_path / "ledger.json"
+    ledger = Ledger()
+    for n in range(20):
+        ledger.add_action({"type": "bid", "bid": n})
+    ledger.save_to_file(path)
+    ledger.close(path)
+
+    from client.ledger import ledger_logic
+    ledger_logic._block_logs.clear()
+    corrupt_record(tmp_path / "ledger_blocks" / segment_name(0), 12)
+
+    restored = Ledger.load_from_file(path)
+    assert len(restored.chain) == 12
+    assert ledger_logic.open_block_log(path).count == 12
+    assert restored.verify_chain() == (True, "Chain is valid")
+
+
+def test_sqlite_streaming_reads_let_the_consumer_use_the_store(tmp_path):
+    store = SQLiteLedgerStore(tmp_path / "ledger.db")
+    chain = make_chain(STREAM_PAGE_ROWS + 10)
+    store.save_chain(chain)
+
+    # The store lock is not held between two pages, so writes do not deadlock
+    heights = []
+    for block in store.iter_blocks():
+        heights.append(block["height"])
+        if block["height"] == 3:
+            assert store.token_count() == 0
+            store.append_block(dict(chain[-1], height=len(chain), events=[]), len(chain))
+
+    assert heights == list(range(len(chain) + 1))
+    assert list(store.iter_token_ids()) == []
+    store.close()
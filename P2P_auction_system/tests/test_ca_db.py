@@ -0,0 +1,91 @@
+import gc
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from ca import ca_db
+from ca.ca_db import get_db, close_db, init_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "ca.db")
+    init_db(path)
+    yield path
+    close_db()
+
+
+def is_closed(conn):
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def in_thread(function):
+    """Runs 'function' in a new thread and returns its result once the thread has ended."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    gc.collect()
+    return result[0]
+
+
+def test_connection_is_reused_within_a_thread(db_path):
+    assert get_db(db_path) is get_db(db_path)
+    assert in_thread(lambda: get_db(db_path)) is not get_db(db_path)
+
+
+def test_connection_is_closed_when_its_thread_ends(db_path):
+    conn = in_thread(lambda: get_db(db_path))
+
+    assert is_closed(conn)
+    assert conn not in ca_db._open_connections
+
+
+def test_one_connection_per_database_per_thread(db_path, tmp_path):
+    other_path = str(tmp_path / "other.db")
+
+    conns = in_thread(lambda: (get_db(db_path), get_db(other_path), get_db(db_path)))
+
+    assert conns[0] is conns[2] and conns[0] is not conns[1]
+    assert all(is_closed(conn) for conn in conns)
+
+
+def test_close_db_closes_every_open_connection(db_path):
+    release = threading.Event()
+    opened = []
+
+    def worker():
+        opened.append(get_db(db_path))
+        release.wait(5)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while len(opened) < 3:
+        time.sleep(0.01)
+    mine = get_db(db_path)
+
+    close_db()
+
+    assert all(is_closed(conn) for conn in opened + [mine])
+    assert not ca_db._open_connections
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_thread_reconnects_after_close_db(db_path):
+    before = get_db(db_path)
+    close_db()
+
+    after = get_db(db_path)
+
+    assert after is not before and not is_closed(after)
+    assert after.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
@@ -0,0 +1,72 @@
+import copy
+
+import pytest
+
+from client.ledger import ledger_logic
+from client.ledger.ledger_logic import Ledger
+
+
+def build_ledger(blocks):
+    ledger = Ledger()
+    for n in range(blocks):
+        ledger.add_action({"type": "bid", "auction_id": 1, "bid": n, "token": {"token_id": f"tok-{n}"}})
+    return ledger
+
+
+@pytest.fixture(params=["inline", "pool"])
+def audit_mode(request, monkeypatch):
+    """Runs the full audit inline, or in spawned workers over small chunks."""
+    if request.param == "pool":
+        monkeypatch.setattr(ledger_logic, "PARALLEL_VERIFY_MIN_BLOCKS", 10)
+        monkeypatch.setattr(ledger_logic, "VERIFY_CHUNK_BLOCKS", 7)
+    return request.param
+
+
+def test_valid_chain_passes_both_modes(audit_mode):
+    ledger = build_ledger(40)
+
+    assert ledger.verify_chain() == (True, "Chain is valid")
+    assert ledger.verify_chain(full=True, workers=2) == (True, "Chain is valid")
+
+
+@pytest.mark.parametrize("height", [1, 7, 8, 23, 40])
+def test_tampered_block_is_detected_in_both_modes(audit_mode, height):
+    ledger = build_ledger(40)
+    ledger.mark_verified(height - 1)
+    ledger.chain[height]["events"][0]["bid"] = 10 ** 6
+
+    ok, reason = ledger.verify_chain()
+    assert not ok and reason == f"Invalid block_hash at block {height}"
+
+    ok, reason = ledger.verify_chain(full=True, workers=2)
+    assert not ok and reason == f"Invalid block_hash at block {height}"
+
+
+def test_only_the_full_audit_rechecks_the_verified_prefix(audit_mode):
+    ledger = build_ledger(40)
+    ledger.chain[12]["events"][0]["bid"] = 10 ** 6
+
+    # Fast path: the prefix is trusted as verified
+    assert ledger.verify_chain()[0]
+
+    ok, reason = ledger.verify_chain(full=True, workers=2)
+    assert not ok and reason == "Invalid block_hash at block 12"
+
+
+def test_broken_link_on_a_chunk_boundary_is_detected(audit_mode):
+    ledger = build_ledger(40)
+    forged = copy.deepcopy(ledger.chain[15])
+    forged["prev_hash"] = "0" * 64
+    forged["block_hash"] = ledger_logic.compute_hash(forged)
+    ledger.chain[15] = forged
+
+    ok, reason = ledger.verify_chain(full=True, workers=2)
+    assert not ok and reason == "Prev_hash mismatch at block 15"
+
+
+def test_full_audit_checks_the_genesis():
+    ledger = build_ledger(3)
+    ledger.chain[0]["events"].append({"type": "bid", "bid": 1})
+
+    ok, reason = ledger.verify_chain(full=True)
+    assert not ok and reason.startswith("Invalid genesis block")
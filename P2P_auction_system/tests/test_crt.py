@@ -0,0 +1,39 @@
+import secrets
+import pytest
+
+from ca.ca_utils.crt import CRTKey
+
+
+@pytest.fixture
+def crt(ca_private_key):
+    return CRTKey(ca_private_key)
+
+
+def test_crt_signature_matches_the_full_exponent(crt):
+    for _ in range(8):
+        m = secrets.randbelow(crt.n)
+        assert crt.sign_int(m) == pow(m, crt.d, crt.n)
+    assert crt.faults == 0
+
+
+def test_faulty_crt_signature_is_never_returned(crt):
+    messages = [secrets.randbelow(crt.n) for _ in range(8)]
+    expected = [pow(m, crt.d, crt.n) for m in messages]
+
+    # Fault injection: a corrupted dP makes every CRT result wrong modulo p
+    crt.dp ^= 1 << 5
+
+    for m, signature in zip(messages, expected):
+        s = crt.sign_int(m)
+        assert s == signature
+        assert pow(s, crt.e, crt.n) == m
+
+    assert crt.faults == len(messages)
+
+
+def test_unrecoverable_fault_raises(crt):
+    crt.dq ^= 1
+    crt.d ^= 1
+
+    with pytest.raises(ValueError):
+        crt.sign_int(secrets.randbelow(crt.n))
@@ -0,0 +1,97 @@
+import pytest
+
+from network.framing import (FrameDecoder, encode_binary_frame, decode_binary_frame,
+                             is_binary_frame, BINARY_FRAME_MAGIC, BINARY_HEADER_SIZE)
+
+MAX = 64
+
+
+def feed_chunks(decoder, stream, size):
+    """Feeds "stream" to the decoder in chunks of "size" bytes and collects every frame."""
+
+    frames = []
+    for i in range(0, len(stream), size):
+        frames.extend(decoder.feed(stream[i:i + size]))
+    return frames
+
+
+def test_binary_frame_round_trip():
+    frame = encode_binary_frame(b"\x00\n\xff" * 4)
+
+    assert is_binary_frame(frame)
+    assert decode_binary_frame(frame) == b"\x00\n\xff" * 4
+    with pytest.raises(ValueError):
+        decode_binary_frame(b'{"type": "x"}\n')
+    with pytest.raises(ValueError):
+        decode_binary_frame(bytes([BINARY_FRAME_MAGIC, 99, 0, 0, 0, 0]))
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 5, 7, 1024])
+def test_mixed_newline_and_binary_stream(chunk):
+    # Binary bodies may contain newlines and magic bytes: only the length prefix counts
+    binary = encode_binary_frame(b"\n" + bytes([BINARY_FRAME_MAGIC]) + b"body\n")
+    stream = b'{"a": 1}\n' + binary + b'{"b": 2}\n' + binary + binary
+
+    frames = feed_chunks(FrameDecoder(MAX), stream, chunk)
+
+    assert frames == [b'{"a": 1}\n', binary, b'{"b": 2}\n', binary, binary]
+
+
+def test_split_length_prefix_waits_for_the_whole_header():
+    decoder = FrameDecoder(MAX)
+    frame = encode_binary_frame(b"x" * 20)
+
+    # Magic, version and half of the length field
+    assert decoder.feed(frame[:4]) == []
+    assert decoder.feed(frame[4:BINARY_HEADER_SIZE]) == []
+    assert decoder.feed(frame[BINARY_HEADER_SIZE:]) == [frame]
+    assert decoder.buffer == bytearray()
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 16, 1024])
+def test_oversized_binary_frame_is_skipped_across_chunks(chunk):
+    big = encode_binary_frame(b"\n" * (5 * MAX))
+    after = encode_binary_frame(b"ok")
+    stream = b'{"before": 1}\n' + big + after + b'{"after": 2}\n'
+
+    decoder = FrameDecoder(MAX)
+    frames = feed_chunks(decoder, stream, chunk)
+
+    assert frames == [b'{"before": 1}\n', after, b'{"after": 2}\n']
+    assert decoder.oversized == 1
+    assert decoder.skip_bytes == 0
+
+
+@pytest.mark.parametrize("chunk", [1, 10, 1024])
+def test_oversized_line_is_dropped_up_to_the_delimiter(chunk):
+    stream = b'{"before": 1}\n' + b"{" + b"y" * (3 * MAX) + b"}\n" + b'{"after": 2}\n'
+
+    decoder = FrameDecoder(MAX)
+    frames = feed_chunks(decoder, stream, chunk)
+
+    assert frames == [b'{"before": 1}\n', b'{"after": 2}\n']
+    assert decoder.oversized == 1
+    assert not decoder.discarding
+
+
+def test_resync_on_magic_byte_after_an_oversized_line():
+    # The decoder drops the oversized tail up to the delimiter and picks up the next binary frame
+    binary = encode_binary_frame(b"payload")
+    decoder = FrameDecoder(MAX)
+
+    frames = decoder.feed(b"{" + b"z" * (2 * MAX))
+    assert frames == [] and decoder.discarding
+
+    frames = decoder.feed(b"z" * 10 + b"}\n" + binary + b'{"n": 1}\n')
+
+    assert frames == [binary, b'{"n": 1}\n']
+    assert decoder.oversized == 1
+
+
+def test_magic_byte_inside_a_discarded_tail_is_not_a_frame_start():
+    decoder = FrameDecoder(MAX)
+    decoder.feed(b"{" + b"z" * (2 * MAX))
+
+    tail = bytes([BINARY_FRAME_MAGIC, 1, 0, 0, 0, 1]) + b"x}\n"
+    assert decoder.feed(tail + b'{"n": 1}\n') == [b'{"n": 1}\n']
+    assert decoder.skip_bytes == 0
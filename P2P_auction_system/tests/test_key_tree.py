@@ -0,0 +1,131 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ca.ca_api.ca_api import join_group, rotate_group_key
+from ca.ca_db import init_db, close_db
+from ca.ca_lkh import KeyTree
+from ca.ca_members import MemberKeyCache
+from crypto.keys.group_keys import apply_lkh_update
+from crypto.keys.keys_crypto import generate_aes_key
+
+
+def add_members(tree, count):
+    """Registers 'count' members; returns {uid: {node: key}} as each member holds them."""
+    members = {}
+    for i in range(count):
+        path = tree.add(f"uid-{i}", generate_aes_key())
+        members[f"uid-{i}"] = {node: key for node, key in path}
+    return members
+
+
+def test_add_returns_the_path_from_the_leaf_to_the_root():
+    tree = KeyTree(8, generate_aes_key())
+    members = add_members(tree, 8)
+
+    for uid, keys in members.items():
+        leaf = tree.leaf_of[uid]
+        assert 8 <= leaf < 16
+        assert sorted(keys, reverse=True) == tree.path(leaf)
+        assert all(tree.keys[node] == key for node, key in keys.items())
+        assert keys[1] == tree.group_key
+
+    assert len({tree.leaf_of[uid] for uid in members}) == 8
+    assert tree.add("one-too-many", generate_aes_key()) is None
+
+
+def test_capacity_is_rounded_up_to_a_power_of_two():
+    tree = KeyTree(5, generate_aes_key())
+
+    assert tree.capacity == 8
+    assert len(add_members(tree, 8)) == 8
+
+
+@pytest.mark.parametrize("leaving", [["uid-0"], ["uid-3", "uid-4"], ["uid-0", "uid-1", "uid-2", "uid-3"]])
+def test_remove_rekeys_the_remaining_members_only(leaving):
+    tree = KeyTree(8, generate_aes_key())
+    members = add_members(tree, 8)
+    old_root = tree.group_key
+
+    entries = tree.remove(leaving)
+
+    assert tree.group_key != old_root
+    for uid, keys in members.items():
+        if uid in leaving:
+            assert uid not in tree.leaf_of
+            # The departed member cannot open any entry, even trying every key it knew
+            assert apply_lkh_update(dict(keys), entries) is None
+        else:
+            assert apply_lkh_update(keys, entries) == tree.group_key
+            assert all(tree.keys[node] == key for node, key in keys.items())
+
+
+def test_every_node_key_is_replaced_once_per_batch():
+    tree = KeyTree(16, generate_aes_key())
+    add_members(tree, 16)
+
+    entries = tree.remove(["uid-0", "uid-1", "uid-2"])
+
+    # Each replaced node is sent under each of its non-empty children, never twice
+    pairs = [(entry["node"], entry["under"]) for entry in entries]
+    assert len(pairs) == len(set(pairs))
+    assert [entry["node"] for entry in entries] == sorted((entry["node"] for entry in entries), reverse=True)
+
+
+def test_freed_leaves_are_reused():
+    tree = KeyTree(4, generate_aes_key())
+    add_members(tree, 4)
+    leaf = tree.leaf_of["uid-2"]
+
+    tree.remove(["uid-2"])
+    path = tree.add("newcomer", generate_aes_key())
+
+    assert tree.leaf_of["newcomer"] == leaf
+    assert path[-1] == [1, tree.group_key]
+
+
+@pytest.fixture
+def group_state(tmp_path):
+    db_path = str(tmp_path / "ca.db")
+    init_db(db_path)
+    state = SimpleNamespace(DB_PATH=db_path, KEY_GROUP_BOOL=False, MEMBER_KEYS=MemberKeyCache(workers=1),
+                            GROUP_LOCK=threading.Lock())
+    yield state
+    close_db()
+
+
+def test_join_group_creates_the_group_for_the_first_member(group_state):
+    group_key, path = join_group(group_state, "first", generate_aes_key())
+
+    assert group_key == group_state.KEY_GROUP == group_state.KEY_TREE.group_key
+    assert path[-1] == [1, group_key]
+
+
+def test_registration_during_a_rotation_gets_the_new_group_key(group_state):
+    for i in range(4):
+        join_group(group_state, f"uid-{i}", generate_aes_key())
+    old_key = group_state.KEY_GROUP
+
+    # Hold the rotation between the key tree update and the Group Key assignment
+    tree = group_state.KEY_TREE
+    removed = threading.Event()
+    remove = tree.remove
+
+    def slow_remove(uids):
+        entries = remove(uids)
+        removed.set()
+        time.sleep(0.2)
+        return entries
+
+    tree.remove = slow_remove
+    rotation = threading.Thread(target=rotate_group_key, args=(group_state, ["uid-0"]))
+    rotation.start()
+    assert removed.wait(5)
+
+    group_key, path = join_group(group_state, "newcomer", generate_aes_key())
+    rotation.join()
+
+    assert group_key != old_key
+    assert group_key == group_state.KEY_GROUP == path[-1][1]
@@ -0,0 +1,148 @@
+import pytest
+
+from client.ledger import ledger_logic
+from client.ledger.ledger_logic import Ledger
+from client.ledger.ledger_store import SEGMENT_MAX_BLOCKS
+from client.ledger.ledger_sqlite import SQLiteLedgerStore, StoredChain, BLOCK_CACHE_SIZE
+
+
+def bid_event(n):
+    return {"type": "bid", "auction_id": n % 7, "bid": n, "token": {"token_id": f"tok-{n}", "token_sig": f"sig-{n}"}}
+
+
+def build_ledger(blocks):
+    ledger = Ledger()
+    for n in range(blocks):
+        ledger.add_action(bid_event(n))
+    return ledger
+
+
+def close_stores():
+    """Drops the open block logs and SQLite stores, as a new process would."""
+    for log in ledger_logic._block_logs.values():
+        log.close()
+    ledger_logic._block_logs.clear()
+
+    for store in ledger_logic._sqlite_stores.values():
+        store.close()
+    ledger_logic._sqlite_stores.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh_stores():
+    yield
+    close_stores()
+
+
+@pytest.fixture
+def sqlite_backend(monkeypatch):
+    monkeypatch.setattr(ledger_logic, "LEDGER_BACKEND", "sqlite")
+
+
+@pytest.fixture
+def index_calls(monkeypatch):
+    """Heights passed to 'Ledger.index_block'."""
+    calls = []
+    index_block = Ledger.index_block
+
+    def counting(self, block, position=None):
+        calls.append(position)
+        return index_block(self, block, position)
+
+    monkeypatch.setattr(Ledger, "index_block", counting)
+    return calls
+
+
+def test_log_backend_has_no_bloom_filter():
+    ledger = build_ledger(50)
+
+    assert ledger.bloom is None
+    assert ledger.token_used("tok-10")
+    assert not ledger.token_used("unseen-token")
+
+
+def test_sqlite_bloom_filter_grows(tmp_path, sqlite_backend):
+    ledger = build_ledger(10)
+    ledger.save_to_file(tmp_path / "ledger.json")
+
+    capacity = ledger.bloom.capacity
+    assert capacity == ledger_logic.BLOOM_FILTER_MIN_CAPACITY
+
+    for n in range(10, capacity + 10):
+        ledger.add_action(bid_event(n))
+
+    # Rebuilt at twice the capacity once full, still without false negatives
+    assert ledger.bloom.capacity == 2 * capacity
+    assert all(ledger.token_used(f"tok-{n}") for n in range(capacity + 10))
+    assert not ledger.token_used("unseen-token")
+
+
+def test_sqlite_load_keeps_the_chain_in_the_store(tmp_path, sqlite_backend, monkeypatch):
+    path = tmp_path / "ledger.json"
+    ledger = Ledger()
+    ledger.save_to_file(path)
+
+    blocks = 20 * BLOCK_CACHE_SIZE
+    for n in range(blocks):
+        ledger.add_action(bid_event(n))
+    tip = ledger.chain[-1]
+    close_stores()
+
+    # A full scan of the blocks would fail the load
+    def no_full_scan(self, start_height=0):
+        raise AssertionError("the whole chain was read")
+    monkeypatch.setattr(SQLiteLedgerStore, "iter_blocks", no_full_scan)
+
+    restored = Ledger.load_from_file(path)
+    assert isinstance(restored.chain, StoredChain)
+    assert len(restored.chain) == blocks + 1
+    assert restored.chain[-1] == tip
+    assert [block["height"] for block in restored.chain[100:103]] == [100, 101, 102]
+    assert restored.token_used("tok-0") and not restored.token_used("unseen-token")
+    assert restored.verify_chain() == (True, "Chain is valid")
+
+    restored.add_action(bid_event(blocks))
+    assert restored.chain[-1]["prev_hash"] == tip["block_hash"]
+    assert len(restored.store.block_cache) <= BLOCK_CACHE_SIZE
+
+    # A fork only rewrites the replaced suffix
+    fork = restored.chain[blocks - 1:blocks]
+    fork.append(dict(restored.chain[-1], events=[bid_event(-1)]))
+    fork[-1]["block_hash"] = ledger_logic.compute_hash(fork[-1])
+    restored.replace_from(blocks - 1, fork)
+
+    assert len(restored.chain) == blocks + 1
+    assert restored.chain[-1]["block_hash"] == fork[-1]["block_hash"]
+    assert restored.token_used("tok--1")
+
+
+def test_restart_mid_segment_rescans_only_the_tail(tmp_path, index_calls):
+    path = tmp_path / "ledger.json"
+    ledger = Ledger()
+    ledger.save_to_file(path)
+
+    blocks = 2 * ledger_logic.INDEX_CHECKPOINT_BLOCKS + 40
+    for n in range(blocks):
+        ledger.add_action(bid_event(n))
+        ledger.save_to_file(path)
+
+    # Far from a segment rotation, yet the sidecar followed the chain
+    assert blocks < SEGMENT_MAX_BLOCKS
+    tail = ledger.indexed_height - ledger.index_checkpoint_height
+    assert 0 < tail < ledger_logic.INDEX_CHECKPOINT_BLOCKS
+
+    close_stores()
+    index_calls.clear()
+    restored = Ledger.load_from_file(path)
+
+    assert len(index_calls) == tail
+    assert index_calls[0] == len(restored.chain) - tail
+    assert restored.token_used(f"tok-{blocks - 1}") and restored.token_used("tok-0")
+
+    # A clean shutdown checkpoints the tail: the next start re-indexes nothing
+    restored.close(path)
+    close_stores()
+    index_calls.clear()
+    Ledger.load_from_file(path)
+
+    assert index_calls == []
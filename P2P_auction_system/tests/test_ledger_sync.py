@@ -0,0 +1,207 @@
+import copy
+import json
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+from client.ledger import ledger_handler
+from client.ledger.ledger_handler import (block_locator, prepare_ledger_request, ledger_request_handler,
+                                          ledger_update_handler, is_ledger_update_for_me, LOCATOR_DENSE_ENTRIES)
+from client.ledger.ledger_logic import Ledger, compute_hash
+
+
+class AcceptAllTokens:
+    def get_token(self):
+        return {"token_id": "t", "token_sig": "s"}
+
+    def verify_tokens(self, tokens):
+        return [True] * len(tokens)
+
+
+class CountingProjection:
+    def __init__(self):
+        self.updates = 0
+
+    def update(self, ledger, live=None):
+        self.updates += 1
+        return {}
+
+    def save_checkpoint(self):
+        pass
+
+
+def bid_event(n, tag="a"):
+    return {"type": "bid", "auction_id": 1, "bid": n, "token": {"token_id": f"{tag}-{n}", "token_sig": "s"}}
+
+
+def extend(ledger, blocks, tag="a"):
+    for n in range(blocks):
+        ledger.add_action(bid_event(n, tag))
+    return ledger
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clients = []
+
+    def make(ledger):
+        user_path = tmp_path / f"user-{len(clients)}"
+        user_path.mkdir()
+        client = SimpleNamespace(ledger=ledger, ledger_sync=None, ledger_request_id=None,
+                                 sync_responses=deque(maxlen=64), token_manager=AcceptAllTokens(),
+                                 auction_projection=CountingProjection(), auctions={},
+                                 user_path=user_path)
+        clients.append(client)
+        return client
+
+    yield make
+
+    for client in clients:
+        client.ledger.close(client.user_path / "ledger.json")
+
+
+def sync(requester, responder, max_rounds=100):
+    """Runs request/update rounds until the requester stops asking. Returns the rounds used."""
+    request = prepare_ledger_request(requester)
+    for rounds in range(1, max_rounds + 1):
+        update = ledger_request_handler(responder, json.loads(request))
+        if update is None:
+            return rounds
+        update = json.loads(update)
+        assert is_ledger_update_for_me(requester, update)
+        request = ledger_update_handler(requester, update)
+        if request is None:
+            return rounds
+    raise AssertionError("sync did not finish")
+
+
+def relink(chain):
+    """Recomputes every hash of a chain after its blocks were edited."""
+    for prev, block in zip([None] + chain, chain):
+        if prev is not None:
+            block["prev_hash"] = prev["block_hash"]
+        block["block_hash"] = compute_hash(block)
+
+
+def hashes(ledger):
+    return [block["block_hash"] for block in ledger.chain]
+
+
+def test_block_locator_is_dense_at_the_tip_then_doubles(make_client):
+    client = make_client(extend(Ledger(), 200))
+
+    heights = [height for height, _ in block_locator(client)]
+
+    assert heights[:LOCATOR_DENSE_ENTRIES] == list(range(200, 200 - LOCATOR_DENSE_ENTRIES, -1))
+    assert heights[-1] == 0
+    assert heights == sorted(heights, reverse=True)
+    gaps = [a - b for a, b in zip(heights[LOCATOR_DENSE_ENTRIES - 1:], heights[LOCATOR_DENSE_ENTRIES:-1])]
+    assert gaps == [2 ** i for i in range(1, len(gaps) + 1)]
+    assert all(client.ledger.chain[h]["block_hash"] == block_hash for h, block_hash in block_locator(client))
+
+
+def test_missing_blocks_arrive_in_continued_batches(make_client, monkeypatch):
+    monkeypatch.setattr(ledger_handler, "SYNC_BATCH_BLOCKS", 4)
+    remote = extend(Ledger(), 30)
+    local = Ledger()
+    local.chain = copy.deepcopy(remote.chain[:11])
+    local.rebuild_indexes()
+    local.mark_verified()
+
+    requester, responder = make_client(local), make_client(remote)
+    rounds = sync(requester, responder)
+
+    assert hashes(requester.ledger) == hashes(remote)
+    assert rounds == 5
+    assert requester.ledger_request_id == 0 and requester.ledger_sync is None
+    assert requester.auction_projection.updates == 1
+
+
+def test_longer_fork_replaces_the_local_suffix(make_client, monkeypatch):
+    monkeypatch.setattr(ledger_handler, "SYNC_BATCH_BLOCKS", 3)
+    shared = extend(Ledger(), 5)
+    local = extend(copy.deepcopy(shared), 4, tag="local")
+    remote = extend(copy.deepcopy(shared), 12, tag="remote")
+
+    requester = make_client(local)
+    sync(requester, make_client(remote))
+
+    assert hashes(requester.ledger) == hashes(remote)
+    assert requester.ledger.token_used("remote-11") and not requester.ledger.token_used("local-0")
+
+
+def test_shorter_fork_is_not_adopted(make_client):
+    shared = extend(Ledger(), 5)
+    local = extend(copy.deepcopy(shared), 8, tag="local")
+    remote = extend(copy.deepcopy(shared), 6, tag="remote")
+    before = hashes(local)
+
+    requester = make_client(local)
+    sync(requester, make_client(remote))
+
+    assert hashes(requester.ledger) == before
+
+
+def test_fork_from_genesis_is_adopted_when_the_genesis_is_valid(make_client):
+    remote = extend(Ledger(), 6)
+    local = extend(Ledger(), 2, tag="local")
+    local.chain[0]["timestamp"] = "1970-01-01T00:00:00Z"
+    relink(local.chain)
+    assert hashes(local)[0] != hashes(remote)[0]
+
+    requester = make_client(local)
+    sync(requester, make_client(remote))
+
+    assert hashes(requester.ledger) == hashes(remote)
+
+
+@pytest.mark.parametrize("tamper, rehash", [
+    (lambda genesis: genesis.update(events=[{"type": "bid", "bid": 1}]), True),
+    (lambda genesis: genesis.update(prev_hash="abc"), True),
+    (lambda genesis: genesis.update(description="rewritten"), False),
+], ids=["extra-events", "prev-hash", "stale-hash"])
+def test_fork_with_an_invalid_genesis_is_rejected(make_client, tamper, rehash):
+    remote = extend(Ledger(), 6)
+    tamper(remote.chain[0])
+    if rehash:
+        # Consistent hashes: only the genesis shape check can catch it
+        relink(remote.chain)
+
+    local = extend(Ledger(), 2, tag="local")
+    local.chain[0]["timestamp"] = "1970-01-01T00:00:00Z"
+    relink(local.chain)
+    before = hashes(local)
+
+    requester = make_client(local)
+    sync(requester, make_client(remote))
+
+    assert hashes(requester.ledger) == before
+
+
+def test_stale_and_foreign_updates_are_dropped(make_client):
+    remote = extend(Ledger(), 6)
+    local = Ledger()
+    local.chain = copy.deepcopy(remote.chain[:2])
+    local.rebuild_indexes()
+    local.mark_verified()
+    requester, responder = make_client(local), make_client(remote)
+
+    first = json.loads(prepare_ledger_request(requester))
+    stale_update = json.loads(ledger_request_handler(responder, first))
+
+    # A new request supersedes the first one: its answers are no longer ours
+    prepare_ledger_request(requester)
+    assert not is_ledger_update_for_me(requester, stale_update)
+
+    # A sync that finished accepts no late answers either
+    requester.ledger_request_id = 0
+    assert not is_ledger_update_for_me(requester, stale_update)
+
+    # While following a responder, batches from another one are ignored
+    request = json.loads(prepare_ledger_request(requester))
+    update = json.loads(ledger_request_handler(responder, request))
+    requester.ledger_sync = {"response_id": update["response_id"] + 1, "fork_height": None, "blocks": []}
+    assert ledger_update_handler(requester, update) is None
+    assert len(requester.ledger.chain) == 2
@@ -0,0 +1,125 @@
+import asyncio
+
+from ca.ca_rekey import RekeyQueue
+
+WINDOW = 0.1
+
+
+class Rotations:
+    """Fake rotation: records each batch and answers with its number."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+        self.running = 0
+        self.overlapping = False
+
+    async def __call__(self, uids):
+        self.running += 1
+        self.overlapping |= self.running > 1
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        if self.fail:
+            raise RuntimeError("rotation failed")
+        self.batches.append(sorted(uids))
+        return {"batch": len(self.batches)}
+
+
+def test_departures_within_the_window_share_one_rotation():
+    async def scenario():
+        rotations = Rotations()
+        rekey = RekeyQueue(rotations, window=WINDOW, max_staleness=1.0)
+
+        results = await asyncio.gather(*(rekey.submit(f"uid-{i}") for i in range(50)))
+
+        assert rotations.batches == [sorted(f"uid-{i}" for i in range(50))]
+        assert results == [{"batch": 1}] * 50
+        assert (rekey.batches, rekey.departures) == (1, 50)
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_departure_is_coalesced():
+    async def scenario():
+        rotations = Rotations()
+        rekey = RekeyQueue(rotations, window=WINDOW, max_staleness=1.0)
+
+        first, second = await asyncio.gather(rekey.submit("uid"), rekey.submit("uid"))
+
+        assert rotations.batches == [["uid"]]
+        assert first == second == {"batch": 1}
+
+    asyncio.run(scenario())
+
+
+def test_each_departure_pushes_the_deadline_back():
+    async def scenario():
+        rotations = Rotations()
+        rekey = RekeyQueue(rotations, window=WINDOW, max_staleness=1.0)
+
+        async def trickle():
+            for i in range(5):
+                asyncio.ensure_future(rekey.submit(f"uid-{i}"))
+                await asyncio.sleep(WINDOW / 4)
+
+        await trickle()
+        assert rotations.batches == []
+        while not rotations.batches:
+            await asyncio.sleep(0.01)
+
+        assert rotations.batches == [[f"uid-{i}" for i in range(5)]]
+
+    asyncio.run(scenario())
+
+
+def test_constant_churn_is_flushed_by_max_staleness():
+    async def scenario():
+        rotations = Rotations()
+        rekey = RekeyQueue(rotations, window=WINDOW, max_staleness=4 * WINDOW)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        i = 0
+        while loop.time() - start < 10 * WINDOW:
+            asyncio.ensure_future(rekey.submit(f"uid-{i}"))
+            i += 1
+            await asyncio.sleep(WINDOW / 4)
+        while rekey.pending or rekey.timer:
+            await asyncio.sleep(0.01)
+
+        # Without the bound a departure every WINDOW/4 would never let the batch close
+        assert len(rotations.batches) >= 2
+        assert sum(len(batch) for batch in rotations.batches) == i
+
+    asyncio.run(scenario())
+
+
+def test_rotations_never_overlap():
+    async def scenario():
+        rotations = Rotations(delay=3 * WINDOW)
+        rekey = RekeyQueue(rotations, window=WINDOW, max_staleness=1.0)
+
+        first = asyncio.ensure_future(rekey.submit("a"))
+        await asyncio.sleep(2 * WINDOW)
+        # The first batch is rotating: this departure starts the next one
+        second = asyncio.ensure_future(rekey.submit("b"))
+
+        assert await first == {"batch": 1}
+        assert await second == {"batch": 2}
+        assert rotations.batches == [["a"], ["b"]]
+        assert not rotations.overlapping
+
+    asyncio.run(scenario())
+
+
+def test_failed_rotation_is_reported_to_the_whole_batch():
+    async def scenario():
+        rekey = RekeyQueue(Rotations(fail=True), window=WINDOW, max_staleness=1.0)
+
+        results = await asyncio.gather(rekey.submit("a"), rekey.submit("b"), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not rekey.pending and rekey.timer is None
+
+    asyncio.run(scenario())
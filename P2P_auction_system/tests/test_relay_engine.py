@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+
+from network.relay_engine import RelayEngine, RelayPeer
+
+HIGH_WATER = 1024
+
+
+class StalledWriter:
+    """Stream writer whose 'drain' waits until the test releases it."""
+
+    def __init__(self):
+        self.written = []
+        self.released = asyncio.Event()
+
+    def writelines(self, frames):
+        self.written.extend(frames)
+
+    async def drain(self):
+        await self.released.wait()
+
+    def close(self):
+        pass
+
+
+class BrokenWriter(StalledWriter):
+    """Stream writer whose connection was reset by the other end."""
+
+    def __init__(self):
+        super().__init__()
+        self.transport = self
+        self.aborted = False
+
+    async def drain(self):
+        raise ConnectionResetError("reset by peer")
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_queued_bytes_cover_the_frames_until_drained():
+    async def scenario():
+        writer = StalledWriter()
+        peer = RelayPeer(None, writer, ("127.0.0.1", 0), high_water=HIGH_WATER)
+        peer.writer_task = asyncio.create_task(peer.drain_loop())
+
+        assert peer.enqueue(b"a" * 900)
+        await asyncio.sleep(0)
+
+        # Handed to the socket but not drained yet: still counts against the mark
+        assert writer.written == [b"a" * 900]
+        assert peer.queued_bytes == 900
+        assert not peer.enqueue(b"b" * 200)
+
+        writer.released.set()
+        await asyncio.sleep(0)
+        assert peer.queued_bytes == 0
+        assert peer.enqueue(b"b" * 200)
+
+        peer.queue.put_nowait(None)
+        await peer.writer_task
+
+    asyncio.run(scenario())
+
+
+def test_idle_peer_takes_a_frame_above_the_high_water_mark():
+    peer = RelayPeer(None, StalledWriter(), ("127.0.0.1", 0), high_water=HIGH_WATER)
+
+    assert peer.enqueue(b"x" * (4 * HIGH_WATER))
+    assert not peer.enqueue(b"y")
+    assert peer.dropped == 1
+
+
+def test_write_error_ends_the_writer_and_aborts_the_peer():
+    async def scenario():
+        writer = BrokenWriter()
+        peer = RelayPeer(None, writer, ("127.0.0.1", 0), high_water=HIGH_WATER)
+        peer.writer_task = asyncio.create_task(peer.drain_loop())
+
+        peer.enqueue(b"frame\n")
+        await asyncio.wait_for(peer.writer_task, 1)
+
+        assert writer.aborted
+        assert peer.evicted
+
+    asyncio.run(scenario())
+
+
+async def connect(port, uuid):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{uuid}\n".encode())
+    await writer.drain()
+    return reader, writer
+
+
+@pytest.mark.parametrize("policy", ["drop", "disconnect"])
+def test_oversized_broadcast_reaches_idle_peers(policy):
+    async def scenario():
+        engine = RelayEngine(high_water=HIGH_WATER, slow_peer_policy=policy)
+        server = await asyncio.start_server(engine.handle_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        sender = await connect(port, "sender")
+        receivers = [await connect(port, f"receiver-{i}") for i in range(3)]
+        while len(engine.peers) < 4:
+            await asyncio.sleep(0.01)
+
+        frame = b"{" + b"x" * (8 * HIGH_WATER) + b"}\n"
+        sender[1].write(frame)
+        await sender[1].drain()
+
+        for reader, _ in receivers:
+            assert await asyncio.wait_for(reader.readline(), 5) == frame
+
+        assert engine.evictions == 0
+        assert engine.dropped_total == 0
+        assert len(engine.peers) == 4
+
+        for _, writer in [sender] + receivers:
+            writer.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_data_sent_with_the_uuid_is_not_lost():
+    async def scenario():
+        engine = RelayEngine(high_water=HIGH_WATER)
+        server = await asyncio.start_server(engine.handle_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        receiver = await connect(port, "receiver")
+        while len(engine.peers) < 1:
+            await asyncio.sleep(0.01)
+
+        # UUID line and first message arrive in the same segment
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b'sender\n{"type": "hello"}\n')
+        await writer.drain()
+
+        assert await asyncio.wait_for(receiver[0].readline(), 5) == b'{"type": "hello"}\n'
+        assert {p.uuid for p in engine.peers.values()} == {"receiver", "sender"}
+
+        for w in (receiver[1], writer):
+            w.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
@@ -0,0 +1,20 @@
+import os
+
+from crypto.crypt_decrypt.session import CryptoSession
+
+
+def test_decrypt_each_keeps_order_and_marks_forged_envelopes():
+    session = CryptoSession(os.urandom(32))
+    good = [session.encrypt(f"msg-{i}") for i in range(3)]
+    forged = bytearray(good[1])
+    forged[-1] ^= 1
+
+    payloads = [good[0], bytes(forged), b"", session.encrypt_json("legacy"), good[2]]
+
+    assert session.decrypt_each(payloads) == ["msg-0", None, None, "legacy", "msg-2"]
+
+
+def test_envelope_from_another_key_is_rejected():
+    payload = CryptoSession(os.urandom(32)).encrypt("secret")
+
+    assert CryptoSession(os.urandom(32)).decrypt_each([payload]) == [None]
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from ca.ca_api import ca_api
+from client.ca_handler import ca_message
+
+
+class FakeCA:
+    """Stands in for 'requests.get' on the CA "/beacon" endpoint."""
+
+    def __init__(self, **extra):
+        self.extra = extra
+        self.calls = 0
+
+    def __call__(self, url, timeout=None):
+        assert url.endswith("/beacon")
+        self.calls += 1
+        body = {"timestamp": f"t{self.calls}", "signature": "sig", **self.extra}
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: dict(body))
+
+
+@pytest.fixture
+def no_cached_beacon(monkeypatch):
+    monkeypatch.setattr(ca_message, "_beacon", None)
+    monkeypatch.setattr(ca_message, "_beacon_fetched_at", 0.0)
+    monkeypatch.setattr(ca_message, "_beacon_interval", ca_message.BEACON_INTERVAL)
+
+
+def test_ca_announces_its_beacon_interval(monkeypatch):
+    monkeypatch.setattr(ca_api, "BEACON_INTERVAL", 7.5)
+    stored = {"timestamp": "t", "signature": "sig"}
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(BEACON=stored)))
+
+    answer = asyncio.run(ca_api.beacon(request))
+
+    assert answer == {"timestamp": "t", "signature": "sig", "interval": 7.5}
+    assert stored == {"timestamp": "t", "signature": "sig"}
+
+
+def test_client_caches_the_beacon_for_the_announced_interval(monkeypatch, no_cached_beacon):
+    ca = FakeCA(interval=60)
+    monkeypatch.setattr(ca_message.requests, "get", ca)
+
+    first = ca_message.get_time_beacon()
+    second = ca_message.get_time_beacon()
+
+    assert ca.calls == 1
+    assert first == second == {"timestamp": "t1", "signature": "sig"}
+
+
+def test_client_follows_a_shorter_interval(monkeypatch, no_cached_beacon):
+    ca = FakeCA(interval=0)
+    monkeypatch.setattr(ca_message.requests, "get", ca)
+
+    assert ca_message.get_time_beacon()["timestamp"] == "t1"
+    assert ca_message.get_time_beacon()["timestamp"] == "t2"
+
+
+def test_client_falls_back_to_its_default_interval(monkeypatch, no_cached_beacon):
+    monkeypatch.setattr(ca_message, "BEACON_INTERVAL", 60)
+    ca = FakeCA()
+    monkeypatch.setattr(ca_message.requests, "get", ca)
+
+    ca_message.get_time_beacon()
+    ca_message.get_time_beacon()
+
+    assert ca.calls == 1
+    assert ca_message._beacon_interval == 60
@@ -0,0 +1,109 @@
+import json
+import time
+import secrets
+import pytest
+
+from crypto.token import token_manager
+from crypto.token.token_manager import TokenManager
+
+POOL_SIZE = 4
+
+
+class OfflineTokenManager(TokenManager):
+    """TokenManager whose CA requests are replaced by locally generated wallet entries."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.minted = 0
+
+    def get_tokens(self, count, spent=True):
+        tokens = []
+        for _ in range(count):
+            self.minted += 1
+            token_id = secrets.token_hex(16)
+            self._save_to_wallet(token_id, "blinded", 1, f"sig-{token_id}", "timestamp", spent)
+            tokens.append({"token_id": token_id, "token_sig": f"sig-{token_id}"})
+        return tokens
+
+
+@pytest.fixture
+def make_manager(tmp_path, monkeypatch, ca_public_pem):
+    monkeypatch.chdir(tmp_path)
+
+    def make():
+        return OfflineTokenManager("pool_test", ca_public_pem, "uid", pool_size=POOL_SIZE, pool_low_water=1)
+    return make
+
+
+def wait_for_pool(manager, size):
+    deadline = time.monotonic() + 5
+    while len(manager._pool) < size and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(manager._pool) == size
+
+
+def wallet_lines(manager):
+    with manager.wallet_log_path.open() as f:
+        return [json.loads(line) for line in f]
+
+
+def test_pooled_tokens_survive_a_restart(make_manager):
+    first = make_manager()
+    first.start_token_pool()
+    wait_for_pool(first, POOL_SIZE)
+
+    used = first.get_token()
+    first.stop_token_pool()
+    left = [token["token_id"] for token in first._pool]
+
+    # New process: the unspent tokens are pooled again before any minting
+    second = make_manager()
+    second.start_token_pool()
+    wait_for_pool(second, POOL_SIZE)
+    second.stop_token_pool()
+
+    pooled = [token["token_id"] for token in second._pool]
+    assert pooled[:len(left)] == left
+    assert used["token_id"] not in pooled
+    assert second.minted == 1
+    assert second.is_token_owner(used["token_id"])
+
+
+def test_spent_markers_are_written_in_one_batch(make_manager, monkeypatch):
+    monkeypatch.setattr(token_manager, "TOKEN_SPENT_FLUSH_INTERVAL", 60)
+    manager = make_manager()
+    manager.start_token_pool()
+    wait_for_pool(manager, POOL_SIZE)
+    manager._pool_stop.set()
+
+    written = len(wallet_lines(manager))
+    taken = [manager.get_token()["token_id"] for _ in range(3)]
+
+    # Handing tokens out does not touch the wallet file
+    assert len(wallet_lines(manager)) == written
+
+    manager.flush_spent()
+    markers = wallet_lines(manager)[written:]
+    assert [entry["token_id"] for entry in markers] == taken
+    assert all(entry["spent"] is True for entry in markers)
+
+
+def test_reloaded_tokens_already_in_the_ledger_are_discarded(make_manager):
+    first = make_manager()
+    first.start_token_pool()
+    wait_for_pool(first, POOL_SIZE)
+    first._pool_stop.set()
+
+    # Crash: a token was used but its spent marker never reached the wallet
+    used = first._pool.popleft()["token_id"]
+
+    second = make_manager()
+    second.pool_size = 0
+    second._pool.extend(second._unspent_tokens())
+    assert used in [token["token_id"] for token in second._pool]
+
+    second.discard_used_tokens(lambda token_id: token_id == used)
+    assert used not in [token["token_id"] for token in second._pool]
+
+    second.flush_spent()
+    assert second._load_wallet()[used]["spent"] is True